@@ -9,11 +9,25 @@ ASR Noise Injection Script (Tier 3 Augmentation)
 - ASR-перепутки
 - Отсутствие пунктуации
 - Conflated clauses
+
+Функции add_* — построчные (каждая заново режет и склеивает строку).
+Для колонки целиком — inject_asr_noise_batch: те же операторы с теми же
+вероятностями по бэндам, но вероятности считаются векторами по колонке,
+случайные числа — матрицей record_uniforms (детерминированно по answer_id),
+а каждый текст режется на токены один раз: вставки — индексные правки
+массива токенов, склеиваемого одним проходом. Время линейно по объему текста.
 """
 
 import csv
+import json
 import random
 import re
+from itertools import accumulate
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from error_injection import SubstitutionRules, apply_edits, record_uniforms, untouched_sites
 
 # Filler words для разных уровней
 FILLER_WORDS = ["um", "uh", "like", "you know", "well", "actually", "I mean"]
@@ -31,36 +45,37 @@ ASR_MISTAKES = {
     "its": "it's",
     "your": "you're",
 }
+ASR_RULES = SubstitutionRules(list(ASR_MISTAKES.items()))
 
-def add_filler_words(text: str, level: float) -> str:
+def add_filler_words(text: str, level: float, rng=random) -> str:
     """Добавляет filler words в зависимости от уровня"""
     words = text.split()
     
     if level <= 4.0:
         # Много filler words для низких уровней
         filler_prob = 0.15
-        filler_count = random.randint(3, 6)
+        filler_count = rng.randint(3, 6)
     elif level <= 5.5:
         filler_prob = 0.10
-        filler_count = random.randint(2, 4)
+        filler_count = rng.randint(2, 4)
     elif level <= 6.5:
         filler_prob = 0.05
-        filler_count = random.randint(1, 3)
+        filler_count = rng.randint(1, 3)
     else:
         filler_prob = 0.02
-        filler_count = random.randint(0, 2)
+        filler_count = rng.randint(0, 2)
     
-    if random.random() < filler_prob:
+    if rng.random() < filler_prob:
         # Добавляем filler words в случайные места
         for _ in range(filler_count):
             if len(words) > 0:
-                pos = random.randint(0, len(words))
-                filler = random.choice(FILLER_WORDS)
+                pos = rng.randint(0, len(words))
+                filler = rng.choice(FILLER_WORDS)
                 words.insert(pos, f"{filler}...")
     
     return " ".join(words)
 
-def add_repetitions(text: str, level: float) -> str:
+def add_repetitions(text: str, level: float, rng=random) -> str:
     """Добавляет повторения (характерно для низких уровней)"""
     if level > 6.0:
         return text
@@ -70,20 +85,20 @@ def add_repetitions(text: str, level: float) -> str:
         return text
     
     # Для низких уровней больше повторений
-    if level <= 4.0 and random.random() < 0.3:
+    if level <= 4.0 and rng.random() < 0.3:
         # Повторяем первое слово
         first_word = words[0]
         words.insert(0, f"{first_word}...")
         words.insert(1, f"{first_word}...")
-    elif level <= 5.5 and random.random() < 0.15:
+    elif level <= 5.5 and rng.random() < 0.15:
         # Одно повторение
-        word = random.choice(words[:5])
+        word = rng.choice(words[:5])
         pos = words.index(word) + 1
         words.insert(pos, f"{word}...")
     
     return " ".join(words)
 
-def add_asr_mistakes(text: str, level: float) -> str:
+def add_asr_mistakes(text: str, level: float, rng=random) -> str:
     """Добавляет ASR-перепутки"""
     if level > 7.0:
         return text  # Высокие уровни реже имеют ASR-ошибки
@@ -97,21 +112,21 @@ def add_asr_mistakes(text: str, level: float) -> str:
         mistake_prob = 0.05
     
     for correct, mistake in ASR_MISTAKES.items():
-        if random.random() < mistake_prob and correct.lower() in text.lower():
+        if rng.random() < mistake_prob and correct.lower() in text.lower():
             # Заменяем с учетом регистра
             pattern = re.compile(re.escape(correct), re.IGNORECASE)
-            if random.random() < 0.5:  # 50% шанс заменить
+            if rng.random() < 0.5:  # 50% шанс заменить
                 text = pattern.sub(mistake, text, count=1)
     
     return text
 
-def remove_punctuation(text: str, level: float) -> str:
+def remove_punctuation(text: str, level: float, rng=random) -> str:
     """Убирает пунктуацию (характерно для ASR)"""
     if level > 6.5:
         return text  # Высокие уровни обычно имеют пунктуацию
     
     # Убираем запятые и точки, но оставляем основные знаки
-    if level <= 5.0 and random.random() < 0.4:
+    if level <= 5.0 and rng.random() < 0.4:
         text = text.replace(",", "")
         text = text.replace(".", "")
         text = text.replace(";", "")
@@ -119,7 +134,7 @@ def remove_punctuation(text: str, level: float) -> str:
     
     return text
 
-def add_pauses(text: str, level: float) -> str:
+def add_pauses(text: str, level: float, rng=random) -> str:
     """Добавляет паузы (многоточия)"""
     if level > 7.0:
         return text
@@ -128,51 +143,200 @@ def add_pauses(text: str, level: float) -> str:
     
     if level <= 4.0:
         pause_prob = 0.25
-        pause_count = random.randint(2, 4)
+        pause_count = rng.randint(2, 4)
     elif level <= 5.5:
         pause_prob = 0.15
-        pause_count = random.randint(1, 3)
+        pause_count = rng.randint(1, 3)
     else:
         pause_prob = 0.08
-        pause_count = random.randint(0, 2)
+        pause_count = rng.randint(0, 2)
     
-    if random.random() < pause_prob:
+    if rng.random() < pause_prob:
         for _ in range(pause_count):
             if len(words) > 2:
-                pos = random.randint(1, len(words) - 1)
+                pos = rng.randint(1, len(words) - 1)
                 words.insert(pos, "...")
     
     return " ".join(words)
 
-def add_conflated_clauses(text: str, level: float) -> str:
+def add_conflated_clauses(text: str, level: float, rng=random) -> str:
     """Добавляет conflated clauses (характерно для низких уровней)"""
     if level > 6.0:
         return text
     
-    if level <= 5.0 and random.random() < 0.2:
+    if level <= 5.0 and rng.random() < 0.2:
         # Добавляем "and" между предложениями
         text = text.replace(". ", " and ")
         text = text.replace(", ", " and ")
     
     return text
 
-def inject_asr_noise(text: str, overall: float) -> str:
-    """Основная функция для инъекции ASR-шумов"""
+def inject_asr_noise(text: str, overall: float, rng=random) -> str:
+    """Основная функция для инъекции ASR-шумов (rng — см. error_injection.record_rng)"""
     # Применяем все типы шумов
-    text = add_filler_words(text, overall)
-    text = add_repetitions(text, overall)
-    text = add_pauses(text, overall)
-    text = add_asr_mistakes(text, overall)
-    text = remove_punctuation(text, overall)
-    text = add_conflated_clauses(text, overall)
+    text = add_filler_words(text, overall, rng)
+    text = add_repetitions(text, overall, rng)
+    text = add_pauses(text, overall, rng)
+    text = add_asr_mistakes(text, overall, rng)
+    text = remove_punctuation(text, overall, rng)
+    text = add_conflated_clauses(text, overall, rng)
     
     return text
 
+# Параметры операторов пакетного движка по бэндам overall (как в add_*):
+# значение k берется для первого порога thresholds[k] >= overall, последнее — выше всех порогов
+NOISE_BANDS = {
+    'filler_prob':  ((4.0, 5.5, 6.5), (0.15, 0.10, 0.05, 0.02)),
+    'filler_min':   ((4.0, 5.5, 6.5), (3, 2, 1, 0)),
+    'filler_max':   ((4.0, 5.5, 6.5), (6, 4, 3, 2)),
+    'repeat_first': ((4.0,), (0.3, 0.0)),
+    'repeat_word':  ((5.5,), (0.15, 0.0)),
+    'pause_prob':   ((4.0, 5.5, 7.0), (0.25, 0.15, 0.08, 0.0)),
+    'pause_min':    ((4.0, 5.5, 7.0), (2, 1, 0, 0)),
+    'pause_max':    ((4.0, 5.5, 7.0), (4, 3, 2, 0)),
+    'mistake_prob': ((4.0, 5.5, 7.0), (0.2, 0.1, 0.05, 0.0)),
+    'punctuation':  ((5.0,), (0.4, 0.0)),
+    'conflate':     ((5.0,), (0.2, 0.0)),
+}
+
+MAX_FILLERS = 6
+MAX_PAUSES = 4
+
+# Столбцы матрицы случайных чисел: у каждого решения свой столбец
+_DRAW_LAYOUT = (('filler', 1), ('filler_count', 1), ('filler_pos', MAX_FILLERS), ('filler_word', MAX_FILLERS),
+                ('repeat_first', 1), ('repeat_word', 1), ('repeat_pick', 1),
+                ('pause', 1), ('pause_count', 1), ('pause_pos', MAX_PAUSES),
+                ('mistake', len(ASR_MISTAKES)), ('mistake_keep', len(ASR_MISTAKES)),
+                ('punctuation', 1), ('conflate', 1))
+DRAW_COLUMNS: Dict[str, int] = dict(zip((name for name, _ in _DRAW_LAYOUT),
+                                        accumulate((size for _, size in _DRAW_LAYOUT), initial=0)))
+NOISE_DRAWS = sum(size for _, size in _DRAW_LAYOUT)
+
+_STRIP_PUNCTUATION = str.maketrans('', '', ',.;:')
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _by_band(overall: np.ndarray, thresholds: Sequence[float], values: Sequence[float]) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)[np.searchsorted(thresholds, overall, side='left')]
+
+
+def _draw_count(draws: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Равномерное целое из [low, high] по столбцу случайных чисел"""
+    return (low + np.floor(draws * (high - low + 1))).astype(np.int64)
+
+
+def _noise_tokens(text: str, draws: List[float], fillers: int, repeat: str, pauses: int,
+                  mistakes: List[bool], mistake_sites: List[Tuple[int, List[Tuple[int, int]]]]) -> str:
+    """Один текст: перепутки (правки строки) → токены → вставки по индексам → склейка"""
+    if mistake_sites:
+        edits = []
+        for rule, sites in mistake_sites:
+            sites = untouched_sites(sites, edits)
+            if mistakes[rule] and sites:
+                # Только первое вхождение (как pattern.sub(..., count=1))
+                edits.append((*sites[0], ASR_RULES.replacements[rule]))
+        text = apply_edits(text, edits)
+
+    tokens = text.split()
+    n = len(tokens)
+    inserts: List[Tuple[int, str]] = []  # (позиция в исходном массиве токенов, токен)
+
+    if n > 0:
+        for k in range(fillers):
+            filler = FILLER_WORDS[int(draws[DRAW_COLUMNS['filler_word'] + k] * len(FILLER_WORDS))]
+            inserts.append((int(draws[DRAW_COLUMNS['filler_pos'] + k] * (n + 1)), f"{filler}..."))
+    if n >= 3:
+        if repeat == 'first':
+            inserts += [(0, f"{tokens[0]}...")] * 2
+        elif repeat == 'word':
+            word = tokens[int(draws[DRAW_COLUMNS['repeat_pick']] * min(5, n))]
+            inserts.append((tokens.index(word) + 1, f"{word}..."))
+    if n > 2:
+        for k in range(pauses):
+            inserts.append((1 + int(draws[DRAW_COLUMNS['pause_pos'] + k] * (n - 1)), "..."))
+
+    if not inserts:
+        return " ".join(tokens)
+    inserts.sort(key=lambda insert: insert[0])
+    result = []
+    last = 0
+    for pos, token in inserts:
+        result.extend(tokens[last:pos])
+        result.append(token)
+        last = pos
+    result.extend(tokens[last:])
+    return " ".join(result)
+
+
+def _noise_chunk(texts: Sequence[str], overall: np.ndarray, draws: np.ndarray) -> List[str]:
+    bands = {name: _by_band(overall, *table) for name, table in NOISE_BANDS.items()}
+
+    def column(name: str) -> np.ndarray:
+        return draws[:, DRAW_COLUMNS[name]]
+
+    fillers = np.where(column('filler') < bands['filler_prob'],
+                       _draw_count(column('filler_count'), bands['filler_min'], bands['filler_max']), 0)
+    repeat_first = column('repeat_first') < bands['repeat_first']
+    repeat_word = ~repeat_first & (column('repeat_word') < bands['repeat_word'])
+    pauses = np.where(column('pause') < bands['pause_prob'],
+                      _draw_count(column('pause_count'), bands['pause_min'], bands['pause_max']), 0)
+    mistake_columns = slice(DRAW_COLUMNS['mistake'], DRAW_COLUMNS['mistake'] + len(ASR_MISTAKES))
+    keep_columns = slice(DRAW_COLUMNS['mistake_keep'], DRAW_COLUMNS['mistake_keep'] + len(ASR_MISTAKES))
+    mistakes = (draws[:, mistake_columns] < bands['mistake_prob'][:, None]) & (draws[:, keep_columns] < 0.5)
+    strip = column('punctuation') < bands['punctuation']
+    conflate = column('conflate') < bands['conflate']
+
+    texts = [text or '' for text in texts]
+    # Перепутки: один проход по склейке строк, где сработала хоть одна
+    with_mistakes = np.flatnonzero(mistakes.any(axis=1)).tolist()
+    mistake_sites = dict(zip(with_mistakes, ASR_RULES.find_sites_many([texts[i] for i in with_mistakes])))
+
+    repeat = np.where(repeat_first, 'first', np.where(repeat_word, 'word', '')).tolist()
+    edited = ((fillers > 0) | repeat_first | repeat_word | (pauses > 0)).tolist()
+    fillers, pauses = fillers.tolist(), pauses.tolist()
+    noisy = []
+    for i, (text, do_strip, do_conflate) in enumerate(zip(texts, strip.tolist(), conflate.tolist())):
+        if edited[i] or mistake_sites.get(i):
+            text = _noise_tokens(text, draws[i].tolist(), fillers[i], repeat[i], pauses[i],
+                                 mistakes[i].tolist(), mistake_sites.get(i))
+        else:
+            text = " ".join(text.split())
+        if do_strip:
+            text = text.translate(_STRIP_PUNCTUATION)
+        if do_conflate:
+            text = text.replace(". ", " and ").replace(", ", " and ")
+        noisy.append(text)
+    return noisy
+
+
+def inject_asr_noise_batch(texts: Sequence[str], overall: Sequence[float], answer_ids: Sequence[str],
+                           seed: int, chunk_size: int = 50000) -> List[str]:
+    """
+    Пакетный inject_asr_noise для колонки: шум строки зависит только от
+    (seed, answer_id), поэтому колонку можно резать на чанки и процессы
+    """
+    noisy = []
+    for offset in range(0, len(texts), chunk_size):
+        end = offset + chunk_size
+        draws = record_uniforms(seed, answer_ids[offset:end], 'asr_noise', NOISE_DRAWS)
+        noisy.extend(_noise_chunk(texts[offset:end], np.asarray(overall[offset:end], dtype=np.float64), draws))
+    return noisy
+
+
 def main():
     print("=" * 70)
     print("ASR NOISE INJECTION (Tier 3 Augmentation)")
     print("=" * 70)
     
+    with open('configs/config_v1.1_generation.json', 'r') as f:
+        seed = json.load(f)['random_seed']
+    
     # Загружаем ответы
     print("\n📂 Загрузка ответов...")
     with open('answers.csv', 'r', encoding='utf-8') as f:
@@ -182,9 +346,11 @@ def main():
     print(f"   Загружено: {len(answers)} ответов")
     
     # Выбираем ответы для augmentation (не все, чтобы сохранить разнообразие)
-    # Берем 30% ответов для добавления ASR noise
-    target_count = int(len(answers) * 0.3)
-    selected_answers = random.sample(answers, min(target_count, len(answers)))
+    # Берем ~30% ответов для добавления ASR noise: выбор зависит только от
+    # (seed, answer_id), как в streaming_pipeline.asr_noise_stage
+    ids = [answer['answer_id'] for answer in answers]
+    selected = record_uniforms(seed, ids, 'asr_select', 1)[:, 0] < 0.3
+    selected_answers = [answer for answer, is_selected in zip(answers, selected) if is_selected]
     
     print(f"\n🎯 Выбрано {len(selected_answers)} ответов для ASR noise injection")
     
@@ -204,13 +370,14 @@ def main():
     
     print(f"\n🔧 Применение ASR noise injection...")
     
-    for answer in selected_answers:
+    # ASR noise всей выборки одним пакетом (шум зависит только от seed и answer_id)
+    noisy_texts = inject_asr_noise_batch([answer['answer_text'] for answer in selected_answers],
+                                         [_float(answer['target_band_overall']) for answer in selected_answers],
+                                         [answer['answer_id'] for answer in selected_answers], seed)
+    
+    for answer, noisy_text in zip(selected_answers, noisy_texts):
         try:
             overall = float(answer['target_band_overall'])
-            original_text = answer['answer_text']
-            
-            # Применяем ASR noise
-            noisy_text = inject_asr_noise(original_text, overall)
             
             # Создаем новый ответ (копия с шумом)
             new_answer = answer.copy()
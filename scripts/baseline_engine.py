@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Быстрый baseline (TF-IDF + hand-crafted) как регрессионная проверка сборки датасета
+
+- обученный TfidfVectorizer кэшируется по sha256 обучающих текстов,
+  разреженные матрицы признаков (TF-IDF | hand-crafted, CSR) — по ключу
+  словаря + sha256 текстов + версии hand-crafted признаков:
+  повторный запуск на той же версии датасета ничего не пересчитывает
+- модели на разреженном входе: ridge (одно решение на все 5 бэндов),
+  sgd (по регрессору на бэнд, бэнды обучаются параллельно через joblib),
+  forest (RandomForest, multi-output, деревья параллельно)
+- отчет: MAE/Spearman на val + throughput fit/predict (строк/с)
+
+Кэш: models/.baseline_cache/ (удалить — полный пересчет).
+Отчет: docs/baseline_report_<версия>.json — эталон (перезаписывается запуском без --check).
+--check сравнивает MAE overall с эталоном и завершается с кодом 1 при ухудшении
+больше BASELINE_TOLERANCE; эталон при этом не меняется (иначе он дрейфовал бы
+с каждой сборкой), текущий отчет пишется в docs/baseline_report_<версия>_latest.json.
+
+Использование:
+    python scripts/baseline_engine.py [dataset_versions/v1.3] [--models ridge,sgd,forest] [--jobs N] [--check]
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import Ridge, SGDRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MaxAbsScaler
+
+from baseline_model import HANDCRAFTED_NAMES, evaluate_model, split_by_user
+from dataset_loader import BAND_COLUMNS, load_table
+from text_features import FEATURES_VERSION, extract_text_features, feature_columns
+
+BASELINE_CACHE_DIR = 'models/.baseline_cache'
+TFIDF_PARAMS = {'max_features': 500, 'ngram_range': (1, 2), 'min_df': 2}
+BASELINE_TOLERANCE = 0.05
+
+
+def texts_hash(texts: Sequence[str]) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(str(text).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:16]
+
+
+def vectorizer_key(vectorizer: TfidfVectorizer) -> str:
+    """Ключ обученного векторизатора: словарь + idf (годится и для не из кэша)"""
+    digest = hashlib.sha256(json.dumps(sorted((term, int(i)) for term, i in vectorizer.vocabulary_.items())).encode('utf-8'))
+    digest.update(np.asarray(vectorizer.idf_).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def handcrafted_matrix(texts: Sequence[str]) -> np.ndarray:
+    return feature_columns(extract_text_features(texts), HANDCRAFTED_NAMES)
+
+
+class BaselineCache:
+    """Обученные векторизаторы и CSR-матрицы признаков на диске"""
+
+    def __init__(self, directory: str = BASELINE_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _save(self, path: str, write):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def vectorizer(self, texts: Sequence[str]) -> TfidfVectorizer:
+        """TfidfVectorizer(TFIDF_PARAMS), обученный на texts"""
+        params_hash = hashlib.sha256(repr(sorted(TFIDF_PARAMS.items())).encode('utf-8')).hexdigest()[:8]
+        path = self._path(f'vectorizer-{params_hash}-{texts_hash(texts)}.pkl')
+        if os.path.exists(path):
+            self.hits += 1
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        self.misses += 1
+        vectorizer = TfidfVectorizer(**TFIDF_PARAMS).fit(texts)
+        # stop_words_ (все отброшенные n-граммы) не нужен для transform и раздувает файл
+        vectorizer.stop_words_ = None
+        self._save(path, lambda f: pickle.dump(vectorizer, f))
+        return vectorizer
+
+    def features(self, vectorizer: TfidfVectorizer, texts: Sequence[str]) -> sparse.csr_matrix:
+        """CSR [TF-IDF | hand-crafted] для texts"""
+        path = self._path(f'features-{vectorizer_key(vectorizer)}-{FEATURES_VERSION}-{texts_hash(texts)}.npz')
+        if os.path.exists(path):
+            self.hits += 1
+            return sparse.load_npz(path)
+        self.misses += 1
+        matrix = sparse.hstack([vectorizer.transform(texts), handcrafted_matrix(texts)], format='csr')
+        self._save(path, lambda f: sparse.save_npz(f, matrix))
+        return matrix
+
+    def summary(self) -> str:
+        return f"из кэша {self.hits}, пересчитано {self.misses}"
+
+
+# name → (фабрика, умеет ли модель multi-output сама)
+BASELINE_MODELS = {
+    'ridge': (lambda: make_pipeline(MaxAbsScaler(), Ridge(alpha=1.0)), True),
+    'sgd': (lambda: make_pipeline(MaxAbsScaler(), SGDRegressor(alpha=1e-4, max_iter=200, tol=1e-3,
+                                                               random_state=42)), False),
+    'forest': (lambda: RandomForestRegressor(n_estimators=100, max_depth=20, min_samples_split=5,
+                                             random_state=42, n_jobs=-1), True),
+}
+
+
+def _fit_target(factory, X, y):
+    return factory().fit(X, y)
+
+
+class MultiTargetBaseline:
+    """
+    Модель на все бэнды: multi-output модели обучаются одним fit,
+    остальные — по регрессору на бэнд, параллельно (joblib)
+    """
+
+    def __init__(self, name: str, n_jobs: int = -1):
+        self.name = name
+        self.factory, self.multi_output = BASELINE_MODELS[name]
+        self.n_jobs = n_jobs
+        self.estimators_ = []
+
+    def fit(self, X, y: np.ndarray) -> 'MultiTargetBaseline':
+        if self.multi_output:
+            self.estimators_ = [self.factory().fit(X, y)]
+        else:
+            self.estimators_ = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fit_target)(self.factory, X, y[:, i]) for i in range(y.shape[1]))
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        if self.multi_output:
+            return self.estimators_[0].predict(X)
+        return np.column_stack([estimator.predict(X) for estimator in self.estimators_])
+
+
+def texts_and_targets(table) -> Tuple[List[str], np.ndarray]:
+    """Тексты (answer_text, иначе transcript_raw) и бэнды строк с корректными overall 3..9"""
+    texts = table['answer_text']
+    if 'transcript_raw' in table:
+        texts = np.where(texts != '', texts, table['transcript_raw'])
+    bands = table.bands
+    keep = table.valid_bands_mask() & (bands[:, 0] >= 3.0) & (bands[:, 0] <= 9.0) & (texts != '')
+    return list(texts[keep]), bands[keep]
+
+
+def load_splits(version_dir: str) -> Tuple[Tuple[List[str], np.ndarray], Tuple[List[str], np.ndarray]]:
+    """train/val версии (сплиты из манифеста или csv), иначе — split_by_user по answers.csv"""
+    train_path = os.path.join(version_dir, 'train.csv')
+    val_path = os.path.join(version_dir, 'val.csv')
+    if os.path.exists(train_path) or os.path.exists(os.path.join(version_dir, 'splits')):
+        return texts_and_targets(load_table(train_path)), texts_and_targets(load_table(val_path))
+
+    table = load_table(os.path.join(version_dir, 'answers.csv'))
+    train_rows, val_rows = split_by_user(table.rows())
+    return (texts_and_targets(table.take([r.index for r in train_rows])),
+            texts_and_targets(table.take([r.index for r in val_rows])))
+
+
+def run_baseline(train: Tuple[List[str], np.ndarray], val: Tuple[List[str], np.ndarray],
+                 models: Sequence[str], cache: Optional[BaselineCache] = None, n_jobs: int = -1) -> dict:
+    """Признаки (через кэш) + обучение/оценка моделей → отчет"""
+    cache = cache or BaselineCache()
+    train_texts, y_train = train
+    val_texts, y_val = val
+
+    start = time.perf_counter()
+    vectorizer = cache.vectorizer(train_texts)
+    X_train = cache.features(vectorizer, train_texts)
+    X_val = cache.features(vectorizer, val_texts)
+    features_seconds = time.perf_counter() - start
+
+    report = {
+        'train_rows': len(train_texts),
+        'val_rows': len(val_texts),
+        'features': X_train.shape[1],
+        'features_seconds': features_seconds,
+        'cache': cache.summary(),
+        'models': {},
+    }
+    for name in models:
+        model = MultiTargetBaseline(name, n_jobs)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        y_pred = model.predict(X_val)
+        predict_seconds = time.perf_counter() - start
+        report['models'][name] = {
+            'val_mae': {k: float(v) for k, v in evaluate_model(y_val, y_pred, "MAE").items()},
+            'val_spearman': {k: float(v) for k, v in evaluate_model(y_val, y_pred, "Spearman").items()},
+            'fit_seconds': fit_seconds,
+            'fit_rows_per_sec': len(train_texts) / fit_seconds if fit_seconds > 0 else float('inf'),
+            'predict_seconds': predict_seconds,
+            'predict_rows_per_sec': len(val_texts) / predict_seconds if predict_seconds > 0 else float('inf'),
+        }
+    return report
+
+
+def regressions(report: dict, previous: dict, tolerance: float = BASELINE_TOLERANCE) -> List[str]:
+    """Модели, у которых MAE overall вырос больше чем на tolerance"""
+    found = []
+    for name, metrics in report['models'].items():
+        old = previous.get('models', {}).get(name)
+        if old is None:
+            continue
+        delta = metrics['val_mae']['overall'] - old['val_mae']['overall']
+        if delta > tolerance:
+            found.append(f"{name}: MAE overall {old['val_mae']['overall']:.3f} → "
+                         f"{metrics['val_mae']['overall']:.3f} (+{delta:.3f})")
+    return found
+
+
+def parse_options(argv: List[str]) -> dict:
+    options = {'version_dir': 'dataset_versions/v1.3', 'models': list(BASELINE_MODELS), 'n_jobs': -1,
+               'check': False}
+    args = iter(argv)
+    for arg in args:
+        if arg == '--models':
+            options['models'] = next(args).split(',')
+        elif arg == '--jobs':
+            options['n_jobs'] = int(next(args))
+        elif arg == '--check':
+            options['check'] = True
+        else:
+            options['version_dir'] = arg
+    return options
+
+
+def main():
+    options = parse_options(sys.argv[1:])
+    version_dir = options['version_dir']
+    version = os.path.basename(os.path.normpath(version_dir))
+    report_file = f'docs/baseline_report_{version}.json'
+    latest_file = f'docs/baseline_report_{version}_latest.json'
+
+    print("=" * 70)
+    print(f"BASELINE (TF-IDF + HAND-CRAFTED): {version}")
+    print("=" * 70)
+
+    train, val = load_splits(version_dir)
+    print(f"\n📂 Train: {len(train[0])}, Val: {len(val[0])}")
+
+    report = run_baseline(train, val, options['models'], n_jobs=options['n_jobs'])
+    report['dataset'] = version_dir
+    print(f"\n🔧 Признаки: {report['features']} колонок за {report['features_seconds']:.2f}s ({report['cache']})")
+
+    targets = [name.replace('target_band_', '') for name in BAND_COLUMNS]
+    print(f"\n{'Модель':<8} " + ' '.join(f'{t.upper():>7}' for t in targets) +
+          f" {'fit, стр/с':>12} {'predict, стр/с':>15}")
+    for name, metrics in report['models'].items():
+        mae = ' '.join(f"{metrics['val_mae'][t]:>7.3f}" for t in targets)
+        print(f"{name:<8} {mae} {metrics['fit_rows_per_sec']:>12.0f} {metrics['predict_rows_per_sec']:>15.0f}")
+
+    failed = []
+    output_file = report_file
+    if options['check'] and os.path.exists(report_file):
+        # Эталон не трогаем: текущий прогон — в отдельный файл
+        output_file = latest_file
+        with open(report_file, 'r', encoding='utf-8') as f:
+            failed = regressions(report, json.load(f))
+        if failed:
+            print(f"\n❌ Регрессия baseline (допуск {BASELINE_TOLERANCE}):")
+            for line in failed:
+                print(f"   {line}")
+        else:
+            print(f"\n✅ Нет регрессии относительно {report_file}")
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Отчет сохранен в {output_file}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
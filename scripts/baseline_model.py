@@ -9,122 +9,59 @@ Baseline модель для sanity-check датасета
 - Метрики: MAE, Spearman correlation
 """
 
-import csv
 import numpy as np
 from collections import defaultdict
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from scipy.stats import spearmanr
-import re
+from dataset_loader import load_table
+from text_features import text_features
 
 def load_answers_from_csv(filepath: str):
-    """Загружает ответы из CSV"""
-    answers = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                # Пропускаем некорректные строки
-                overall = float(row.get('target_band_overall', 0))
-                if overall < 3.0 or overall > 9.0:
-                    continue
-                answers.append(row)
-            except:
-                continue
-    return answers
+    """Загружает ответы из CSV (список RowView)"""
+    table = load_table(filepath)
+    overall = table['target_band_overall']
+    # Пропускаем некорректные строки (NaN не проходит сравнения)
+    valid = (overall >= 3.0) & (overall <= 9.0)
+    return table.take(valid).rows()
+
+HANDCRAFTED_NAMES = ['num_words', 'filler_ratio', 'connector_ratio', 'repetition_ratio',
+                     'punctuation_ratio', 'ellipsis_ratio', 'grammar_errors']
 
 def extract_handcrafted_features(text: str) -> dict:
-    """Извлекает hand-crafted фичи"""
-    words = text.split()
-    num_words = len(words)
-    
-    # Filler words
-    fillers = ['um', 'uh', 'er', 'erm', 'like', 'you know', 'well', 'actually', 'I mean']
-    filler_count = sum(1 for word in words if any(filler in word.lower() for filler in fillers))
-    
-    # Connectors
-    connectors = ['however', 'on the other hand', 'in addition', 'moreover', 'furthermore',
-                  'although', 'despite', 'nevertheless', 'also', 'besides']
-    connector_count = sum(1 for word in words if any(conn in word.lower() for conn in connectors))
-    
-    # Repetitions (простое обнаружение)
-    unique_words = len(set(word.lower() for word in words))
-    repetition_ratio = 1 - (unique_words / num_words) if num_words > 0 else 0
-    
-    # Punctuation issues
-    punctuation_count = text.count('.') + text.count(',') + text.count('!') + text.count('?')
-    ellipsis_count = text.count('...')
-    
-    # Grammar indicators (простое)
-    grammar_errors = 0
-    # Пропущенные артикли (очень грубо)
-    if re.search(r'\bI like \w+$', text, re.IGNORECASE):
-        grammar_errors += 1
-    # Third person errors
-    if re.search(r'\b(he|she|it) (go|do|make|take)\b', text, re.IGNORECASE):
-        grammar_errors += 1
-    
-    return {
-        'num_words': num_words,
-        'filler_ratio': filler_count / num_words if num_words > 0 else 0,
-        'connector_ratio': connector_count / num_words if num_words > 0 else 0,
-        'repetition_ratio': repetition_ratio,
-        'punctuation_ratio': punctuation_count / num_words if num_words > 0 else 0,
-        'ellipsis_ratio': ellipsis_count / num_words if num_words > 0 else 0,
-        'grammar_errors': grammar_errors,
-    }
+    """Извлекает hand-crafted фичи (общий экстрактор text_features.py)"""
+    features = text_features(text)
+    return {name: features[name] for name in HANDCRAFTED_NAMES}
 
 def prepare_data(answers, vectorizer=None, fit_vectorizer=True):
-    """Подготавливает данные для обучения"""
+    """
+    Подготавливает данные для обучения. Векторизатор и матрица признаков
+    берутся из кэша baseline_engine (по sha256 текстов), если уже считались.
+    """
+    from baseline_engine import BaselineCache
+    
     texts = []
-    handcrafted_features = []
-    targets = {
-        'overall': [],
-        'fc': [],
-        'lr': [],
-        'gra': [],
-        'pr': []
-    }
+    targets = []
     
     for answer in answers:
         text = answer.get('answer_text', '') or answer.get('transcript_raw', '')
         if not text:
             continue
         
-        texts.append(text)
-        handcrafted_features.append(extract_handcrafted_features(text))
-        
         try:
-            targets['overall'].append(float(answer['target_band_overall']))
-            targets['fc'].append(float(answer['target_band_fc']))
-            targets['lr'].append(float(answer['target_band_lr']))
-            targets['gra'].append(float(answer['target_band_gra']))
-            targets['pr'].append(float(answer['target_band_pr']))
+            row = [float(answer[f'target_band_{name}']) for name in ('overall', 'fc', 'lr', 'gra', 'pr')]
         except:
             continue
+        texts.append(text)
+        targets.append(row)
     
-    # TF-IDF
+    # TF-IDF + hand-crafted (CSR)
+    cache = BaselineCache()
     if fit_vectorizer:
-        vectorizer = TfidfVectorizer(max_features=500, ngram_range=(1, 2), min_df=2)
-        tfidf_features = vectorizer.fit_transform(texts)
-    else:
-        tfidf_features = vectorizer.transform(texts)
-    
-    # Hand-crafted features
-    hc_array = np.array([
-        [hc['num_words'], hc['filler_ratio'], hc['connector_ratio'],
-         hc['repetition_ratio'], hc['punctuation_ratio'], hc['ellipsis_ratio'],
-         hc['grammar_errors']]
-        for hc in handcrafted_features
-    ])
-    
-    # Объединяем фичи
-    from scipy.sparse import hstack
-    X = hstack([tfidf_features, hc_array])
+        vectorizer = cache.vectorizer(texts)
+    X = cache.features(vectorizer, texts)
     
-    y = np.array([targets['overall'], targets['fc'], targets['lr'], 
-                  targets['gra'], targets['pr']]).T
+    y = np.array(targets).reshape(len(targets), 5)
     
     return X, y, vectorizer
 
@@ -282,9 +219,7 @@ def main():
         print("\n🔍 Top 10 важных фичей (hand-crafted):")
         # Берем последние 7 фичей (hand-crafted)
         hc_importance = model.feature_importances_[-7:]
-        hc_names = ['num_words', 'filler_ratio', 'connector_ratio', 'repetition_ratio',
-                   'punctuation_ratio', 'ellipsis_ratio', 'grammar_errors']
-        importance_pairs = list(zip(hc_names, hc_importance))
+        importance_pairs = list(zip(HANDCRAFTED_NAMES, hc_importance))
         importance_pairs.sort(key=lambda x: x[1], reverse=True)
         for name, importance in importance_pairs[:10]:
             print(f"      {name}: {importance:.4f}")
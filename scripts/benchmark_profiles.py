@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк профилей выполнения (execution_profile.py) на сплитах v1.3
+
+Для каждого профиля — отдельный процесс (настройки потоков задаются один раз
+на процесс), в нем:
+- обучение: train_steps шагов на train.csv (после warmup_steps прогревочных)
+- инференс: полный проход по val.csv и test.csv под torch.inference_mode()
+Отчет — примеров/с для каждой конфигурации, сохраняется в models/benchmark_profiles.json.
+
+Использование:
+    python scripts/benchmark_profiles.py [model_name] [default,cpu_threads,cpu_bf16,cpu_fast]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+DATA_DIR = 'dataset_versions/v1.3'
+RESULTS_PATH = 'models/benchmark_profiles.json'
+TRAIN_STEPS = 30
+WARMUP_STEPS = 3
+
+
+def _timed_passes(model, loader, profile, device, optimizer=None, criterion=None,
+                  steps=None, warmup=0):
+    """(примеров, секунд) за проход; optimizer — шаги обучения, иначе инференс"""
+    import torch
+    from execution_profile import autocast
+
+    samples = 0
+    start = None
+    for step, batch in enumerate(loader):
+        if step == warmup:
+            start = time.perf_counter()
+        if steps is not None and step >= warmup + steps:
+            break
+        input_ids = batch['input_ids'].to(device)
+        attention_mask = batch['attention_mask'].to(device)
+        if optimizer is not None:
+            optimizer.zero_grad()
+            with autocast(profile, device):
+                outputs = model(input_ids, attention_mask)
+            loss = criterion(outputs.float(), batch['targets'].to(device))
+            loss.backward()
+            optimizer.step()
+        else:
+            with torch.inference_mode(), autocast(profile, device):
+                model(input_ids, attention_mask)
+        if step >= warmup:
+            samples += len(input_ids)
+    return samples, (time.perf_counter() - start) if start is not None else 0.0
+
+
+def run_profile(profile_name: str, model_name: str) -> dict:
+    """Замеры одного профиля в текущем процессе"""
+    from execution_profile import apply_threads, describe, get_profile, maybe_compile
+    profile = get_profile(profile_name)
+    apply_threads(profile)
+
+    import torch
+    import torch.nn as nn
+    from transformers import AutoTokenizer
+    from token_cache import pretokenize
+    import train_model as tm
+
+    tm.CONFIG['model_name'] = model_name
+    device = tm.CONFIG['device']
+    torch.manual_seed(tm.CONFIG['random_seed'])
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    loaders = {}
+    for split, shuffle in (('train', True), ('val', False), ('test', False)):
+        texts, targets, _ = tm.load_data(os.path.join(DATA_DIR, f'{split}.csv'))
+        encodings = pretokenize(texts, tokenizer, model_name, tm.CONFIG['max_length'],
+                                tm.CONFIG['token_cache_dir'])
+        loaders[split], _ = tm.make_loader(tm.IELTSDataset(encodings, targets), shuffle, profile)
+
+    model = tm.IELTSModel(model_name).to(device)
+    model = maybe_compile(model, profile)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=tm.CONFIG['learning_rate'])
+
+    result = {'profile': profile_name, 'description': describe(profile)}
+    model.train()
+    samples, seconds = _timed_passes(model, loaders['train'], profile, device, optimizer, nn.MSELoss(),
+                                     steps=TRAIN_STEPS, warmup=WARMUP_STEPS)
+    result['train_samples_per_sec'] = samples / seconds if seconds else 0.0
+
+    model.eval()
+    for split in ('val', 'test'):
+        # Первый проход — прогрев (компиляция под новые формы), замеряем второй
+        _timed_passes(model, loaders[split], profile, device)
+        samples, seconds = _timed_passes(model, loaders[split], profile, device)
+        result[f'{split}_samples_per_sec'] = samples / seconds if seconds else 0.0
+    return result
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        # Дочерний процесс: результат — последней строкой JSON
+        print(json.dumps(run_profile(sys.argv[2], sys.argv[3])))
+        return
+
+    from execution_profile import EXECUTION_PROFILES
+    from train_model import CONFIG
+
+    model_name = sys.argv[1] if len(sys.argv) > 1 else CONFIG['model_name']
+    profiles = sys.argv[2].split(',') if len(sys.argv) > 2 else list(EXECUTION_PROFILES)
+
+    print("=" * 70)
+    print("БЕНЧМАРК ПРОФИЛЕЙ ВЫПОЛНЕНИЯ")
+    print("=" * 70)
+    print(f"\n🤖 Модель: {model_name}, данные: {DATA_DIR} (train/val/test)")
+    print(f"   Обучение: {TRAIN_STEPS} шагов после {WARMUP_STEPS} прогревочных; инференс: val и test целиком")
+
+    results = []
+    for name in profiles:
+        print(f"\n⏱️  Профиль {name}...")
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', name, model_name],
+                                 capture_output=True, text=True)
+        if process.returncode != 0:
+            print(f"   ❌ Ошибка:\n{process.stderr[-2000:]}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"   {result['description']}")
+        print(f"   train: {result['train_samples_per_sec']:.1f}, val: {result['val_samples_per_sec']:.1f}, "
+              f"test: {result['test_samples_per_sec']:.1f} примеров/с")
+
+    if not results:
+        return
+    baseline = results[0]
+    print(f"\n📊 ИТОГО (примеров/с, ускорение относительно {baseline['profile']}):")
+    print(f"   {'Профиль':<14} {'train':>14} {'val':>14} {'test':>14}")
+    for result in results:
+        cells = []
+        for key in ('train_samples_per_sec', 'val_samples_per_sec', 'test_samples_per_sec'):
+            speedup = result[key] / baseline[key] if baseline[key] else 0.0
+            cells.append(f"{result[key]:8.1f} x{speedup:.2f}")
+        print(f"   {result['profile']:<14} " + " ".join(f"{c:>14}" for c in cells))
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'model_name': model_name, 'data_dir': DATA_DIR, 'results': results}, f, indent=2)
+    print(f"\n💾 Результаты сохранены в {RESULTS_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,42 +5,97 @@
 - Регенерирует через улучшенные генераторы
 - Добавляет low-band data
 - Балансирует части
+- Опционально убирает почти-дубликаты (MinHash + LSH, near_duplicates.py):
+  --dedup drop — выбрасывает, --dedup weight — sample_weight = 1/k
+
+Использование:
+    python scripts/build_v1.3_clean.py [--dedup drop|weight]
 """
 
 import csv
+import itertools
 import random
 import os
 import shutil
-from collections import defaultdict
+import sys
+from collections import Counter, defaultdict
 from generate_part1_v2_clean import generate_part1_answer_v2_clean
 from generate_part2_v2_clean import generate_part2_answer_v2_clean
 from generate_part3_expansion_v2 import generate_part3_answer_v2
-from generate_synthetic_expansion import generate_realistic_subbands
+from generate_synthetic_expansion import generate_realistic_subbands, get_next_ids
 from improve_generation import determine_quality_flag
-from validate_and_filter import validate_part1, validate_part2, validate_part3
+from near_duplicates import NearDuplicateIndex, dedup_stage
+from streaming_pipeline import (ANSWER_FIELDNAMES, DatasetWriter, IdAllocator, chain, iter_csv, run_pipeline,
+                                tap_stage, validate_stage)
 
 def load_validation_results():
-    """Загружает результаты валидации"""
+    """Загружает результаты валидации (только action по answer_id)"""
     results = {}
-    with open('docs/validation_results_v1.3.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            results[row['answer_id']] = row
+    for row in iter_csv('docs/validation_results_v1.3.csv'):
+        results[row['answer_id']] = sys.intern(row['action'])
     return results
 
-def load_answers(filepath: str):
-    """Загружает ответы"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return list(csv.DictReader(f))
+def regenerate_answer(old_answer: dict) -> dict:
+    """Регенерирует ответ улучшенным генератором своей части"""
+    part = old_answer.get('part', '')
+    overall = float(old_answer.get('target_band_overall', 0))
+    fc = float(old_answer.get('target_band_fc', 0))
+    lr = float(old_answer.get('target_band_lr', 0))
+    gra = float(old_answer.get('target_band_gra', 0))
+    pr = float(old_answer.get('target_band_pr', 0))
+    
+    question_text = old_answer.get('question_text', '')
+    
+    if part == '1':
+        answer_text, duration = generate_part1_answer_v2_clean(question_text, overall, fc, lr, gra, pr)
+    elif part == '2':
+        answer_text, duration = generate_part2_answer_v2_clean(question_text, overall, fc, lr, gra, pr)
+    elif part == '3':
+        answer_text, duration = generate_part3_answer_v2(question_text, overall, fc, lr, gra, pr)
+    else:
+        return None
+    
+    new_answer = old_answer.copy()
+    new_answer['answer_text'] = answer_text
+    new_answer['transcript_raw'] = answer_text
+    new_answer['duration_sec'] = str(duration)
+    new_answer['source_type'] = 'synthetic_v1.3'
+    new_answer['quality_flag'] = determine_quality_flag(overall)
+    return new_answer
 
-def generate_low_band_data(count: int, part: str) -> list:
-    """Генерирует дополнительные low-band ответы"""
+def cleaned_v1_2_answers(validation: dict, stats: dict):
+    """Поток v1.2: keep → как есть, regenerate → новый текст, delete → пропуск"""
+    for answer in iter_csv('dataset_versions/v1.2/answers.csv'):
+        answer_id = answer.get('answer_id')
+        action = validation.get(answer_id, 'keep')
+        
+        if action == 'delete':
+            stats['delete'] += 1
+            continue
+        if action != 'regenerate':
+            stats['keep'] += 1
+            yield answer
+            continue
+        
+        stats['regenerate'] += 1
+        stats[f"regenerate_part{answer.get('part')}"] += 1
+        try:
+            new_answer = regenerate_answer(answer)
+        except Exception as e:
+            print(f"   ⚠️  Ошибка при регенерации {answer_id}: {e}")
+            # Оставляем старый ответ
+            yield answer
+            continue
+        if new_answer is not None:
+            stats['regenerated'] += 1
+            yield new_answer
+
+def generate_low_band_data(count: int, part: str, session_ids: list, user_ids: list, next_id: IdAllocator):
+    """Генерирует дополнительные low-band ответы (поток)"""
     from generate_synthetic_expansion import generate_part1_questions
     from generate_part2_expansion import generate_part2_questions
     from generate_part3_expansion import generate_part3_questions
     
-    new_answers = []
-    
     if part == '1':
         questions = generate_part1_questions()
     elif part == '2':
@@ -48,15 +103,6 @@ def generate_low_band_data(count: int, part: str) -> list:
     else:
         questions = generate_part3_questions()
     
-    # Загружаем существующих пользователей и сессии
-    with open('dataset_versions/v1.2/users.csv', 'r', encoding='utf-8') as f:
-        users = list(csv.DictReader(f))
-    with open('dataset_versions/v1.2/sessions.csv', 'r', encoding='utf-8') as f:
-        sessions = list(csv.DictReader(f))
-    
-    user_ids = [u['user_id'] for u in users]
-    session_ids = [s['session_id'] for s in sessions]
-    
     # Генерируем low-band ответы (4.0-5.0)
     bands = [4.0, 4.5, 5.0]
     
@@ -73,13 +119,8 @@ def generate_low_band_data(count: int, part: str) -> list:
         else:
             answer_text, duration = generate_part3_answer_v2(q_text, overall, fc, lr, gra, pr)
         
-        # Находим максимальный answer_id
-        max_id = 0
-        # Будем использовать простую нумерацию
-        answer_id = f'ans_{4022 + i + 1:04d}'
-        
-        new_answer = {
-            'answer_id': answer_id,
+        yield {
+            'answer_id': next_id(),
             'session_id': random.choice(session_ids),
             'user_id': random.choice(user_ids),
             'part': part,
@@ -96,108 +137,31 @@ def generate_low_band_data(count: int, part: str) -> list:
             'source_type': 'synthetic_v1.3_low_band',
             'quality_flag': determine_quality_flag(overall)
         }
-        
-        new_answers.append(new_answer)
-    
-    return new_answers
+
+LOW_BAND_COUNTS = {'1': 100, '2': 50, '3': 150}
 
 def main():
+    dedup_mode = None
+    if len(sys.argv) > 2 and sys.argv[1] == '--dedup':
+        dedup_mode = sys.argv[2]
+    
     print("=" * 70)
     print("СБОРКА V1.3: CLEAN & VALIDATED DATASET")
     print("=" * 70)
     
-    # Загружаем v1.2
-    print("\n📂 Загрузка v1.2...")
-    answers = load_answers('dataset_versions/v1.2/answers.csv')
-    print(f"   Загружено: {len(answers)} ответов")
-    
     # Загружаем результаты валидации
     print("\n📋 Загрузка результатов валидации...")
     validation = load_validation_results()
     print(f"   Загружено: {len(validation)} результатов")
     
-    # Разделяем на категории
-    to_keep = []
-    to_regenerate = []
-    to_delete = []
+    # Пользователи и сессии (для low-band ответов)
+    user_ids = [u['user_id'] for u in iter_csv('dataset_versions/v1.2/users.csv')]
+    session_ids = [s['session_id'] for s in iter_csv('dataset_versions/v1.2/sessions.csv')]
     
-    for answer in answers:
-        answer_id = answer.get('answer_id')
-        if answer_id not in validation:
-            to_keep.append(answer)
-            continue
-        
-        action = validation[answer_id]['action']
-        if action == 'keep':
-            to_keep.append(answer)
-        elif action == 'regenerate':
-            to_regenerate.append(answer)
-        elif action == 'delete':
-            to_delete.append(answer)
-    
-    print(f"\n📊 КАТЕГОРИИ:")
-    print(f"   ✅ Keep: {len(to_keep)}")
-    print(f"   🔄 Regenerate: {len(to_regenerate)}")
-    print(f"   🗑️  Delete: {len(to_delete)}")
-    
-    # Регенерируем
-    print(f"\n🔄 Регенерация {len(to_regenerate)} ответов...")
-    regenerated = []
-    
-    random.seed(42)
-    for old_answer in to_regenerate:
-        try:
-            part = old_answer.get('part', '')
-            overall = float(old_answer.get('target_band_overall', 0))
-            fc = float(old_answer.get('target_band_fc', 0))
-            lr = float(old_answer.get('target_band_lr', 0))
-            gra = float(old_answer.get('target_band_gra', 0))
-            pr = float(old_answer.get('target_band_pr', 0))
-            
-            question_text = old_answer.get('question_text', '')
-            
-            if part == '1':
-                answer_text, duration = generate_part1_answer_v2_clean(question_text, overall, fc, lr, gra, pr)
-            elif part == '2':
-                answer_text, duration = generate_part2_answer_v2_clean(question_text, overall, fc, lr, gra, pr)
-            elif part == '3':
-                answer_text, duration = generate_part3_answer_v2(question_text, overall, fc, lr, gra, pr)
-            else:
-                continue
-            
-            new_answer = old_answer.copy()
-            new_answer['answer_text'] = answer_text
-            new_answer['transcript_raw'] = answer_text
-            new_answer['duration_sec'] = str(duration)
-            new_answer['source_type'] = 'synthetic_v1.3'
-            new_answer['quality_flag'] = determine_quality_flag(overall)
-            
-            regenerated.append(new_answer)
-            
-        except Exception as e:
-            print(f"   ⚠️  Ошибка при регенерации {old_answer.get('answer_id')}: {e}")
-            # Оставляем старый ответ
-            to_keep.append(old_answer)
-    
-    print(f"   ✅ Регенерировано: {len(regenerated)}")
-    
-    # Добавляем low-band data
-    print(f"\n➕ Генерация дополнительных low-band ответов...")
-    low_band_p1 = generate_low_band_data(100, '1')
-    low_band_p2 = generate_low_band_data(50, '2')
-    low_band_p3 = generate_low_band_data(150, '3')
-    print(f"   Part 1: +{len(low_band_p1)}")
-    print(f"   Part 2: +{len(low_band_p2)}")
-    print(f"   Part 3: +{len(low_band_p3)}")
-    
-    # Объединяем все
-    all_answers = to_keep + regenerated + low_band_p1 + low_band_p2 + low_band_p3
-    
-    # Сортируем по answer_id
-    try:
-        all_answers.sort(key=lambda x: int(x['answer_id'].split('_')[1]))
-    except:
-        pass
+    # Новые ответы нумеруются после максимального id v1.2 (потоковый проход)
+    with open('dataset_versions/v1.2/answers.csv', 'r', encoding='utf-8') as f:
+        next_answer_id, _ = get_next_ids(csv.DictReader(f))
+    next_id = IdAllocator(next_answer_id, width=4)
     
     # Создаем v1.3
     output_dir = 'dataset_versions/v1.3'
@@ -210,54 +174,75 @@ def main():
         if os.path.exists(src):
             shutil.copy2(src, dst)
     
-    # Сохраняем answers
-    output_file = f'{output_dir}/answers.csv'
-    print(f"\n💾 Сохранение в {output_file}...")
+    # Поток: v1.2 (keep/regenerate) → low-band Part 1/2/3 → валидация → запись
+    stats = defaultdict(int)
+    validation_stats = Counter()
+    part_counts = defaultdict(int)
+    low_mid = 0
+    high = 0
     
-    fieldnames = ['answer_id', 'session_id', 'user_id', 'part', 'question_id', 'question_text',
-                 'answer_text', 'duration_sec', 'target_band_overall', 'target_band_fc',
-                 'target_band_lr', 'target_band_gra', 'target_band_pr', 'transcript_raw',
-                 'source_type', 'quality_flag']
+    def collect(answer):
+        nonlocal low_mid, high
+        part_counts[answer['part']] += 1
+        try:
+            overall = float(answer.get('target_band_overall', 0))
+        except (ValueError, TypeError):
+            return
+        if overall <= 6.0:
+            low_mid += 1
+        if overall >= 6.5:
+            high += 1
     
-    # Очищаем от None
-    cleaned_answers = []
-    for answer in all_answers:
-        cleaned = {k: (answer.get(k) or '') for k in fieldnames}
-        cleaned_answers.append(cleaned)
+    random.seed(42)
+    low_band = [generate_low_band_data(LOW_BAND_COUNTS[part], part, session_ids, user_ids, next_id)
+                for part in ('1', '2', '3')]
+    stages = [validate_stage(validation_stats)]
+    dedup_stats = Counter()
+    fieldnames = ANSWER_FIELDNAMES
+    if dedup_mode:
+        stages.append(dedup_stage(NearDuplicateIndex(), dedup_stats, dedup_mode))
+        if dedup_mode == 'weight':
+            fieldnames = ANSWER_FIELDNAMES + ['sample_weight']
+    records = chain(
+        itertools.chain(cleaned_v1_2_answers(validation, stats), *low_band),
+        *stages,
+        tap_stage(collect),
+    )
     
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(cleaned_answers)
+    output_file = f'{output_dir}/answers.csv'
+    print(f"\n🔄 Потоковая сборка в {output_file}...")
+    total = run_pipeline(records, DatasetWriter(output_file, fieldnames))
+    dropped = dedup_stats['duplicates'] if dedup_mode == 'drop' else 0
+    low_band_added = total + dropped - stats['keep'] - stats['regenerate']
+    
+    print(f"\n📊 КАТЕГОРИИ:")
+    print(f"   ✅ Keep: {stats['keep']}")
+    print(f"   🔄 Regenerate: {stats['regenerate']} (регенерировано: {stats['regenerated']})")
+    print(f"   🗑️  Delete: {stats['delete']}")
+    print(f"   ➕ Low-band: {low_band_added} "
+          f"(Part 1: +{LOW_BAND_COUNTS['1']}, Part 2: +{LOW_BAND_COUNTS['2']}, Part 3: +{LOW_BAND_COUNTS['3']})")
+    print(f"   🔍 Повторная валидация: keep={validation_stats['keep']}, "
+          f"regenerate={validation_stats['regenerate']}, delete={validation_stats['delete']}")
+    if dedup_mode:
+        action = 'удалено' if dedup_mode == 'drop' else 'sample_weight = 1/k'
+        print(f"   🧬 Почти-дубликаты: {dedup_stats['duplicates']} из {dedup_stats['total']} ({action}; "
+              f"Part 1: {dedup_stats['duplicates_part1']}, Part 2: {dedup_stats['duplicates_part2']}, "
+              f"Part 3: {dedup_stats['duplicates_part3']})")
     
     # Статистика
     print("\n" + "=" * 70)
     print("✅ СТАТИСТИКА V1.3")
     print("=" * 70)
-    print(f"   Всего ответов: {len(cleaned_answers)}")
-    
-    part_counts = defaultdict(int)
-    for a in cleaned_answers:
-        part_counts[a['part']] += 1
+    print(f"   Всего ответов: {total}")
     
     for part in sorted(part_counts.keys()):
         count = part_counts[part]
-        pct = count / len(cleaned_answers) * 100
+        pct = count / total * 100
         print(f"   Part {part}: {count} ({pct:.1f}%)")
     
-    # Распределение по бэндам
-    overall_scores = []
-    for a in cleaned_answers:
-        try:
-            overall_scores.append(float(a.get('target_band_overall', 0)))
-        except:
-            pass
-    
-    low_mid = sum(1 for s in overall_scores if s <= 6.0)
-    high = sum(1 for s in overall_scores if s >= 6.5)
-    
-    print(f"\n   Low-Mid (≤6.0): {low_mid} ({low_mid/len(overall_scores)*100:.1f}%)")
-    print(f"   High (≥6.5): {high} ({high/len(overall_scores)*100:.1f}%)")
+    scored = low_mid + high
+    print(f"\n   Low-Mid (≤6.0): {low_mid} ({low_mid/scored*100:.1f}%)")
+    print(f"   High (≥6.5): {high} ({high/scored*100:.1f}%)")
     
     # Сохраняем changelog
     changelog = f"""# V1.3 Changelog
@@ -265,20 +250,23 @@ def main():
 ## Изменения от v1.2
 
 ### Удалено
-- {len(to_delete)} проблемных ответов
+- {stats['delete']} проблемных ответов
 
 ### Регенерировано
-- Part 1: {sum(1 for a in to_regenerate if a.get('part') == '1')} ответов
-- Part 2: {sum(1 for a in to_regenerate if a.get('part') == '2')} ответов
-- Part 3: {sum(1 for a in to_regenerate if a.get('part') == '3')} ответов
+- Part 1: {stats['regenerate_part1']} ответов
+- Part 2: {stats['regenerate_part2']} ответов
+- Part 3: {stats['regenerate_part3']} ответов
 
 ### Добавлено
-- Part 1: +{len(low_band_p1)} low-band ответов (4.0-5.0)
-- Part 2: +{len(low_band_p2)} low-band ответов
-- Part 3: +{len(low_band_p3)} low-band ответов
+- Part 1: +{LOW_BAND_COUNTS['1']} low-band ответов (4.0-5.0)
+- Part 2: +{LOW_BAND_COUNTS['2']} low-band ответов
+- Part 3: +{LOW_BAND_COUNTS['3']} low-band ответов
+
+### Почти-дубликаты (MinHash + LSH)
+- {f"{dedup_stats['duplicates']} ответов ({'удалены' if dedup_mode == 'drop' else 'sample_weight = 1/k'})" if dedup_mode else 'не обрабатывались'}
 
 ### Итого
-- Всего ответов: {len(cleaned_answers)}
+- Всего ответов: {total}
 - Part 1: {part_counts.get('1', 0)}
 - Part 2: {part_counts.get('2', 0)}
 - Part 3: {part_counts.get('3', 0)}
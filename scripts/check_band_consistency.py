@@ -2,56 +2,26 @@
 """
 Проверка consistency бэндов
 Находит ответы, где overall не соответствует тексту
+
+check_consistency(answer) — проверка одной строки;
+extract_consistency_features / check_consistency_batch — пакетный вариант для
+всей колонки текстов (признаки — общий экстрактор text_features.py, правила —
+векторные маски).
+
+Признаки кэшируются в validation_store по (answer_id, хэш текста, версия
+извлечения признаков): при повторном запуске считаются только для новых и
+измененных ответов, а правила (дешевые маски) применяются ко всем строкам.
 """
 
 import csv
-import re
 from collections import defaultdict
+from typing import List, Sequence, Tuple
+
+import numpy as np
 
-def count_complex_structures(text: str) -> int:
-    """Считает сложные грамматические структуры"""
-    count = 0
-    # Relative clauses
-    if re.search(r'\b(who|which|that|where|when)\s+\w+', text, re.I):
-        count += 1
-    # Past perfect
-    if re.search(r'\bhad\s+\w+ed\b', text, re.I):
-        count += 1
-    # Conditionals
-    if re.search(r'\b(if|unless|provided)\s+', text, re.I):
-        count += 1
-    # Complex linking
-    if re.search(r'\b(however|moreover|furthermore|nevertheless|consequently)\b', text, re.I):
-        count += 1
-    return count
-
-def count_advanced_vocab(text: str) -> int:
-    """Считает продвинутую лексику"""
-    advanced_words = [
-        'significant', 'considerable', 'substantial', 'profound', 'fundamental',
-        'comprehensive', 'sophisticated', 'nuanced', 'intricate', 'complex',
-        'appreciate', 'value', 'acknowledge', 'recognize', 'perceive',
-        'challenge', 'opportunity', 'perspective', 'approach', 'strategy'
-    ]
-    text_lower = text.lower()
-    count = sum(1 for word in advanced_words if word in text_lower)
-    return count
-
-def count_errors(text: str) -> int:
-    """Считает грамматические ошибки"""
-    count = 0
-    # Пропуск артиклей
-    if re.search(r'\b(he|she|it|they)\s+(go|do|make|have|be)\b', text, re.I):
-        count += 1
-    # Неправильные времена
-    if re.search(r'\b(yesterday|last\s+week)\s+\w+\s+(is|are|am)\b', text, re.I):
-        count += 1
-    # Повторы слов
-    words = text.lower().split()
-    for i in range(len(words) - 1):
-        if words[i] == words[i+1] and len(words[i]) > 3:
-            count += 1
-    return count
+from dataset_loader import load_table
+from text_features import FEATURES_VERSION, extract_text_features, feature_columns, text_features
+from validation_store import ValidationStore, content_hash
 
 def check_consistency(answer: dict) -> dict:
     """Проверяет consistency бэнда и текста"""
@@ -67,10 +37,11 @@ def check_consistency(answer: dict) -> dict:
             'action': 'delete'
         }
     
-    word_count = len(text.split())
-    complex_structures = count_complex_structures(text)
-    advanced_vocab = count_advanced_vocab(text)
-    errors = count_errors(text)
+    features = text_features(text)
+    word_count = int(features['num_words'])
+    complex_structures = int(features['complex_structures'])
+    advanced_vocab = int(features['advanced_vocab'])
+    errors = int(features['errors'])
     
     issues = []
     action = 'ok'
@@ -114,6 +85,76 @@ def check_consistency(answer: dict) -> dict:
         'action': action
     }
 
+# ----------------------------------------------------------------------
+# Пакетный вариант
+# ----------------------------------------------------------------------
+
+FEATURE_COLUMNS = ('word_count', 'complex_structures', 'advanced_vocab', 'errors')
+# word_count — это num_words общего экстрактора
+_TEXT_FEATURE_NAMES = ('num_words', 'complex_structures', 'advanced_vocab', 'errors')
+
+def extract_consistency_features(texts: Sequence[str]) -> np.ndarray:
+    """Признаки для всей колонки текстов: матрица (n, 4) int32 в порядке FEATURE_COLUMNS"""
+    return feature_columns(extract_text_features(texts), _TEXT_FEATURE_NAMES).astype(np.int32)
+
+# Правила: (сообщение, маска(overall, word_count, complex, vocab, errors)) — порядок как в check_consistency
+CONSISTENCY_RULES = [
+    (lambda f: f"High band but short ({f[0]} words)",
+     lambda o, wc, cs, av, er: (o >= 7.0) & (wc < 30)),
+    (lambda f: "High band but no complex structures",
+     lambda o, wc, cs, av, er: (o >= 7.5) & (cs == 0)),
+    (lambda f: "High band but limited vocabulary",
+     lambda o, wc, cs, av, er: (o >= 7.5) & (av < 2)),
+    (lambda f: f"High band but many errors ({f[3]})",
+     lambda o, wc, cs, av, er: (o >= 7.0) & (er > 2)),
+    (lambda f: f"Low band but complex structures ({f[1]})",
+     lambda o, wc, cs, av, er: (o <= 5.0) & (cs > 2)),
+    (lambda f: f"Low band but advanced vocab ({f[2]})",
+     lambda o, wc, cs, av, er: (o <= 5.0) & (av > 3)),
+    (lambda f: "Low band but no errors",
+     lambda o, wc, cs, av, er: (o <= 4.5) & (er == 0)),
+]
+
+def check_consistency_batch(overall: np.ndarray, features: np.ndarray) -> Tuple[np.ndarray, List[List[str]]]:
+    """
+    Векторное применение правил check_consistency.
+    Возвращает (actions, issues): actions — object-массив 'ok'/'regenerate'/'delete'
+    (NaN в overall → 'delete'), issues — списки сообщений по строкам.
+    """
+    overall = np.asarray(overall, dtype=np.float64)
+    masks = np.column_stack([rule(overall, *features.T) for _, rule in CONSISTENCY_RULES]) \
+        if len(overall) else np.zeros((0, len(CONSISTENCY_RULES)), dtype=bool)
+
+    actions = np.full(len(overall), 'ok', dtype=object)
+    actions[masks.any(axis=1)] = 'regenerate'
+    invalid = np.isnan(overall)
+    actions[invalid] = 'delete'
+
+    issues = [[] for _ in range(len(overall))]
+    for row, rule_index in zip(*np.nonzero(masks)):
+        issues[row].append(CONSISTENCY_RULES[rule_index][0](features[row]))
+    for row in np.flatnonzero(invalid):
+        issues[row] = ['Invalid score']
+    return actions, issues
+
+def cached_consistency_features(answer_ids: Sequence[str], texts: Sequence[str],
+                                store: ValidationStore) -> np.ndarray:
+    """extract_consistency_features только для новых/измененных текстов"""
+    features = np.zeros((len(texts), len(FEATURE_COLUMNS)), dtype=np.int32)
+    keys = [content_hash({'answer_text': t}, ('answer_text',)) for t in texts]
+    stale = []
+    for i, (answer_id, key) in enumerate(zip(answer_ids, keys)):
+        cached = store.get(answer_id, key, FEATURES_VERSION)
+        if cached is None:
+            stale.append(i)
+        else:
+            features[i] = cached
+    if stale:
+        features[stale] = extract_consistency_features([texts[i] for i in stale])
+        for i in stale:
+            store.put(answer_ids[i], keys[i], FEATURES_VERSION, features[i].tolist())
+    return features
+
 def main():
     print("=" * 70)
     print("ПРОВЕРКА CONSISTENCY БЭНДОВ")
@@ -121,59 +162,54 @@ def main():
     
     filepath = 'dataset_versions/v1.3/answers.csv'
     
-    with open(filepath, 'r', encoding='utf-8') as f:
-        answers = list(csv.DictReader(f))
+    table = load_table(filepath)
     
-    print(f"\n📂 Загружено: {len(answers)} ответов")
+    print(f"\n📂 Загружено: {len(table)} ответов")
     
-    # Проверяем все
-    results = []
-    for answer in answers:
-        result = check_consistency(answer)
-        results.append(result)
+    # Проверяем все (пакетно; признаки — из хранилища, если текст не менялся)
+    overall = table['target_band_overall']
+    answer_ids = table['answer_id']
+    parts = table['part']
+    store = ValidationStore('check_band_consistency')
+    features = cached_consistency_features(answer_ids, table['answer_text'], store)
+    store.save()
+    print(f"   ♻️  Инкрементально: {store.summary()}")
+    actions, issues = check_consistency_batch(overall, features)
     
     # Статистика
-    actions = defaultdict(int)
-    for r in results:
-        actions[r['action']] += 1
+    total = len(table)
+    counts = defaultdict(int, zip(*np.unique(actions.astype(str), return_counts=True))) if total else defaultdict(int)
     
     print(f"\n📊 РЕЗУЛЬТАТЫ:")
-    print(f"   ✅ OK: {actions['ok']} ({actions['ok']/len(results)*100:.1f}%)")
-    print(f"   🔄 Regenerate: {actions['regenerate']} ({actions['regenerate']/len(results)*100:.1f}%)")
-    print(f"   🗑️  Delete: {actions['delete']} ({actions['delete']/len(results)*100:.1f}%)")
+    print(f"   ✅ OK: {counts['ok']} ({counts['ok']/total*100:.1f}%)")
+    print(f"   🔄 Regenerate: {counts['regenerate']} ({counts['regenerate']/total*100:.1f}%)")
+    print(f"   🗑️  Delete: {counts['delete']} ({counts['delete']/total*100:.1f}%)")
     
     # Примеры проблемных
-    problematic = [r for r in results if r['action'] != 'ok']
+    problematic = np.flatnonzero(actions != 'ok')
     print(f"\n🔴 ПРОБЛЕМНЫХ: {len(problematic)}")
     
-    if problematic:
+    if len(problematic):
         print("\n   Примеры:")
-        for r in problematic[:5]:
-            print(f"   - {r['answer_id']} (Part {r['part']}, Overall {r['overall']}): {', '.join(r['issues'])}")
+        for i in problematic[:5]:
+            print(f"   - {answer_ids[i]} (Part {parts[i]}, Overall {float(overall[i])}): {', '.join(issues[i])}")
     
     # Сохраняем результаты
     output_file = 'docs/consistency_check_v1.3.csv'
     with open(output_file, 'w', encoding='utf-8', newline='') as f:
         fieldnames = ['answer_id', 'part', 'overall', 'word_count', 'complex_structures',
                      'advanced_vocab', 'errors', 'action', 'issues']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for result in results:
-            writer.writerow({
-                'answer_id': result['answer_id'],
-                'part': result['part'],
-                'overall': result['overall'],
-                'word_count': result['word_count'],
-                'complex_structures': result['complex_structures'],
-                'advanced_vocab': result['advanced_vocab'],
-                'errors': result['errors'],
-                'action': result['action'],
-                'issues': '; '.join(result['issues'])
-            })
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+        for i in range(total):
+            if np.isnan(overall[i]):
+                writer.writerow([answer_ids[i], parts[i], 0, '', '', '', '', actions[i], issues[i][0]])
+                continue
+            writer.writerow([answer_ids[i], parts[i], float(overall[i]), *features[i].tolist(),
+                             actions[i], '; '.join(issues[i])])
     
     print(f"\n💾 Результаты сохранены в {output_file}")
     print(f"\n✅ Проверка завершена")
 
 if __name__ == '__main__':
     main()
-
@@ -6,7 +6,6 @@
 import csv
 import sys
 from baseline_model import load_answers_from_csv, prepare_data, split_by_user, evaluate_model, evaluate_by_band_range
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestRegressor
 import numpy as np
 
@@ -3,12 +3,30 @@
 Создание train/val/test split с учетом session_id и стратификации
 - Не допускает утечку по session_id
 - Стратификация по Part и Band-группам
+
+Сплит сохраняется манифестом, а не копиями строк: splits/{train,val,test}.npy —
+отсортированные индексы строк родительского файла, split_metadata.json —
+родитель (+ sha256), seed, доли и стратификация. load_table('.../train.csv')
+открывает сплит как SplitView над родителем (dataset_loader.py).
+--csv дополнительно пишет train.csv/val.csv/test.csv (для внешних инструментов).
+
+Использование:
+    python scripts/create_train_val_test_split.py [answers_fixed.csv] [--seed 42] [--train 0.8] [--val 0.1] [--csv]
 """
 
 import csv
+import json
+import os
 import random
+import sys
 from collections import defaultdict
 
+import numpy as np
+
+from dataset_loader import SPLIT_METADATA, load_table
+
+SPLIT_NAMES = ('train', 'val', 'test')
+
 def get_band_group(overall: float) -> str:
     """Определяет группу бэнда"""
     if overall <= 5.5:
@@ -18,13 +36,13 @@ def get_band_group(overall: float) -> str:
     else:
         return 'high'
 
-def create_split(answers_file: str, train_ratio: float = 0.8, val_ratio: float = 0.1):
-    """Создает train/val/test split"""
+def create_split(answers_file: str, train_ratio: float = 0.8, val_ratio: float = 0.1,
+                 seed: int = 42, write_csv: bool = False):
+    """Создает train/val/test split (манифест индексов рядом с answers_file)"""
     
     # Загружаем ответы
-    answers = []
-    with open(answers_file, 'r', encoding='utf-8') as f:
-        answers = list(csv.DictReader(f))
+    table = load_table(answers_file)
+    answers = table.rows()
     
     print(f"📂 Загружено: {len(answers)} ответов")
     
@@ -69,7 +87,7 @@ def create_split(answers_file: str, train_ratio: float = 0.8, val_ratio: float =
         print(f"   {strata}: {len(sessions)} сессий")
     
     # Разделяем сессии на train/val/test
-    random.seed(42)
+    random.seed(seed)
     
     train_sessions = set()
     val_sessions = set()
@@ -91,22 +109,24 @@ def create_split(answers_file: str, train_ratio: float = 0.8, val_ratio: float =
     print(f"   Val: {len(val_sessions)} сессий")
     print(f"   Test: {len(test_sessions)} сессий")
     
-    # Разделяем ответы
-    train_answers = []
-    val_answers = []
-    test_answers = []
+    # Разделяем ответы (индексы строк в исходном порядке — уже отсортированы)
+    split_indices = {name: [] for name in SPLIT_NAMES}
     
-    for answer in answers:
+    for index, answer in enumerate(answers):
         session_id = answer.get('session_id', '')
         if session_id in train_sessions:
-            train_answers.append(answer)
+            split_indices['train'].append(index)
         elif session_id in val_sessions:
-            val_answers.append(answer)
+            split_indices['val'].append(index)
         elif session_id in test_sessions:
-            test_answers.append(answer)
+            split_indices['test'].append(index)
         else:
             # Если сессия не попала никуда (не должно быть), идем в train
-            train_answers.append(answer)
+            split_indices['train'].append(index)
+    
+    train_answers = [answers[i] for i in split_indices['train']]
+    val_answers = [answers[i] for i in split_indices['val']]
+    test_answers = [answers[i] for i in split_indices['test']]
     
     print(f"\n📊 Разделение ответов:")
     print(f"   Train: {len(train_answers)} ответов ({len(train_answers)/len(answers)*100:.1f}%)")
@@ -134,21 +154,35 @@ def create_split(answers_file: str, train_ratio: float = 0.8, val_ratio: float =
         count = train_bands.get(band, 0)
         print(f"   {band}: {count} ({count/len(train_answers)*100:.1f}%)")
     
-    # Сохраняем
-    fieldnames = ['answer_id', 'session_id', 'user_id', 'part', 'question_id', 'question_text',
-                 'answer_text', 'duration_sec', 'target_band_overall', 'target_band_fc',
-                 'target_band_lr', 'target_band_gra', 'target_band_pr', 'transcript_raw',
-                 'source_type', 'quality_flag', 'sample_weight', 'is_inconsistent']
-    
-    for split_name, split_answers in [('train', train_answers), ('val', val_answers), ('test', test_answers)]:
-        output_file = f'dataset_versions/v1.3/{split_name}.csv'
-        with open(output_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for answer in split_answers:
-                row = {k: answer.get(k, '') for k in fieldnames}
-                writer.writerow(row)
-        print(f"\n💾 {split_name.capitalize()} сохранен в {output_file}")
+    # Сохраняем манифест: индексы + метаданные
+    output_dir = os.path.dirname(answers_file)
+    os.makedirs(os.path.join(output_dir, 'splits'), exist_ok=True)
+    splits = {}
+    for split_name in SPLIT_NAMES:
+        indices_file = f'splits/{split_name}.npy'
+        np.save(os.path.join(output_dir, indices_file), np.asarray(split_indices[split_name], dtype=np.int32))
+        splits[split_name] = {'indices': indices_file, 'count': len(split_indices[split_name])}
+        print(f"\n💾 {split_name.capitalize()}: {len(split_indices[split_name])} индексов → {output_dir}/{indices_file}")
+    
+    if write_csv:
+        fieldnames = table.fieldnames
+        for split_name, split_answers in [('train', train_answers), ('val', val_answers), ('test', test_answers)]:
+            output_file = os.path.join(output_dir, f'{split_name}.csv')
+            with open(output_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                for answer in split_answers:
+                    row = {k: answer.get(k, '') for k in fieldnames}
+                    writer.writerow(row)
+            print(f"💾 {split_name.capitalize()} сохранен в {output_file}")
+    
+    strata_counts = {}
+    for strata, sessions in sessions_by_strata.items():
+        strata_counts[strata] = {
+            'train': sum(s in train_sessions for s in sessions),
+            'val': sum(s in val_sessions for s in sessions),
+            'test': sum(s in test_sessions for s in sessions),
+        }
     
     # Сохраняем метаданные
     metadata = {
@@ -163,17 +197,38 @@ def create_split(answers_file: str, train_ratio: float = 0.8, val_ratio: float =
         'train_sessions': len(train_sessions),
         'val_sessions': len(val_sessions),
         'test_sessions': len(test_sessions),
+        'source': os.path.basename(answers_file),
+        'source_sha256': table.source_sha256,
+        'seed': seed,
+        'requested_ratios': {'train': train_ratio, 'val': val_ratio},
+        'strata_sessions': strata_counts,
+        'splits': splits,
     }
     
-    import json
-    with open('dataset_versions/v1.3/split_metadata.json', 'w', encoding='utf-8') as f:
+    metadata_file = os.path.join(output_dir, SPLIT_METADATA)
+    with open(metadata_file, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, indent=2)
     
-    print(f"\n💾 Метаданные сохранены в dataset_versions/v1.3/split_metadata.json")
+    print(f"\n💾 Метаданные сохранены в {metadata_file}")
     print(f"\n✅ Split создан успешно")
 
-if __name__ == '__main__':
-    import sys
-    answers_file = sys.argv[1] if len(sys.argv) > 1 else 'dataset_versions/v1.3/answers_fixed.csv'
-    create_split(answers_file)
+def parse_options(argv):
+    answers_file = 'dataset_versions/v1.3/answers_fixed.csv'
+    options = {'seed': 42, 'train_ratio': 0.8, 'val_ratio': 0.1, 'write_csv': False}
+    args = iter(argv)
+    for arg in args:
+        if arg == '--seed':
+            options['seed'] = int(next(args))
+        elif arg == '--train':
+            options['train_ratio'] = float(next(args))
+        elif arg == '--val':
+            options['val_ratio'] = float(next(args))
+        elif arg == '--csv':
+            options['write_csv'] = True
+        else:
+            answers_file = arg
+    return answers_file, options
 
+if __name__ == '__main__':
+    answers_file, options = parse_options(sys.argv[1:])
+    create_split(answers_file, **options)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Бинарный кэш распарсенных версий датасета
+
+Рядом с каждой версией (dataset_versions/v1.x/.cache/<file>/) хранится
+memory-mappable копия CSV:
+- числовые колонки → .npy (np.load с mmap_mode='r')
+- повторяющиеся строки (part, user_id, quality_flag, ...) → коды + словарь
+- уникальные тексты (answer_text, ...) → blob UTF-8 + массив смещений,
+  строки декодируются лениво, по требованию
+
+Кэш инвалидируется по mtime/размеру исходного файла; при изменении mtime
+дополнительно сверяется sha256 (если содержимое то же — кэш переиспользуется).
+
+Использование:
+    python scripts/dataset_cache.py dataset_versions/v1.3
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import List, Optional
+
+import numpy as np
+
+from dataset_loader import (DATASET_FILES, FLOAT_COLUMNS, INT_COLUMNS, INTERNED_COLUMNS,
+                            ColumnTable, build_column, parse_csv)
+
+CACHE_DIR = '.cache'
+CACHE_FORMAT = 1
+
+
+def file_sha256(filepath: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 содержимого файла (потоково)"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir_for(filepath: str) -> str:
+    """Каталог кэша для CSV: <dir>/.cache/<имя без .csv>"""
+    directory, filename = os.path.split(os.path.abspath(filepath))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(filename)[0])
+
+
+class TextColumn:
+    """
+    Строковая колонка поверх blob + offsets (без декодирования при загрузке).
+    Поддерживает col[i] → str, col[mask/indices] → object-массив, np.asarray(col).
+    """
+    dtype = np.dtype(object)
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray, intern: bool = False):
+        self.offsets = offsets
+        self.blob = blob
+        self.intern = intern
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _decode(self, index: int) -> str:
+        value = self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+        return sys.intern(value) if self.intern else value
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self._decode(int(key) % len(self))
+        indices = np.arange(len(self))[key]
+        out = np.empty(len(indices), dtype=object)
+        out[:] = [self._decode(i) for i in indices]
+        return out
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._decode(i)
+
+    def __array__(self, dtype=None, copy=None):
+        return self[:]
+
+
+def _encode_strings(values) -> tuple:
+    """Список строк → (offsets int64[n+1], blob uint8)"""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _load_blob(path: str) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def _write_strings(directory: str, name: str, values):
+    offsets, blob = _encode_strings(values)
+    np.save(os.path.join(directory, f'{name}.offsets.npy'), offsets)
+    with open(os.path.join(directory, f'{name}.blob'), 'wb') as f:
+        f.write(blob.tobytes())
+
+
+def _read_strings(directory: str, name: str, intern: bool = False) -> TextColumn:
+    offsets = np.load(os.path.join(directory, f'{name}.offsets.npy'), mmap_mode='r')
+    blob = _load_blob(os.path.join(directory, f'{name}.blob'))
+    return TextColumn(offsets, blob, intern=intern)
+
+
+def write_cache(table: ColumnTable, cache_dir: str, source: dict):
+    """Сохраняет ColumnTable в каталог кэша (атомарно через временный каталог)"""
+    tmp_dir = f'{cache_dir}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    kinds = {}
+    for name in table.fieldnames:
+        column = table.columns[name]
+        if column.dtype != object:
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(column))
+            kinds[name] = 'numeric'
+            continue
+        vocab = {}
+        codes = np.fromiter((vocab.setdefault(v, len(vocab)) for v in column),
+                            dtype=np.int32, count=len(column))
+        if len(vocab) <= max(1, len(column) // 2):
+            # Повторяющиеся значения: словарь + int32 коды
+            np.save(os.path.join(tmp_dir, f'{name}.codes.npy'), codes)
+            _write_strings(tmp_dir, f'{name}.vocab', list(vocab))
+            kinds[name] = 'category'
+        else:
+            _write_strings(tmp_dir, name, column)
+            kinds[name] = 'text'
+
+    meta = {
+        'format': CACHE_FORMAT,
+        'source': source,
+        'rows': len(table),
+        'fieldnames': table.fieldnames,
+        'kinds': kinds,
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def read_cache(cache_dir: str, meta: dict) -> ColumnTable:
+    """Открывает кэш как ColumnTable (числа — mmap, тексты — лениво)"""
+    columns = {}
+    for name in meta['fieldnames']:
+        kind = meta['kinds'][name]
+        if kind == 'numeric':
+            columns[name] = np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode='r')
+        elif kind == 'category':
+            vocab = np.asarray(_read_strings(cache_dir, f'{name}.vocab', intern=True))
+            codes = np.load(os.path.join(cache_dir, f'{name}.codes.npy'), mmap_mode='r')
+            columns[name] = vocab[codes]
+        else:
+            columns[name] = _read_strings(cache_dir, name, intern=name in INTERNED_COLUMNS)
+    return ColumnTable(columns, meta['fieldnames'])
+
+
+def _read_meta(cache_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format') == CACHE_FORMAT else None
+
+
+class StreamingCacheWriter:
+    """
+    Инкрементальная запись кэша по батчам строк (память не растет с числом строк).
+    Колонки пишутся в сырые файлы, а в close() превращаются в формат read_cache.
+    """
+
+    def __init__(self, cache_dir: str, fieldnames: List[str]):
+        self.cache_dir = cache_dir
+        self.fieldnames = list(fieldnames)
+        self.tmp_dir = f'{cache_dir}.tmp{os.getpid()}'
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+
+        self.rows = 0
+        self.kinds = {}
+        self.vocabs = {}
+        self.blob_sizes = {}
+        self.files = {}
+        for name in self.fieldnames:
+            if name in FLOAT_COLUMNS or name in INT_COLUMNS:
+                self.kinds[name] = 'numeric'
+                self.files[name] = open(self._path(f'{name}.raw'), 'wb')
+            elif name in INTERNED_COLUMNS and name != 'answer_id':
+                self.kinds[name] = 'category'
+                self.vocabs[name] = {}
+                self.files[name] = open(self._path(f'{name}.codes.raw'), 'wb')
+            else:
+                self.kinds[name] = 'text'
+                self.blob_sizes[name] = 0
+                self.files[name] = (open(self._path(f'{name}.blob'), 'wb'),
+                                    open(self._path(f'{name}.offsets.raw'), 'wb'))
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.tmp_dir, filename)
+
+    def write_rows(self, rows: List[dict]):
+        """Дописывает батч строк (значения — строки, как в CSV)"""
+        if not rows:
+            return
+        for name in self.fieldnames:
+            values = ['' if row.get(name) is None else str(row.get(name)) for row in rows]
+            kind = self.kinds[name]
+            if kind == 'numeric':
+                self.files[name].write(build_column(name, values).tobytes())
+            elif kind == 'category':
+                vocab = self.vocabs[name]
+                codes = np.fromiter((vocab.setdefault(v, len(vocab)) for v in values),
+                                    dtype=np.int32, count=len(values))
+                self.files[name].write(codes.tobytes())
+            else:
+                blob_file, offsets_file = self.files[name]
+                encoded = [v.encode('utf-8') for v in values]
+                ends = self.blob_sizes[name] + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+                blob_file.write(b''.join(encoded))
+                offsets_file.write(ends.tobytes())
+                self.blob_sizes[name] = int(ends[-1])
+        self.rows += len(rows)
+
+    def _raw_to_npy(self, raw_name: str, npy_name: str, dtype, prefix=None):
+        """Сырой файл → .npy через memmap (без загрузки в память целиком)"""
+        raw_path = self._path(raw_name)
+        n = os.path.getsize(raw_path) // np.dtype(dtype).itemsize
+        extra = 0 if prefix is None else 1
+        out = np.lib.format.open_memmap(self._path(npy_name), mode='w+', dtype=dtype, shape=(n + extra,))
+        if prefix is not None:
+            out[0] = prefix
+        if n:
+            out[extra:] = np.memmap(raw_path, dtype=dtype, mode='r', shape=(n,))
+        out.flush()
+        del out
+        os.remove(raw_path)
+
+    def abort(self):
+        """Бросает незаконченный кэш (исходный CSV не дописан)"""
+        for handles in self.files.values():
+            for handle in (handles if isinstance(handles, tuple) else (handles,)):
+                handle.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def close(self, source_path: str):
+        """Финализирует кэш для уже записанного и закрытого CSV source_path"""
+        for name in self.fieldnames:
+            handles = self.files[name]
+            for handle in (handles if isinstance(handles, tuple) else (handles,)):
+                handle.close()
+            kind = self.kinds[name]
+            if kind == 'numeric':
+                dtype = np.float64 if name in FLOAT_COLUMNS else np.int32
+                self._raw_to_npy(f'{name}.raw', f'{name}.npy', dtype)
+            elif kind == 'category':
+                self._raw_to_npy(f'{name}.codes.raw', f'{name}.codes.npy', np.int32)
+                _write_strings(self.tmp_dir, f'{name}.vocab', list(self.vocabs[name]))
+            else:
+                self._raw_to_npy(f'{name}.offsets.raw', f'{name}.offsets.npy', np.int64, prefix=0)
+
+        stat = os.stat(source_path)
+        meta = {
+            'format': CACHE_FORMAT,
+            'source': {'sha256': file_sha256(source_path), 'mtime_ns': stat.st_mtime_ns,
+                       'size': stat.st_size},
+            'rows': self.rows,
+            'fieldnames': self.fieldnames,
+            'kinds': self.kinds,
+        }
+        with open(self._path('meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.cache_dir)
+
+
+def _with_source(table: ColumnTable, source: dict) -> ColumnTable:
+    table.source_sha256 = source['sha256']
+    return table
+
+
+def load_cached_table(filepath: str) -> ColumnTable:
+    """
+    Загружает CSV через кэш: валидный кэш открывается за миллисекунды,
+    иначе CSV парсится и кэш перестраивается.
+    """
+    stat = os.stat(filepath)
+    cache_dir = cache_dir_for(filepath)
+    meta = _read_meta(cache_dir)
+
+    if meta is not None:
+        source = meta['source']
+        if source['mtime_ns'] == stat.st_mtime_ns and source['size'] == stat.st_size:
+            return _with_source(read_cache(cache_dir, meta), source)
+        # mtime поменялся (git checkout, touch) — сверяем содержимое
+        if source['size'] == stat.st_size and source['sha256'] == file_sha256(filepath):
+            meta['source']['mtime_ns'] = stat.st_mtime_ns
+            try:
+                with open(os.path.join(cache_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, indent=2)
+            except OSError:
+                pass
+            return _with_source(read_cache(cache_dir, meta), source)
+
+    table = parse_csv(filepath)
+    source = {'sha256': file_sha256(filepath), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    try:
+        write_cache(table, cache_dir, source)
+    except OSError as e:
+        # Read-only каталог и т.п. — работаем без кэша
+        print(f"   ⚠️  Не удалось записать кэш {cache_dir}: {e}")
+    return _with_source(table, source)
+
+
+def main():
+    import time
+
+    version_dir = sys.argv[1] if len(sys.argv) > 1 else 'dataset_versions/v1.3'
+
+    print("=" * 70)
+    print(f"БИНАРНЫЙ КЭШ: {version_dir}")
+    print("=" * 70)
+
+    for filename in DATASET_FILES:
+        path = os.path.join(version_dir, filename)
+        if not os.path.exists(path):
+            continue
+        start = time.perf_counter()
+        table = load_cached_table(path)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"   {filename}: {len(table)} строк, {elapsed:.1f} ms → {cache_dir_for(path)}")
+
+    print("\n✅ Кэш актуален")
+
+
+if __name__ == '__main__':
+    main()
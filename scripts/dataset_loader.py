@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Общий колоночный загрузчик версий датасета
+
+Парсит answers.csv / sessions.csv / users.csv один раз в типизированные колонки:
+- бэнды, duration_sec, sample_weight, level_estimate → NumPy массивы
+- id-колонки (answer_id, session_id, user_id, ...) → интернированные строки
+- тексты → object-массивы (без копирования строк)
+
+RowView даёт dict-совместимый доступ к строке без материализации словаря,
+поэтому существующие функции вида validate_part1(answer: dict) работают как раньше.
+
+train.csv / val.csv / test.csv, описанные в split_metadata.json (манифест
+create_train_val_test_split.py), открываются как SplitView — представление над
+родительской таблицей по массиву индексов, без копии строк.
+"""
+
+import csv
+import json
+import os
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+BAND_COLUMNS = ('target_band_overall', 'target_band_fc', 'target_band_lr',
+                'target_band_gra', 'target_band_pr')
+
+# Колонки с плавающей точкой (NaN = пустое/некорректное значение)
+FLOAT_COLUMNS = set(BAND_COLUMNS) | {'sample_weight', 'level_estimate'}
+
+# Целочисленные колонки (MISSING_INT = пустое/некорректное значение)
+INT_COLUMNS = {'duration_sec'}
+MISSING_INT = -1
+
+# Короткие повторяющиеся строки: интернируем, чтобы не держать тысячи копий
+INTERNED_COLUMNS = {'answer_id', 'session_id', 'user_id', 'part', 'question_id',
+                    'question_text', 'source_type', 'quality_flag', 'is_inconsistent'}
+
+DATASET_FILES = ('answers.csv', 'sessions.csv', 'users.csv')
+# Манифест сплитов версии (create_train_val_test_split.py)
+SPLIT_METADATA = 'split_metadata.json'
+
+
+def _parse_float_column(values: List[str]) -> np.ndarray:
+    """Конвертирует строки в float64 (некорректные значения → NaN)"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        out = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except ValueError:
+                out[i] = np.nan
+        return out
+
+
+def _parse_int_column(values: List[str]) -> np.ndarray:
+    """Конвертирует строки в int32 (некорректные значения → MISSING_INT)"""
+    try:
+        return np.array(values, dtype=np.int32)
+    except ValueError:
+        out = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            try:
+                out[i] = int(value)
+            except ValueError:
+                out[i] = MISSING_INT
+        return out
+
+
+def _to_object_array(values: Sequence[str], intern: bool = False) -> np.ndarray:
+    """Упаковывает строки в object-массив (опционально интернируя)"""
+    out = np.empty(len(values), dtype=object)
+    out[:] = [sys.intern(v) for v in values] if intern else values
+    return out
+
+
+def build_column(name: str, values: List[str]) -> np.ndarray:
+    """Строит типизированную колонку по имени поля"""
+    if name in FLOAT_COLUMNS:
+        return _parse_float_column(values)
+    if name in INT_COLUMNS:
+        return _parse_int_column(values)
+    return _to_object_array(values, intern=name in INTERNED_COLUMNS)
+
+
+class RowView(Mapping):
+    """
+    Read-only представление строки таблицы без копирования.
+    Числовые поля возвращаются как float/int, пропуски — как None.
+    """
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'ColumnTable', index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        column = self._table.columns[key]
+        value = column[self._index]
+        if column.dtype == np.float64:
+            return None if value != value else float(value)
+        if column.dtype == np.int32:
+            return None if value == MISSING_INT else int(value)
+        return value
+
+    def __iter__(self):
+        return iter(self._table.fieldnames)
+
+    def __len__(self):
+        return len(self._table.fieldnames)
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    def copy(self) -> dict:
+        """Материализует строку в обычный dict (для модификации)"""
+        return dict(self)
+
+    def __repr__(self):
+        return f"RowView({self._index}, {self.copy()!r})"
+
+
+class ColumnTable:
+    """Колоночная таблица: имя поля → NumPy массив одинаковой длины"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], fieldnames: Optional[List[str]] = None):
+        self.columns = columns
+        self.fieldnames = list(fieldnames) if fieldnames is not None else list(columns)
+        # sha256 исходного CSV (заполняется dataset_cache при загрузке через кэш)
+        self.source_sha256 = None
+        self._part = None
+
+    def __len__(self) -> int:
+        if not self.fieldnames:
+            return 0
+        return len(self.columns[self.fieldnames[0]])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        column = self.columns[name]
+        if not isinstance(column, np.ndarray):
+            # Ленивая колонка из бинарного кэша — декодируем один раз
+            column = np.asarray(column)
+            self.columns[name] = column
+        return column
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def row(self, index: int) -> RowView:
+        return RowView(self, index)
+
+    def rows(self) -> List[RowView]:
+        """Все строки как RowView (замена list(csv.DictReader(f)))"""
+        return [RowView(self, i) for i in range(len(self))]
+
+    def iter_rows(self) -> Iterator[RowView]:
+        for i in range(len(self)):
+            yield RowView(self, i)
+
+    def take(self, indices) -> 'ColumnTable':
+        """Подтаблица по индексам или булевой маске"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return ColumnTable({name: col[indices] for name, col in self.columns.items()},
+                           self.fieldnames)
+
+    @property
+    def part(self) -> np.ndarray:
+        """Part как int8 (-1 для некорректных значений)"""
+        if self._part is None:
+            self._part = np.fromiter(
+                (int(p) if p.isdigit() else -1 for p in self['part']),
+                dtype=np.int8, count=len(self))
+        return self._part
+
+    @property
+    def bands(self) -> np.ndarray:
+        """Матрица (n, 5): overall, fc, lr, gra, pr"""
+        return np.column_stack([self[name] for name in BAND_COLUMNS])
+
+    def valid_bands_mask(self) -> np.ndarray:
+        """Строки, где все пять бэндов распарсились"""
+        return ~np.isnan(self.bands).any(axis=1)
+
+
+class SplitView(ColumnTable):
+    """
+    Сплит как представление над родительской таблицей: строки — RowView родителя
+    (index — позиция в родителе), колонка собирается по индексам при первом обращении.
+    """
+
+    def __init__(self, parent: ColumnTable, indices: np.ndarray):
+        super().__init__({}, parent.fieldnames)
+        self.parent = parent
+        self.indices = indices
+        self.source_sha256 = parent.source_sha256
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            self.columns[name] = np.asarray(self.parent.columns[name][self.indices])
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.parent.columns
+
+    def row(self, index: int) -> RowView:
+        return RowView(self.parent, int(self.indices[index]))
+
+    def rows(self) -> List[RowView]:
+        return [RowView(self.parent, int(i)) for i in self.indices]
+
+    def iter_rows(self) -> Iterator[RowView]:
+        for i in self.indices:
+            yield RowView(self.parent, int(i))
+
+    def take(self, indices) -> 'SplitView':
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return SplitView(self.parent, self.indices[indices])
+
+
+class DatasetVersion(NamedTuple):
+    answers: ColumnTable
+    sessions: Optional[ColumnTable]
+    users: Optional[ColumnTable]
+
+
+def parse_csv(filepath: str) -> ColumnTable:
+    """Парсит CSV в ColumnTable за один проход"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        try:
+            fieldnames = next(reader)
+        except StopIteration:
+            return ColumnTable({}, [])
+        width = len(fieldnames)
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != width:
+                # Как csv.DictReader: недостающие → '', лишние отбрасываем
+                row = (row + [''] * width)[:width]
+            rows.append(row)
+
+    raw_columns = list(zip(*rows)) if rows else [()] * width
+    columns = {name: build_column(name, list(values))
+               for name, values in zip(fieldnames, raw_columns)}
+    return ColumnTable(columns, fieldnames)
+
+
+def load_split(filepath: str, use_cache: bool = True) -> Optional[SplitView]:
+    """
+    Сплит из манифеста split_metadata.json в папке файла (None — сплит не описан).
+    Индексы читаются через mmap; устаревший манифест (родитель изменился) → ValueError.
+    """
+    directory, filename = os.path.split(filepath)
+    metadata_path = os.path.join(directory, SPLIT_METADATA)
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    split = metadata.get('splits', {}).get(os.path.splitext(filename)[0])
+    if split is None:
+        return None
+
+    parent_path = os.path.join(directory, metadata['source'])
+    parent = load_table(parent_path, use_cache)
+    expected = metadata.get('source_sha256')
+    actual = parent.source_sha256
+    if expected and actual is None:
+        # Без кэша sha256 родителя никто не посчитал — считаем сами
+        from dataset_cache import file_sha256
+        actual = file_sha256(parent_path)
+    if expected and actual != expected:
+        raise ValueError(f"{filepath}: манифест сплита устарел ({metadata['source']} изменился), "
+                         f"пересоздайте сплит create_train_val_test_split.py")
+    indices = np.load(os.path.join(directory, split['indices']), mmap_mode='r')
+    return SplitView(parent, indices)
+
+
+def load_table(filepath: str, use_cache: bool = True) -> ColumnTable:
+    """
+    Загружает один CSV файл датасета (через бинарный кэш, см. dataset_cache.py).
+    Сплит из манифеста возвращается как SplitView над родительской таблицей.
+    """
+    split = load_split(filepath, use_cache)
+    if split is not None:
+        return split
+    if use_cache:
+        from dataset_cache import load_cached_table
+        return load_cached_table(filepath)
+    return parse_csv(filepath)
+
+
+def load_version(version_dir: str, use_cache: bool = True) -> DatasetVersion:
+    """Загружает answers/sessions/users версии (отсутствующие файлы → None)"""
+    tables = []
+    for filename in DATASET_FILES:
+        path = os.path.join(version_dir, filename)
+        tables.append(load_table(path, use_cache) if os.path.exists(path) else None)
+    return DatasetVersion(*tables)
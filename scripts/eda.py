@@ -4,24 +4,21 @@ EDA (Exploratory Data Analysis) для датасета IELTS.
 Создает гистограммы и статистику.
 """
 
-import csv
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict, Counter
+from dataset_loader import MISSING_INT, load_version
 
 def load_data():
-    """Загружает данные из CSV"""
-    answers = []
-    with open('answers.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            answers.append(row)
-    
-    users = {}
-    with open('users.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            users[row['user_id']] = float(row['level_estimate']) if row['level_estimate'] else None
+    """Загружает данные из CSV (колоночно)"""
+    dataset = load_version('.')
+    answers = dataset.answers
+    # Строки с битыми бэндами не участвуют в статистике
+    answers = answers.take(answers.valid_bands_mask())
+    
+    levels = dataset.users['level_estimate']
+    users = {uid: (None if np.isnan(level) else float(level))
+             for uid, level in zip(dataset.users['user_id'], levels)}
     
     return answers, users
 
@@ -39,21 +36,19 @@ def analyze_dataset():
     print(f"  Всего пользователей: {len(users)}")
     
     # 2. Распределение по частям
-    parts = Counter([a['part'] for a in answers])
+    parts = Counter(answers['part'])
     print(f"\n📝 Распределение по частям:")
     for part, count in sorted(parts.items()):
         print(f"  Part {part}: {count} ответов")
     
     # Разделяем ответы по частям для дальнейшего анализа
-    part1_answers = [a for a in answers if a['part'] == '1']
-    part2_answers = [a for a in answers if a['part'] == '2']
-    part3_answers = [a for a in answers if a['part'] == '3']
+    part_codes = answers.part
     
     # 3. Распределение по уровням (overall) - общее и по частям
-    overalls = [float(a['target_band_overall']) for a in answers]
-    part1_overalls = [float(a['target_band_overall']) for a in part1_answers]
-    part2_overalls = [float(a['target_band_overall']) for a in part2_answers] if part2_answers else []
-    part3_overalls = [float(a['target_band_overall']) for a in part3_answers] if part3_answers else []
+    overalls = answers['target_band_overall']
+    part1_overalls = overalls[part_codes == 1]
+    part2_overalls = overalls[part_codes == 2]
+    part3_overalls = overalls[part_codes == 3]
     
     print(f"\n🎯 Распределение по уровням (overall):")
     print(f"  Общее:")
@@ -63,13 +58,13 @@ def analyze_dataset():
     print(f"    Медиана: {np.median(overalls):.2f}")
     print(f"    Стандартное отклонение: {np.std(overalls):.2f}")
     
-    if part1_overalls:
+    if len(part1_overalls):
         print(f"  Part 1 ({len(part1_overalls)} ответов):")
         print(f"    Среднее: {np.mean(part1_overalls):.2f}, Медиана: {np.median(part1_overalls):.2f}")
-    if part2_overalls:
+    if len(part2_overalls):
         print(f"  Part 2 ({len(part2_overalls)} ответов):")
         print(f"    Среднее: {np.mean(part2_overalls):.2f}, Медиана: {np.median(part2_overalls):.2f}")
-    if part3_overalls:
+    if len(part3_overalls):
         print(f"  Part 3 ({len(part3_overalls)} ответов):")
         print(f"    Среднее: {np.mean(part3_overalls):.2f}, Медиана: {np.median(part3_overalls):.2f}")
     
@@ -84,10 +79,12 @@ def analyze_dataset():
     plt.grid(True, alpha=0.3)
     
     # 4. Распределение длины ответов - общее и по частям
-    durations = [int(a['duration_sec']) for a in answers if a['duration_sec']]
-    part1_durations = [int(a['duration_sec']) for a in part1_answers if a.get('duration_sec')]
-    part2_durations = [int(a['duration_sec']) for a in part2_answers if a.get('duration_sec')] if part2_answers else []
-    part3_durations = [int(a['duration_sec']) for a in part3_answers if a.get('duration_sec')] if part3_answers else []
+    all_durations = answers['duration_sec']
+    has_duration = all_durations != MISSING_INT
+    durations = all_durations[has_duration]
+    part1_durations = all_durations[has_duration & (part_codes == 1)]
+    part2_durations = all_durations[has_duration & (part_codes == 2)]
+    part3_durations = all_durations[has_duration & (part_codes == 3)]
     
     print(f"\n⏱️  Распределение длины ответов (секунды):")
     print(f"  Общее:")
@@ -96,11 +93,11 @@ def analyze_dataset():
     print(f"    Среднее: {np.mean(durations):.1f}")
     print(f"    Медиана: {np.median(durations):.1f}")
     
-    if part1_durations:
+    if len(part1_durations):
         print(f"  Part 1: среднее={np.mean(part1_durations):.1f}, медиана={np.median(part1_durations):.1f}")
-    if part2_durations:
+    if len(part2_durations):
         print(f"  Part 2: среднее={np.mean(part2_durations):.1f}, медиана={np.median(part2_durations):.1f}")
-    if part3_durations:
+    if len(part3_durations):
         print(f"  Part 3: среднее={np.mean(part3_durations):.1f}, медиана={np.median(part3_durations):.1f}")
     
     plt.subplot(1, 2, 2)
@@ -115,10 +112,10 @@ def analyze_dataset():
     print(f"\n✅ Сохранена гистограмма: eda_overall_duration.png")
     
     # 5. Разброс субскоров
-    fcs = [float(a['target_band_fc']) for a in answers]
-    lrs = [float(a['target_band_lr']) for a in answers]
-    gras = [float(a['target_band_gra']) for a in answers]
-    prs = [float(a['target_band_pr']) for a in answers]
+    fcs = answers['target_band_fc']
+    lrs = answers['target_band_lr']
+    gras = answers['target_band_gra']
+    prs = answers['target_band_pr']
     
     print(f"\n📈 Статистика субскоров:")
     print(f"  FC:  среднее={np.mean(fcs):.2f},  std={np.std(fcs):.2f}")
@@ -142,10 +139,10 @@ def analyze_dataset():
     
     # Разброс относительно overall
     plt.subplot(1, 2, 2)
-    fc_diff = [fcs[i] - overalls[i] for i in range(len(fcs))]
-    lr_diff = [lrs[i] - overalls[i] for i in range(len(lrs))]
-    gra_diff = [gras[i] - overalls[i] for i in range(len(gras))]
-    pr_diff = [prs[i] - overalls[i] for i in range(len(prs))]
+    fc_diff = fcs - overalls
+    lr_diff = lrs - overalls
+    gra_diff = gras - overalls
+    pr_diff = prs - overalls
     
     plt.hist(fc_diff, bins=15, alpha=0.5, label='FC', edgecolor='black')
     plt.hist(lr_diff, bins=15, alpha=0.5, label='LR', edgecolor='black')
@@ -167,13 +164,12 @@ def analyze_dataset():
     user_answer_counts = defaultdict(int)
     user_answer_levels = defaultdict(list)
     
-    for answer in answers:
-        user_id = answer['user_id']
+    for user_id, overall in zip(answers['user_id'], overalls):
         user_level = users.get(user_id)
         if user_level:
             user_levels.append(user_level)
             user_answer_counts[user_id] += 1
-            user_answer_levels[user_id].append(float(answer['target_band_overall']))
+            user_answer_levels[user_id].append(float(overall))
     
     print(f"\n👥 Распределение по уровням пользователей:")
     print(f"  Минимум: {min(user_levels):.1f}")
@@ -210,8 +206,8 @@ def analyze_dataset():
     print(f"✅ Сохранена гистограмма: eda_users.png")
     
     # 7. Статистика по quality_flag
-    if 'quality_flag' in answers[0]:
-        quality_flags = Counter([a['quality_flag'] for a in answers])
+    if 'quality_flag' in answers:
+        quality_flags = Counter(answers['quality_flag'])
         print(f"\n🏷️  Распределение по quality_flag:")
         for flag, count in quality_flags.items():
             print(f"  {flag}: {count} ответов")
@@ -230,10 +226,10 @@ def analyze_dataset():
         
         # Распределение overall внутри quality_flag
         plt.subplot(1, 2, 2)
-        ok_overalls = [float(a['target_band_overall']) for a in answers if a.get('quality_flag') == 'ok']
-        garbage_overalls = [float(a['target_band_overall']) for a in answers if a.get('quality_flag') == 'garbage']
+        ok_overalls = overalls[answers['quality_flag'] == 'ok']
+        garbage_overalls = overalls[answers['quality_flag'] == 'garbage']
         
-        if ok_overalls and garbage_overalls:
+        if len(ok_overalls) and len(garbage_overalls):
             plt.hist(ok_overalls, bins=15, alpha=0.6, label='ok', edgecolor='black', color='green')
             plt.hist(garbage_overalls, bins=15, alpha=0.6, label='garbage', edgecolor='black', color='red')
             plt.xlabel('Band Score (Overall)')
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Персистентный кэш эмбеддингов энкодера
+
+Пулинг-векторы (IELTSModel.pool) замороженного предобученного энкодера
+хранятся в models/.embedding_store/<model>-L<max_length>/:
+- vectors.f16 — матрица float16 (rows, dim), memory-mapped, только дописывается
+- keys.bin    — sha256(answer_text) для каждой строки (32 байта)
+- meta.json   — dim и число зафиксированных строк
+
+Ключ — (model_name, max_length, sha256 текста), поэтому общие строки версий
+v1.1 → v1.2 → v1.3 считаются один раз, а новая версия досчитывает только
+новые тексты.
+
+Использование:
+    python scripts/embedding_store.py dataset_versions/v1.3/answers.csv [model_name] [max_length]
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from length_batching import cut_batches
+from token_cache import pad_collate
+
+EMBEDDING_STORE_DIR = 'models/.embedding_store'
+EMBEDDING_STORE_FORMAT = 1
+KEY_BYTES = 32
+
+
+def text_key(text: str) -> bytes:
+    """sha256 текста ответа"""
+    return hashlib.sha256(str(text).encode('utf-8')).digest()
+
+
+def store_dir_for(model_name: str, max_length: int, root: str = EMBEDDING_STORE_DIR) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name.strip('/'))
+    return os.path.join(root, f'{safe_name}-L{max_length}')
+
+
+class EmbeddingStore:
+    """Append-only хранилище: ключ текста → строка float16 матрицы"""
+
+    def __init__(self, directory: str, model_name: str = '', max_length: int = 0):
+        self.directory = directory
+        self.model_name = model_name
+        self.max_length = max_length
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self.index: Dict[bytes, int] = {}
+        self.vectors = np.empty((0, 0), dtype=np.float16)
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def open(cls, model_name: str, max_length: int, root: str = EMBEDDING_STORE_DIR) -> 'EmbeddingStore':
+        return cls(store_dir_for(model_name, max_length, root), model_name, max_length)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        try:
+            with open(self._path('meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get('format') != EMBEDDING_STORE_FORMAT:
+            return
+        self.dim = meta['dim']
+        self.rows = meta['rows']
+        # Строки после зафиксированных в meta (оборванная запись) игнорируются
+        with open(self._path('keys.bin'), 'rb') as f:
+            keys = f.read(self.rows * KEY_BYTES)
+        self.index = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(self.rows)}
+        self._map_vectors()
+
+    def _map_vectors(self):
+        if self.rows:
+            self.vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r',
+                                     shape=(self.rows, self.dim))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __contains__(self, text: str) -> bool:
+        return text_key(text) in self.index
+
+    def lookup(self, keys: Sequence[bytes]) -> np.ndarray:
+        """Номера строк для ключей (-1 — нет в хранилище)"""
+        return np.fromiter((self.index.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+
+    def add(self, keys: Sequence[bytes], vectors: np.ndarray):
+        """Дописывает новые векторы (уже известные ключи пропускаются)"""
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        new = [i for i, key in enumerate(keys) if key not in self.index]
+        if not new:
+            return
+        # Дубли внутри батча тоже пропускаем
+        seen = {}
+        for i in new:
+            seen.setdefault(keys[i], i)
+        new = list(seen.values())
+
+        self._truncate_uncommitted()
+        with open(self._path('vectors.f16'), 'ab') as f:
+            f.write(np.ascontiguousarray(vectors[new]).tobytes())
+        with open(self._path('keys.bin'), 'ab') as f:
+            f.write(b''.join(keys[i] for i in new))
+        for offset, i in enumerate(new):
+            self.index[keys[i]] = self.rows + offset
+        self.rows += len(new)
+        self._write_meta()
+        self._map_vectors()
+
+    def _truncate_uncommitted(self):
+        """Обрезает хвост, не попавший в meta (если прошлая запись оборвалась)"""
+        for name, size in (('vectors.f16', self.rows * self.dim * 2), ('keys.bin', self.rows * KEY_BYTES)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    def _write_meta(self):
+        meta = {
+            'format': EMBEDDING_STORE_FORMAT,
+            'model_name': self.model_name,
+            'max_length': self.max_length,
+            'dim': self.dim,
+            'rows': self.rows,
+        }
+        tmp_path = self._path(f'meta.json.tmp{os.getpid()}')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self._path('meta.json'))
+
+
+def encode_texts(texts: List[str], model, tokenizer, max_length: int, batch_size: int = 64,
+                 device: str = 'cpu') -> np.ndarray:
+    """Пулинг энкодера (model.pool) для текстов: батчи по длине + динамический паддинг"""
+    vectors = None
+    encoded = tokenizer(texts, truncation=True, max_length=max_length, padding=False)['input_ids']
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    pad_token_id = tokenizer.pad_token_id or 0
+
+    model.eval()
+    with torch.inference_mode():
+        for batch in cut_batches(np.argsort(lengths, kind='stable'), lengths, batch_size, None):
+            inputs = pad_collate([{'input_ids': torch.tensor(encoded[i])} for i in batch],
+                                 pad_token_id=pad_token_id)
+            pooled = model.pool(inputs['input_ids'].to(device), inputs['attention_mask'].to(device))
+            pooled = pooled.float().cpu().numpy()
+            if vectors is None:
+                vectors = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            vectors[batch] = pooled
+    return vectors
+
+
+def embed_texts(texts: Sequence[str], store: EmbeddingStore, model, tokenizer, batch_size: int = 64,
+                device: str = 'cpu') -> np.ndarray:
+    """
+    Эмбеддинги для текстов (float32, n × dim): из хранилища, а отсутствующие
+    считаются энкодером и дописываются в хранилище
+    """
+    keys = [text_key(t) for t in texts]
+    rows = store.lookup(keys)
+    missing = np.flatnonzero(rows < 0)
+    if len(missing):
+        # Уникальные новые тексты
+        first = {}
+        for i in missing:
+            first.setdefault(keys[i], i)
+        todo = list(first.values())
+        vectors = encode_texts([str(texts[i]) for i in todo], model, tokenizer, store.max_length,
+                               batch_size, device)
+        store.add([keys[i] for i in todo], vectors)
+        rows = store.lookup(keys)
+    if not len(texts):
+        return np.zeros((0, store.dim or 0), dtype=np.float32)
+    return np.asarray(store.vectors[rows], dtype=np.float32)
+
+
+def main():
+    from transformers import AutoTokenizer
+    from dataset_loader import load_table
+    from train_model import CONFIG, IELTSModel
+
+    filepath = sys.argv[1] if len(sys.argv) > 1 else 'dataset_versions/v1.3/answers.csv'
+    model_name = sys.argv[2] if len(sys.argv) > 2 else CONFIG['model_name']
+    max_length = int(sys.argv[3]) if len(sys.argv) > 3 else CONFIG['max_length']
+
+    print("=" * 70)
+    print("КЭШ ЭМБЕДДИНГОВ")
+    print("=" * 70)
+
+    texts = list(load_table(filepath)['answer_text'])
+    store = EmbeddingStore.open(model_name, max_length)
+    known = int((store.lookup([text_key(t) for t in texts]) >= 0).sum())
+    print(f"\n📂 {filepath}: {len(texts)} ответов, в хранилище уже {known}")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = IELTSModel(model_name)
+    before = len(store)
+    start = time.time()
+    vectors = embed_texts(texts, store, model, tokenizer)
+    print(f"\n✅ Посчитано новых уникальных текстов: {len(store) - before} за {time.time() - start:.1f}s")
+    print(f"   Матрица: {vectors.shape}, всего в хранилище: {len(store)} ({store.directory})")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,27 @@ Error Injection Module (Tier 2 Augmentation)
 - LR низкий → лексические ограничения
 - FC низкий → проблемы со связностью
 - PR низкий → ASR-артефакты (уже частично в asr_noise_injection.py)
+
+Все функции берут случайность из rng (по умолчанию — глобальный random).
+Для воспроизводимой аугментации передается record_rng(seed, answer_id, stage):
+результат записи зависит только от (seed, answer_id, stage), а не от порядка
+обработки, поэтому поток можно резать на любое число процессов
+(пакетным движкам — record_uniforms).
+
+Таблицы GRAMMAR_ERRORS / LEXICAL_LIMITATIONS компилируются один раз
+(SubstitutionRules): все места для всех правил находятся одним проходом
+по тексту, правки выбираются по таблице и применяются одной сборкой строки
+(apply_edits); вставки disfluency / filler — индексные (insert_tokens).
 """
 
+import hashlib
 import random
 import re
-from typing import Tuple
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from phrase_matcher import BATCH_SEPARATOR, PhraseMatcher
 
 # Грамматические ошибки по severity
 GRAMMAR_ERRORS = {
@@ -101,6 +117,153 @@ FC_DISFLUENCY = {
     ]
 }
 
+# Filler words для низкого PR (inject_errors_by_subscores)
+PR_FILLERS = ["um...", "uh...", "er...", "erm..."]
+
+SENTENCE_END = re.compile(r'\.\s+')
+_WORD_CHAR = re.compile(r'\w')
+
+
+class SubstitutionRules:
+    """
+    Таблица замен (что найти → чем заменить), скомпилированная один раз в
+    PhraseMatcher: find_sites() за один проход по тексту находит вхождения
+    всех правил сразу (без учета регистра, как re.IGNORECASE)
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, str]]):
+        self.targets = [target for target, _ in rules]
+        self.replacements = [replacement for _, replacement in rules]
+        # Одна группа на правило: одинаковые фразы в разных правилах не смешиваются
+        self.matcher = PhraseMatcher({str(i): [target] for i, target in enumerate(self.targets)})
+        # Для текстов, где lower() меняет длину ('İ' → 'i̇'): позиции по
+        # text.lower() не совпали бы с исходным текстом
+        self.patterns = [re.compile(re.escape(target), re.IGNORECASE) for target in self.targets]
+
+    def find_sites(self, text: str) -> List[Tuple[int, List[Tuple[int, int]]]]:
+        """(номер правила, непересекающиеся вхождения (start, end)) — только для
+        найденных правил, в порядке таблицы (как finditer по каждому правилу)"""
+        return self.find_sites_many([text])[0]
+
+    def find_sites_many(self, texts: Sequence[str]) -> List[List[Tuple[int, List[Tuple[int, int]]]]]:
+        """find_sites для колонки: тексты склеиваются через BATCH_SEPARATOR
+        и сканируются одним проходом, вхождения раскладываются по строкам.
+        Тексты, у которых lower() меняет длину, сканируются регулярками по правилам"""
+        sites: List[Optional[list]] = [None] * len(texts)
+        batch = []
+        for i, text in enumerate(texts):
+            if text.isascii() or len(text.lower()) == len(text):
+                batch.append(i)
+            else:
+                sites[i] = self._regex_sites(text)
+        for i, row_sites in zip(batch, self._scan([texts[i] for i in batch])):
+            sites[i] = row_sites
+        return sites
+
+    def _regex_sites(self, text: str) -> List[Tuple[int, List[Tuple[int, int]]]]:
+        found = ((rule, [match.span() for match in pattern.finditer(text)])
+                 for rule, pattern in enumerate(self.patterns))
+        return [(rule, rule_sites) for rule, rule_sites in found if rule_sites]
+
+    def _scan(self, texts: List[str]) -> List[List[Tuple[int, List[Tuple[int, int]]]]]:
+        if not texts:
+            return []
+        if len(texts) == 1:
+            hits, row_starts = self.matcher.find_all(texts[0]), [0]
+        else:
+            lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+            row_starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])).tolist()
+            hits = self.matcher.find_all(BATCH_SEPARATOR.join(texts))
+        sites = [{} for _ in texts]
+        row = 0
+        for hit in hits:
+            while row + 1 < len(row_starts) and row_starts[row + 1] <= hit.start:
+                row += 1
+            start, end = hit.start - row_starts[row], hit.end - row_starts[row]
+            rule_sites = sites[row].setdefault(int(hit.group), [])
+            if not rule_sites or rule_sites[-1][1] <= start:
+                rule_sites.append((start, end))
+        return [sorted(row_sites.items()) for row_sites in sites]
+
+
+def untouched_sites(sites: List[Tuple[int, int]], edits: List[Tuple[int, int, str]]) -> List[Tuple[int, int]]:
+    """Вхождения, не задетые уже выбранными правками (их текст не изменился)"""
+    return [(start, end) for start, end in sites
+            if all(end <= e_start or start >= e_end for e_start, e_end, _ in edits)]
+
+
+def _is_whole_word(text: str, start: int, end: int) -> bool:
+    """\\b с обеих сторон вхождения"""
+    return ((start == 0 or not _WORD_CHAR.match(text[start - 1])) and
+            (end == len(text) or not _WORD_CHAR.match(text[end])))
+
+
+def apply_edits(text: str, edits: List[Tuple[int, int, str]]) -> str:
+    """Применяет непересекающиеся правки (start, end, замена) одной сборкой строки"""
+    if not edits:
+        return text
+    parts = []
+    last = 0
+    for start, end, replacement in sorted(edits):
+        parts.append(text[last:start])
+        parts.append(replacement)
+        last = end
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def insert_tokens(words: List[str], count: int, choices: Sequence[str], rng=random) -> List[str]:
+    """
+    count случайных токенов в позиции [1, len - 1] — те же вызовы rng и тот же
+    результат, что у цикла words.insert(...), но список собирается один раз:
+    вместо сдвига слов сдвигаются позиции уже вставленных токенов
+    """
+    inserted = []  # (позиция в итоговом списке, токен)
+    size = len(words)
+    for _ in range(count):
+        token = rng.choice(choices)
+        pos = rng.randint(1, size - 1)
+        inserted = [(q + 1 if q >= pos else q, t) for q, t in inserted]
+        inserted.append((pos, token))
+        size += 1
+    result = [None] * size
+    for pos, token in inserted:
+        result[pos] = token
+    rest = iter(words)
+    return [token if token is not None else next(rest) for token in result]
+
+
+# Таблицы, скомпилированные один раз: GRA — правильная форма → ошибка,
+# LR — продвинутое слово → простое
+GRAMMAR_RULES = {severity: SubstitutionRules([(correct, wrong) for wrong, correct in errors])
+                 for severity, errors in GRAMMAR_ERRORS.items()}
+LEXICAL_RULES = {severity: SubstitutionRules(list(limitations.items()))
+                 for severity, limitations in LEXICAL_LIMITATIONS.items()}
+
+def record_key(seed: int, answer_id: str, stage: str) -> int:
+    """64-битный ключ записи: sha256 от 'seed:answer_id:stage'
+    (как shard_seed в generation_engine)"""
+    digest = hashlib.sha256(f"{seed}:{answer_id}:{stage}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def record_rng(seed: int, answer_id: str, stage: str) -> random.Random:
+    """Собственный генератор записи (seed = record_key)"""
+    return random.Random(record_key(seed, answer_id, stage))
+
+def record_uniforms(seed: int, answer_ids: Sequence[str], stage: str, count: int) -> np.ndarray:
+    """
+    Матрица (len(answer_ids), count) равномерных чисел [0, 1) для пакетных
+    движков: счетчиковый splitmix64 от record_key, поэтому строка зависит
+    только от своей записи, а вся матрица считается векторно
+    """
+    keys = np.fromiter((record_key(seed, answer_id, stage) for answer_id in answer_ids),
+                       dtype=np.uint64, count=len(answer_ids))
+    z = keys[:, None] + np.arange(1, count + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
 def get_severity(score: float, threshold_low: float = 4.5, threshold_high: float = 6.5) -> str:
     """Определяет severity на основе субскора"""
     if score <= threshold_low:
@@ -110,76 +273,68 @@ def get_severity(score: float, threshold_low: float = 4.5, threshold_high: float
     else:
         return "low"
 
-def inject_grammar_errors(text: str, gra: float) -> str:
+def inject_grammar_errors(text: str, gra: float, rng=random) -> str:
     """Добавляет грамматические ошибки в зависимости от GRA"""
     severity = get_severity(gra, threshold_low=4.5, threshold_high=6.0)
     
     if severity == "low":
         return text  # Высокий GRA - минимум ошибок
     
-    errors = GRAMMAR_ERRORS[severity]
-    
     # Количество ошибок зависит от severity
     if severity == "high":
-        max_errors = random.randint(2, 4)
+        max_errors = rng.randint(2, 4)
         error_prob = 0.4
     elif severity == "medium":
-        max_errors = random.randint(1, 2)
+        max_errors = rng.randint(1, 2)
         error_prob = 0.2
     else:
         max_errors = 1
         error_prob = 0.1
     
-    error_count = 0
-    text_lower = text.lower()
-    
-    for wrong, correct in errors:
-        if error_count >= max_errors:
+    # Все места для всех правил — одним проходом; правила перебираются
+    # в порядке таблицы, на каждое — одно случайное вхождение
+    rules = GRAMMAR_RULES[severity]
+    edits = []
+    for rule, sites in rules.find_sites(text):
+        if len(edits) >= max_errors:
             break
-        
-        if correct.lower() in text_lower and random.random() < error_prob:
-            # Заменяем с учетом регистра
-            pattern = re.compile(re.escape(correct), re.IGNORECASE)
-            matches = list(pattern.finditer(text))
-            if matches:
-                match = random.choice(matches)
-                # Заменяем только первое вхождение
-                text = text[:match.start()] + wrong + text[match.end():]
-                error_count += 1
-                text_lower = text.lower()
+        sites = untouched_sites(sites, edits)
+        if sites and rng.random() < error_prob:
+            start, end = rng.choice(sites)
+            edits.append((start, end, rules.replacements[rule]))
     
-    return text
+    return apply_edits(text, edits)
 
-def inject_lexical_limits(text: str, lr: float) -> str:
+def inject_lexical_limits(text: str, lr: float, rng=random) -> str:
     """Ограничивает лексику в зависимости от LR"""
     severity = get_severity(lr, threshold_low=5.0, threshold_high=6.5)
     
     if severity == "low":
         return text  # Высокий LR - разнообразная лексика
     
-    limitations = LEXICAL_LIMITATIONS[severity]
-    
-    # Заменяем продвинутые слова на простые
-    for advanced, simple in limitations.items():
-        if advanced in text.lower():
-            # Заменяем с учетом регистра
-            pattern = re.compile(r'\b' + re.escape(advanced) + r'\b', re.IGNORECASE)
-            if random.random() < 0.6:  # 60% шанс заменить
-                text = pattern.sub(simple, text)
+    # Заменяем продвинутые слова на простые (все вхождения целым словом)
+    rules = LEXICAL_RULES[severity]
+    edits = []
+    for rule, sites in rules.find_sites(text):
+        sites = untouched_sites(sites, edits)
+        if sites and rng.random() < 0.6:  # 60% шанс заменить
+            edits.extend((start, end, rules.replacements[rule]) for start, end in sites
+                         if _is_whole_word(text, start, end))
+    text = apply_edits(text, edits)
     
     # Добавляем повторения для очень низкого LR
-    if severity == "high" and random.random() < REPETITION_PATTERNS["high"]:
+    if severity == "high" and rng.random() < REPETITION_PATTERNS["high"]:
         words = text.split()
         if len(words) > 3:
             # Повторяем одно из первых слов
-            word_to_repeat = random.choice(words[:5])
+            word_to_repeat = rng.choice(words[:5])
             pos = words.index(word_to_repeat) + 1
             words.insert(pos, f"{word_to_repeat}...")
             text = " ".join(words)
     
     return text
 
-def inject_fc_disfluency(text: str, fc: float) -> str:
+def inject_fc_disfluency(text: str, fc: float, rng=random) -> str:
     """Добавляет проблемы со связностью в зависимости от FC"""
     severity = get_severity(fc, threshold_low=4.5, threshold_high=6.0)
     
@@ -190,58 +345,49 @@ def inject_fc_disfluency(text: str, fc: float) -> str:
     
     # Количество disfluencies зависит от severity
     if severity == "high":
-        count = random.randint(2, 4)
+        count = rng.randint(2, 4)
         prob = 0.5
     elif severity == "medium":
-        count = random.randint(1, 2)
+        count = rng.randint(1, 2)
         prob = 0.3
     else:
         count = 1
         prob = 0.15
     
-    if random.random() < prob:
+    if rng.random() < prob:
         words = text.split()
-        
-        for _ in range(count):
-            if len(words) > 2:
-                disfluency = random.choice(disfluencies)
-                # Добавляем в случайное место
-                pos = random.randint(1, len(words) - 1)
-                words.insert(pos, disfluency)
-        
+        if len(words) > 2:
+            # Добавляем в случайные места
+            words = insert_tokens(words, count, disfluencies, rng)
         text = " ".join(words)
     
     # Добавляем обрывы мыслей для очень низкого FC
-    if severity == "high" and random.random() < 0.3:
+    if severity == "high" and rng.random() < 0.3:
         # Добавляем "..." в конце предложений
-        text = re.sub(r'\.\s+', '... ', text)
+        text = SENTENCE_END.sub('... ', text)
         # Иногда обрываем на середине
-        if random.random() < 0.2:
+        if rng.random() < 0.2:
             words = text.split()
             if len(words) > 5:
-                cut_pos = random.randint(len(words) // 2, len(words) - 2)
+                cut_pos = rng.randint(len(words) // 2, len(words) - 2)
                 text = " ".join(words[:cut_pos]) + "..."
     
     return text
 
-def inject_errors_by_subscores(text: str, fc: float, lr: float, gra: float, pr: float) -> str:
+def inject_errors_by_subscores(text: str, fc: float, lr: float, gra: float, pr: float, rng=random) -> str:
     """Основная функция: добавляет ошибки в зависимости от всех субскоров"""
     # Применяем ошибки по каждому критерию
-    text = inject_grammar_errors(text, gra)
-    text = inject_lexical_limits(text, lr)
-    text = inject_fc_disfluency(text, fc)
+    text = inject_grammar_errors(text, gra, rng)
+    text = inject_lexical_limits(text, lr, rng)
+    text = inject_fc_disfluency(text, fc, rng)
     
     # PR уже обрабатывается в asr_noise_injection.py, но можно добавить дополнительные артефакты
     if pr <= 5.0:
         # Добавляем больше filler words для низкого PR
-        fillers = ["um", "uh", "er", "erm"]
-        if random.random() < 0.3:
+        if rng.random() < 0.3:
             words = text.split()
             if len(words) > 2:
-                filler = random.choice(fillers)
-                pos = random.randint(1, len(words) - 1)
-                words.insert(pos, f"{filler}...")
-                text = " ".join(words)
+                text = " ".join(insert_tokens(words, 1, PR_FILLERS, rng))
     
     return text
 
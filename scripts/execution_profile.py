@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Профили выполнения для обучения и скоринга на CPU
+
+Профиль — словарь настроек, которые включаются явно (по умолчанию 'default',
+т.е. обычный fp32 без изменений):
+- bf16:            torch.autocast(dtype=bfloat16) для прямого прохода (loss — в fp32)
+- num_threads:     intra-op потоки torch (None — как есть; 0 — все ядра)
+- interop_threads: inter-op потоки (задаются один раз на процесс, до первой работы)
+- compile:         torch.compile модели, если доступен (иначе молча пропускается)
+- num_workers / prefetch_factor: воркеры DataLoader с предзагрузкой батчей;
+  pin_memory включается только для CUDA (на CPU он ничего не дает)
+
+Использование:
+    profile = get_profile('cpu_fast')
+    apply_threads(profile)
+    model = maybe_compile(model, profile)
+    with autocast(profile, device):
+        outputs = model(input_ids, attention_mask)
+"""
+
+import contextlib
+import os
+from typing import Dict, Optional
+
+import torch
+
+EXECUTION_PROFILES: Dict[str, dict] = {
+    'default': {
+        'bf16': False, 'num_threads': None, 'interop_threads': None,
+        'compile': False, 'num_workers': 0, 'prefetch_factor': None,
+    },
+    'cpu_threads': {
+        'bf16': False, 'num_threads': 0, 'interop_threads': 1,
+        'compile': False, 'num_workers': 2, 'prefetch_factor': 4,
+    },
+    'cpu_bf16': {
+        'bf16': True, 'num_threads': 0, 'interop_threads': 1,
+        'compile': False, 'num_workers': 2, 'prefetch_factor': 4,
+    },
+    'cpu_fast': {
+        'bf16': True, 'num_threads': 0, 'interop_threads': 1,
+        'compile': True, 'num_workers': 2, 'prefetch_factor': 4,
+    },
+}
+
+
+def get_profile(name_or_profile) -> dict:
+    """Имя профиля или словарь (недостающие ключи — из 'default')"""
+    if isinstance(name_or_profile, dict):
+        profile = dict(EXECUTION_PROFILES['default'])
+        profile.update(name_or_profile)
+        return profile
+    if name_or_profile not in EXECUTION_PROFILES:
+        raise ValueError(f"Неизвестный профиль: {name_or_profile} "
+                         f"(доступны: {', '.join(EXECUTION_PROFILES)})")
+    return dict(EXECUTION_PROFILES[name_or_profile], name=name_or_profile)
+
+
+def apply_threads(profile: dict):
+    """Потоки torch по профилю (0 — все ядра)"""
+    if profile['num_threads'] is not None:
+        torch.set_num_threads(profile['num_threads'] or os.cpu_count() or 1)
+    if profile['interop_threads'] is not None:
+        try:
+            torch.set_num_interop_threads(profile['interop_threads'])
+        except RuntimeError:
+            # Уже задано или параллельная работа уже началась — оставляем как есть
+            pass
+
+
+def bf16_supported(device: str) -> bool:
+    if device.startswith('cuda'):
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    return True
+
+
+def autocast(profile: Optional[dict], device: str):
+    """Контекст autocast bfloat16 (или пустой контекст для fp32)"""
+    if not profile or not profile['bf16'] or not bf16_supported(device):
+        return contextlib.nullcontext()
+    return torch.autocast(device_type='cuda' if device.startswith('cuda') else 'cpu',
+                          dtype=torch.bfloat16)
+
+
+def maybe_compile(model: torch.nn.Module, profile: Optional[dict]) -> torch.nn.Module:
+    """
+    torch.compile на месте (nn.Module.compile), чтобы ключи state_dict
+    не менялись и чекпоинты оставались совместимыми
+    """
+    if not profile or not profile['compile'] or not hasattr(model, 'compile'):
+        return model
+    try:
+        model.compile(dynamic=True)
+    except Exception as e:
+        print(f"   ⚠️  torch.compile недоступен: {e}")
+    return model
+
+
+def loader_kwargs(profile: Optional[dict], device: str) -> dict:
+    """Аргументы DataLoader: воркеры, предзагрузка, pin_memory (только CUDA)"""
+    if not profile or not profile['num_workers']:
+        return {}
+    kwargs = {
+        'num_workers': profile['num_workers'],
+        'persistent_workers': True,
+        'pin_memory': device.startswith('cuda'),
+    }
+    if profile['prefetch_factor']:
+        kwargs['prefetch_factor'] = profile['prefetch_factor']
+    return kwargs
+
+
+def describe(profile: dict) -> str:
+    return (f"{profile.get('name', 'custom')}: bf16={'да' if profile['bf16'] else 'нет'}, "
+            f"потоки={torch.get_num_threads()}/{torch.get_num_interop_threads()}, "
+            f"compile={'да' if profile['compile'] else 'нет'}, workers={profile['num_workers']}")
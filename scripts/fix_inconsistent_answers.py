@@ -9,43 +9,8 @@
 import csv
 import re
 from collections import defaultdict
-
-def count_complex_structures(text: str) -> int:
-    """Считает сложные грамматические структуры"""
-    count = 0
-    if re.search(r'\b(who|which|that|where|when)\s+\w+', text, re.I):
-        count += 1
-    if re.search(r'\bhad\s+\w+ed\b', text, re.I):
-        count += 1
-    if re.search(r'\b(if|unless|provided)\s+', text, re.I):
-        count += 1
-    if re.search(r'\b(however|moreover|furthermore|nevertheless|consequently)\b', text, re.I):
-        count += 1
-    return count
-
-def count_advanced_vocab(text: str) -> int:
-    """Считает продвинутую лексику"""
-    advanced_words = [
-        'significant', 'considerable', 'substantial', 'profound', 'fundamental',
-        'comprehensive', 'sophisticated', 'nuanced', 'intricate', 'complex',
-        'appreciate', 'value', 'acknowledge', 'recognize', 'perceive',
-        'challenge', 'opportunity', 'perspective', 'approach', 'strategy'
-    ]
-    text_lower = text.lower()
-    return sum(1 for word in advanced_words if word in text_lower)
-
-def count_errors(text: str) -> int:
-    """Считает грамматические ошибки"""
-    count = 0
-    if re.search(r'\b(he|she|it|they)\s+(go|do|make|have|be)\b', text, re.I):
-        count += 1
-    if re.search(r'\b(yesterday|last\s+week)\s+\w+\s+(is|are|am)\b', text, re.I):
-        count += 1
-    words = text.lower().split()
-    for i in range(len(words) - 1):
-        if words[i] == words[i+1] and len(words[i]) > 3:
-            count += 1
-    return count
+from dataset_loader import load_table
+from text_features import text_features
 
 def has_thematic_words(text: str, question: str) -> bool:
     """Проверяет наличие тематических слов из вопроса"""
@@ -68,10 +33,11 @@ def fix_inconsistent(answer: dict, consistency_result: dict) -> dict:
     except:
         return answer
     
-    word_count = len(text.split())
-    complex_structures = count_complex_structures(text)
-    advanced_vocab = count_advanced_vocab(text)
-    errors = count_errors(text)
+    features = text_features(text)
+    word_count = features['num_words']
+    complex_structures = features['complex_structures']
+    advanced_vocab = features['advanced_vocab']
+    errors = features['errors']
     
     fixed = answer.copy()
     action = 'keep'
@@ -159,9 +125,7 @@ def main():
     print("=" * 70)
     
     # Загружаем v1.3
-    answers = []
-    with open('dataset_versions/v1.3/answers.csv', 'r', encoding='utf-8') as f:
-        answers = list(csv.DictReader(f))
+    answers = load_table('dataset_versions/v1.3/answers.csv').rows()
     
     print(f"\n📂 Загружено: {len(answers)} ответов")
     
@@ -183,6 +147,7 @@ def main():
         answer_id = answer.get('answer_id')
         if answer_id not in consistency_results:
             # Не было в consistency check - оставляем как есть
+            answer = answer.copy()
             answer['sample_weight'] = '1.0'
             answer['is_inconsistent'] = 'false'
             fixed_answers.append(answer)
@@ -191,6 +156,7 @@ def main():
         consistency = consistency_results[answer_id]
         if consistency.get('action') == 'ok':
             # Consistent - оставляем как есть
+            answer = answer.copy()
             answer['sample_weight'] = '1.0'
             answer['is_inconsistent'] = 'false'
             fixed_answers.append(answer)
@@ -10,10 +10,7 @@ import json
 import os
 import shutil
 from datetime import datetime
-from generate_synthetic_expansion import generate_realistic_subbands, load_existing_data, get_next_ids, generate_part1_questions, generate_part1_answer
-from generate_part2_expansion import generate_part2_questions, generate_part2_answer
-from generate_part3_expansion import generate_part3_questions, generate_part3_answer
-from improved_generation_v2 import generate_part1_answer_v2, generate_part2_answer_v2
+from generation_engine import DEFAULT_SHARD_SIZE, generate_parallel
 from improve_generation import determine_quality_flag
 
 CONFIG_FILE = 'configs/config_v1.1_generation.json'
@@ -93,76 +90,26 @@ def main():
     targets = config['targets']
     log_message(f"\n🎯 Targets: Part 1: +{targets['part1_count']}, Part 2: +{targets['part2_count']}, Part 3: +{targets['part3_count']}", log_file)
     
-    # Подготовка вопросов
-    p1_questions = generate_part1_questions()
-    p2_questions = generate_part2_questions()
-    p3_questions = generate_part3_questions()
+    # Параллельная генерация по шардам (см. generation_engine.py)
+    parallel = config.get('parallel', {})
+    workers = parallel.get('workers') or os.cpu_count()
+    shard_size = parallel.get('shard_size', DEFAULT_SHARD_SIZE)
+    log_message(f"\n🚀 Генерация: {workers} воркеров, шард = {shard_size} ответов", log_file)
     
     new_answers = []
     answer_id_counter = next_answer_id
+    part_counts = {'1': 0, '2': 0, '3': 0}
     
-    # Генерация Part 1
-    log_message("\n🚀 Генерация Part 1...", log_file)
-    count_p1 = 0
-    while count_p1 < targets['part1_count']:
-        # Распределение band (упрощенное для скорости, но можно взять из конфига)
-        # В конфиге "band_distribution": {"low": 0.2, "medium": 0.5, "high": 0.3}
-        r = random.random()
-        if r < 0.2: overall = random.choice([3.0, 3.5, 4.0, 4.5])
-        elif r < 0.7: overall = random.choice([5.0, 5.5, 6.0, 6.5])
-        else: overall = random.choice([7.0, 7.5, 8.0, 8.5])
-        
-        q_id, q_text = random.choice(p1_questions)
-        fc, lr, gra, pr = generate_realistic_subbands(overall)
-        answer_text, duration = generate_part1_answer_v2(q_text, overall, fc, lr, gra, pr)
-        
-        new_answers.append(create_answer_dict(answer_id_counter, random.choice(all_session_ids), random.choice(all_user_ids),
-                                            '1', q_id, q_text, answer_text, duration, overall, fc, lr, gra, pr))
-        answer_id_counter += 1
-        count_p1 += 1
-        
-    log_message(f"   Generated {count_p1} Part 1 answers", log_file)
-
-    # Генерация Part 2
-    log_message("🚀 Генерация Part 2...", log_file)
-    count_p2 = 0
-    while count_p2 < targets['part2_count']:
-        r = random.random()
-        if r < 0.2: overall = random.choice([3.5, 4.0, 4.5])
-        elif r < 0.7: overall = random.choice([5.0, 5.5, 6.0, 6.5])
-        else: overall = random.choice([7.0, 7.5, 8.0, 8.5])
-        
-        q_id, q_text = random.choice(p2_questions)
-        fc, lr, gra, pr = generate_realistic_subbands(overall)
-        answer_text, duration = generate_part2_answer_v2(q_text, overall, fc, lr, gra, pr)
-        
-        new_answers.append(create_answer_dict(answer_id_counter, random.choice(all_session_ids), random.choice(all_user_ids),
-                                            '2', q_id, q_text, answer_text, duration, overall, fc, lr, gra, pr))
+    for g in generate_parallel(targets, config['random_seed'], all_session_ids, all_user_ids,
+                               workers=workers, shard_size=shard_size):
+        new_answers.append(create_answer_dict(answer_id_counter, g.session_id, g.user_id,
+                                              g.part, g.question_id, g.question_text, g.answer_text,
+                                              g.duration, g.overall, g.fc, g.lr, g.gra, g.pr))
         answer_id_counter += 1
-        count_p2 += 1
-        
-    log_message(f"   Generated {count_p2} Part 2 answers", log_file)
-    
-    # Генерация Part 3
-    log_message("🚀 Генерация Part 3...", log_file)
-    count_p3 = 0
-    while count_p3 < targets['part3_count']:
-        r = random.random()
-        if r < 0.2: overall = random.choice([3.5, 4.0, 4.5])
-        elif r < 0.7: overall = random.choice([5.0, 5.5, 6.0, 6.5])
-        else: overall = random.choice([7.0, 7.5, 8.0, 8.5])
-        
-        q_id, q_text = random.choice(p3_questions)
-        fc, lr, gra, pr = generate_realistic_subbands(overall)
-        # Используем обновленную функцию из generate_part3_expansion (которая уже v2)
-        answer_text, duration = generate_part3_answer(q_text, overall, fc, lr, gra, pr)
-        
-        new_answers.append(create_answer_dict(answer_id_counter, random.choice(all_session_ids), random.choice(all_user_ids),
-                                            '3', q_id, q_text, answer_text, duration, overall, fc, lr, gra, pr))
-        answer_id_counter += 1
-        count_p3 += 1
-        
-    log_message(f"   Generated {count_p3} Part 3 answers", log_file)
+        part_counts[g.part] += 1
+    
+    for part in ('1', '2', '3'):
+        log_message(f"   Generated {part_counts[part]} Part {part} answers", log_file)
     
     # Сохранение
     log_message(f"\n💾 Добавление {len(new_answers)} новых ответов в {answers_v1_1_path}...", log_file)
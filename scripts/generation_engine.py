@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Параллельная шардированная генерация синтетических ответов
+
+- targets.part*_count из конфига режутся на шарды фиксированного размера
+- каждый шард получает свой детерминированный seed, выведенный из random_seed
+  (sha256 от "seed:part:shard"), и генерируется в отдельном процессе
+- результаты склеиваются в порядке (part, shard), поэтому answers.csv
+  побайтно воспроизводим при том же seed и shard_size — при любом числе воркеров
+"""
+
+import hashlib
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from generate_synthetic_expansion import generate_realistic_subbands, generate_part1_questions
+from generate_part2_expansion import generate_part2_questions
+from generate_part3_expansion import generate_part3_questions, generate_part3_answer
+from improved_generation_v2 import generate_part1_answer_v2, generate_part2_answer_v2
+
+DEFAULT_SHARD_SIZE = 250
+
+# Бэнды по группам (low / medium / high) для каждой части
+BAND_CHOICES = {
+    '1': ([3.0, 3.5, 4.0, 4.5], [5.0, 5.5, 6.0, 6.5], [7.0, 7.5, 8.0, 8.5]),
+    '2': ([3.5, 4.0, 4.5], [5.0, 5.5, 6.0, 6.5], [7.0, 7.5, 8.0, 8.5]),
+    '3': ([3.5, 4.0, 4.5], [5.0, 5.5, 6.0, 6.5], [7.0, 7.5, 8.0, 8.5]),
+}
+
+PART_GENERATORS = {
+    '1': (generate_part1_questions, generate_part1_answer_v2),
+    '2': (generate_part2_questions, generate_part2_answer_v2),
+    '3': (generate_part3_questions, generate_part3_answer),
+}
+
+
+class ShardTask(NamedTuple):
+    part: str
+    index: int
+    count: int
+    seed: int
+
+
+class GeneratedAnswer(NamedTuple):
+    part: str
+    question_id: str
+    question_text: str
+    answer_text: str
+    duration: int
+    overall: float
+    fc: float
+    lr: float
+    gra: float
+    pr: float
+    session_id: str
+    user_id: str
+
+
+def shard_seed(base_seed: int, part: str, index: int) -> int:
+    """Независимый seed шарда, зависящий только от (base_seed, part, index)"""
+    digest = hashlib.sha256(f"{base_seed}:part{part}:shard{index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def plan_shards(targets: Dict[str, int], base_seed: int,
+                shard_size: int = DEFAULT_SHARD_SIZE) -> List[ShardTask]:
+    """Режет targets (part1_count, ...) на шарды"""
+    tasks = []
+    for part in ('1', '2', '3'):
+        total = targets.get(f'part{part}_count', 0)
+        for index, start in enumerate(range(0, total, shard_size)):
+            count = min(shard_size, total - start)
+            tasks.append(ShardTask(part, index, count, shard_seed(base_seed, part, index)))
+    return tasks
+
+
+# Состояние воркера (передается один раз через initializer, а не с каждым шардом)
+_SESSION_IDS: Sequence[str] = ()
+_USER_IDS: Sequence[str] = ()
+
+
+def _init_worker(session_ids: Sequence[str], user_ids: Sequence[str]):
+    global _SESSION_IDS, _USER_IDS
+    _SESSION_IDS = session_ids
+    _USER_IDS = user_ids
+
+
+def generate_shard(task: ShardTask) -> List[GeneratedAnswer]:
+    """Генерирует один шард. Генераторы используют глобальный random, поэтому
+    сидируем его здесь: внутри процесса шарды выполняются последовательно."""
+    random.seed(task.seed)
+    get_questions, generate_answer = PART_GENERATORS[task.part]
+    questions = get_questions()
+    low, medium, high = BAND_CHOICES[task.part]
+
+    answers = []
+    for _ in range(task.count):
+        r = random.random()
+        if r < 0.2: overall = random.choice(low)
+        elif r < 0.7: overall = random.choice(medium)
+        else: overall = random.choice(high)
+
+        q_id, q_text = random.choice(questions)
+        fc, lr, gra, pr = generate_realistic_subbands(overall)
+        answer_text, duration = generate_answer(q_text, overall, fc, lr, gra, pr)
+
+        answers.append(GeneratedAnswer(task.part, q_id, q_text, answer_text, duration,
+                                       overall, fc, lr, gra, pr,
+                                       random.choice(_SESSION_IDS), random.choice(_USER_IDS)))
+    return answers
+
+
+def generate_parallel(targets: Dict[str, int], base_seed: int,
+                      session_ids: Sequence[str], user_ids: Sequence[str],
+                      workers: Optional[int] = None,
+                      shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[GeneratedAnswer]:
+    """
+    Генерирует ответы на пуле процессов и отдает их в детерминированном порядке.
+    В полете не больше 2 * workers шардов, поэтому память не растет с targets.
+    workers=1 — без пула, в текущем процессе (результат тот же).
+    """
+    tasks = plan_shards(targets, base_seed, shard_size)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(list(session_ids), list(user_ids))
+        for task in tasks:
+            yield from generate_shard(task)
+        return
+
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(list(session_ids), list(user_ids))) as pool:
+        # Результаты забираем строго в порядке задач → порядок строк не зависит от воркеров
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(generate_shard, task))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
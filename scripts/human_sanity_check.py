@@ -7,6 +7,7 @@ Human Sanity Check для Part 3
 import csv
 import random
 from collections import defaultdict
+from phrase_matcher import PhraseMatcher
 
 # Запрещенные академические фразы
 ACADEMIC_RED_FLAGS = [
@@ -22,14 +23,11 @@ ACADEMIC_RED_FLAGS = [
     "sophisticated understanding of",
 ]
 
+ACADEMIC_MATCHER = PhraseMatcher(ACADEMIC_RED_FLAGS)
+
 def check_academic_phrases(text: str) -> list:
     """Проверяет наличие академических фраз"""
-    text_lower = text.lower()
-    found = []
-    for phrase in ACADEMIC_RED_FLAGS:
-        if phrase.lower() in text_lower:
-            found.append(phrase)
-    return found
+    return ACADEMIC_MATCHER.matched(text)
 
 def count_words(text: str) -> int:
     """Считает количество слов"""
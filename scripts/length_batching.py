@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Батчи по длине для обучения и инференса энкодера
+
+LengthBucketBatchSampler группирует последовательности близкой длины, поэтому
+pad_collate(pad_to=None) дополняет батч только до его самой длинной
+последовательности (Part 1 — десятки токенов вместо max_length=256).
+
+- batch_size: фиксированное число примеров в батче
+- max_tokens: бюджет токенов (batch_len * padded_len <= max_tokens) вместо batch_size
+- shuffle=True: перемешиваем, режем на пулы по bucket_batches батчей, сортируем
+  пул по длине и перемешиваем порядок батчей (seed эпохи — через set_epoch)
+- shuffle=False: глобальная сортировка по длине (оценка, скоринг)
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from torch.utils.data import Sampler
+
+
+def cut_batches(order: np.ndarray, lengths: np.ndarray, batch_size: Optional[int],
+                 max_tokens: Optional[int]) -> List[List[int]]:
+    """Режет упорядоченные индексы на батчи по batch_size или бюджету токенов"""
+    if max_tokens is None:
+        return [order[i:i + batch_size].tolist() for i in range(0, len(order), batch_size)]
+
+    batches = []
+    batch = []
+    longest = 0
+    for index in order.tolist():
+        length = int(lengths[index])
+        width = max(longest, length)
+        if batch and (width * (len(batch) + 1) > max_tokens
+                      or (batch_size is not None and len(batch) >= batch_size)):
+            batches.append(batch)
+            batch, width = [], length
+        batch.append(index)
+        longest = width
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class LengthBucketBatchSampler(Sampler):
+    """batch_sampler для DataLoader: индексы батчей, сгруппированные по длине"""
+
+    def __init__(self, lengths: Sequence[int], batch_size: Optional[int] = 16,
+                 max_tokens: Optional[int] = None, shuffle: bool = True,
+                 bucket_batches: int = 50, seed: int = 42):
+        if batch_size is None and max_tokens is None:
+            raise ValueError("Нужен batch_size или max_tokens")
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.bucket_batches = bucket_batches
+        self.seed = seed
+        self.epoch = 0
+        self._plans: Dict[int, List[List[int]]] = {}
+
+    def _plan(self, epoch: int) -> List[List[int]]:
+        if epoch in self._plans:
+            return self._plans[epoch]
+
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind='stable')
+            batches = cut_batches(order, self.lengths, self.batch_size, self.max_tokens)
+        else:
+            rng = np.random.default_rng([self.seed, epoch])
+            order = rng.permutation(len(self.lengths))
+            # Размер пула: bucket_batches батчей (для бюджета — в пересчете на средний батч)
+            per_batch = self.batch_size or max(1, self.max_tokens // max(1, int(self.lengths.mean())))
+            pool = per_batch * self.bucket_batches
+            batches = []
+            for start in range(0, len(order), pool):
+                chunk = order[start:start + pool]
+                chunk = chunk[np.argsort(self.lengths[chunk], kind='stable')]
+                batches.extend(cut_batches(chunk, self.lengths, self.batch_size, self.max_tokens))
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        self._plans = {epoch: batches}
+        return batches
+
+    def set_epoch(self, epoch: int):
+        """Как у DistributedSampler: вызывать перед каждой эпохой обучения"""
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self._plan(self.epoch))
+
+    def __len__(self) -> int:
+        return len(self._plan(self.epoch))
+
+    def padded_tokens(self) -> int:
+        """Сколько токенов (с паддингом) уйдет в энкодер за эпоху"""
+        return sum(len(batch) * int(self.lengths[batch].max()) for batch in self._plan(self.epoch))
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Поиск почти-дубликатов ответов: MinHash + LSH
+
+Шаблонные генераторы (generate_part1_templates_v2, generate_part2_structure_clean,
+generate_part3_structure_v2) дают много почти одинаковых ответов. Вместо
+попарного сравнения O(n²):
+- answer_text → множество шинглов (SHINGLE_SIZE слов подряд)
+- MinHash-сигнатура из NUM_PERM значений (векторно, чанками)
+- LSH: сигнатура режется на LSH_BANDS полос; ответы с совпавшей полосой —
+  кандидаты, которые проверяются по оценке Jaccard (доля совпавших значений)
+- кандидаты с Jaccard >= threshold склеиваются в кластеры (union-find)
+
+Template-collapse ratio группы (part, overall band) = 1 − кластеров / ответов:
+доля ответов, которые повторяют уже имеющийся шаблон.
+
+NearDuplicateIndex — онлайн-версия для потоковой сборки (dedup_stage в
+build_v1.3_clean.py): дубликаты выбрасываются или получают sample_weight = 1/k
+(k — номер копии в кластере).
+
+Использование:
+    python scripts/near_duplicates.py dataset_versions/v1.3/answers.csv [dataset_versions/v1.2/answers.csv ...]
+"""
+
+import re
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+LSH_BANDS = 32            # 32 полосы × 4 значения: кандидаты начиная с Jaccard ~0.4
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SEED = 1
+
+MERSENNE_PRIME = (1 << 31) - 1
+EMPTY_SIGNATURE = np.uint32(MERSENNE_PRIME)
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_SHINGLE_MULTIPLIERS = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F, 0x165667B1,
+                                 0xD3A2646C, 0xFD7046C5, 0xB55A4F09], dtype=np.uint64)
+_PERM_BLOCK = 16
+_token_hashes: Dict[str, int] = {}
+
+
+def _token_hash(token: str) -> int:
+    """Детерминированный хэш слова (одинаковый между запусками и версиями)"""
+    value = _token_hashes.get(token)
+    if value is None:
+        value = _token_hashes[token] = zlib.crc32(token.encode('utf-8')) + 1
+    return value
+
+
+class MinHasher:
+    """MinHash-сигнатуры для батча текстов: h_i(x) = (a_i·x + b_i) mod p"""
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = DEFAULT_SEED):
+        if shingle_size > len(_SHINGLE_MULTIPLIERS):
+            raise ValueError(f"shingle_size > {len(_SHINGLE_MULTIPLIERS)}")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Хэши шинглов всех текстов подряд + число шинглов каждого текста"""
+        k = self.shingle_size
+        tokens: List[int] = []
+        doc_ends = np.zeros(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            ids = [_token_hash(t) for t in _WORD_RE.findall(str(text).lower())]
+            if 0 < len(ids) < k:
+                # Короткий ответ — один шингл из всех слов
+                ids.extend([0] * (k - len(ids)))
+            tokens.extend(ids)
+            doc_ends[i] = len(tokens)
+        tokens = np.asarray(tokens, dtype=np.uint64)
+
+        doc_starts = np.concatenate(([0], doc_ends[:-1]))
+        counts = np.maximum(doc_ends - doc_starts - k + 1, 0)
+        # Позиция начала шингла допустима, если шингл не выходит за конец своего текста
+        starts = np.repeat(doc_starts, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        hashes = np.zeros(len(starts), dtype=np.uint64)
+        for j in range(k):
+            hashes ^= tokens[starts + j] * _SHINGLE_MULTIPLIERS[j]
+        return hashes % np.uint64(MERSENNE_PRIME), counts
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """(n, num_perm) uint32; у текстов без слов — EMPTY_SIGNATURE"""
+        signatures = np.full((len(texts), self.num_perm), EMPTY_SIGNATURE, dtype=np.uint32)
+        if not len(texts):
+            return signatures
+        hashes, counts = self._shingles(texts)
+        nonempty = counts > 0
+        if not nonempty.any():
+            return signatures
+        offsets = (np.cumsum(counts) - counts)[nonempty]
+        prime = np.uint64(MERSENNE_PRIME)
+        for start in range(0, self.num_perm, _PERM_BLOCK):
+            a = self.a[start:start + _PERM_BLOCK, None]
+            b = self.b[start:start + _PERM_BLOCK, None]
+            permuted = (a * hashes[None, :] + b) % prime
+            signatures[nonempty, start:start + _PERM_BLOCK] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return signatures
+
+
+def minhash_signatures(texts: Sequence[str], hasher: Optional[MinHasher] = None,
+                       chunk_size: int = 2000) -> np.ndarray:
+    """Сигнатуры всех текстов (чанками, чтобы ограничить память)"""
+    hasher = hasher or MinHasher()
+    return np.vstack([hasher.signatures(texts[i:i + chunk_size]) for i in range(0, len(texts), chunk_size)]
+                     or [np.zeros((0, hasher.num_perm), dtype=np.uint32)])
+
+
+def _band_keys(signatures: np.ndarray, band: int, rows: int) -> np.ndarray:
+    """Полоса сигнатуры как одно значение (void), для группировки np.unique"""
+    block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+    return block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+
+
+def _union(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Компоненты связности по ребрам: метка = минимальный индекс кластера"""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, labels[left], low)
+        np.minimum.at(updated, labels[right], low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def lsh_clusters(signatures: np.ndarray, threshold: float = DEFAULT_THRESHOLD,
+                 bands: int = LSH_BANDS) -> np.ndarray:
+    """
+    Метки кластеров (n,): индекс первого ответа кластера.
+    Кандидаты — ответы с общей полосой; в каждой корзине сравниваем
+    с первым ответом корзины, поэтому работа O(n · bands), а не O(n²).
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    valid = np.flatnonzero(signatures[:, 0] != EMPTY_SIGNATURE)
+    pairs = []
+    for band in range(bands):
+        _, first, inverse = np.unique(_band_keys(signatures[valid], band, rows),
+                                      return_index=True, return_inverse=True)
+        rep = first[inverse.ravel()]
+        members = np.flatnonzero(rep != np.arange(len(valid)))
+        if len(members):
+            pairs.append(valid[rep[members]].astype(np.int64) * n + valid[members])
+    if not pairs:
+        return np.arange(n)
+
+    pairs = np.unique(np.concatenate(pairs))
+    left, right = pairs // n, pairs % n
+    similar = np.empty(len(pairs), dtype=bool)
+    for start in range(0, len(pairs), 100000):
+        sl = slice(start, start + 100000)
+        similar[sl] = (signatures[left[sl]] == signatures[right[sl]]).mean(axis=1) >= threshold
+    return _union(n, left[similar], right[similar])
+
+
+def collapse_report(labels: np.ndarray, groups: Dict[str, np.ndarray]) -> Dict[Tuple, Dict]:
+    """
+    По ключам групп (например, part и overall band) → rows, clusters,
+    duplicates и collapse_ratio = 1 − clusters / rows
+    """
+    keys = list(zip(*groups.values()))
+    by_group = defaultdict(list)
+    for i, key in enumerate(keys):
+        by_group[key].append(i)
+    report = {}
+    for key in sorted(by_group):
+        index = by_group[key]
+        clusters = len(np.unique(labels[index]))
+        report[key] = {
+            'rows': len(index),
+            'clusters': clusters,
+            'duplicates': len(index) - clusters,
+            'collapse_ratio': 1 - clusters / len(index),
+        }
+    return report
+
+
+class NearDuplicateIndex:
+    """Онлайн-индекс LSH: каждый новый ответ сравнивается с представителями кластеров"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, bands: int = LSH_BANDS,
+                 hasher: Optional[MinHasher] = None):
+        self.hasher = hasher or MinHasher()
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.buckets: List[Dict[bytes, int]] = [{} for _ in range(bands)]
+        self.representatives: List[np.ndarray] = []
+        self.sizes: List[int] = []
+
+    def _keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def add(self, signature: np.ndarray) -> Tuple[int, int]:
+        """→ (кластер, номер копии в кластере; 1 — первый ответ)"""
+        if signature[0] == EMPTY_SIGNATURE:
+            self.representatives.append(signature)
+            self.sizes.append(1)
+            return len(self.sizes) - 1, 1
+        keys = self._keys(signature)
+        checked = set()
+        for band, key in enumerate(keys):
+            cluster = self.buckets[band].get(key)
+            if cluster is None or cluster in checked:
+                continue
+            checked.add(cluster)
+            if (self.representatives[cluster] == signature).mean() >= self.threshold:
+                self.sizes[cluster] += 1
+                return cluster, self.sizes[cluster]
+
+        cluster = len(self.sizes)
+        self.representatives.append(signature)
+        self.sizes.append(1)
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, cluster)
+        return cluster, 1
+
+
+def dedup_stage(index: NearDuplicateIndex, stats: Counter, mode: str = 'drop',
+                chunk_size: int = 1000) -> Callable[[Iterable[dict]], Iterator[dict]]:
+    """
+    Стадия конвейера (streaming_pipeline): mode='drop' — выбрасывает
+    почти-дубликаты, mode='weight' — sample_weight = 1/k для k-й копии
+    """
+    if mode not in ('drop', 'weight'):
+        raise ValueError(f"Неизвестный режим: {mode}")
+
+    def process(chunk):
+        signatures = index.hasher.signatures([r.get('answer_text', '') for r in chunk])
+        for record, signature in zip(chunk, signatures):
+            _, copy = index.add(signature)
+            stats['total'] += 1
+            if copy == 1:
+                if mode == 'weight':
+                    record = dict(record, sample_weight='1.0')
+                yield record
+                continue
+            stats['duplicates'] += 1
+            stats[f"duplicates_part{record.get('part', '')}"] += 1
+            if mode == 'weight':
+                yield dict(record, sample_weight=str(round(1 / copy, 4)))
+
+    def stage(records):
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield from process(chunk)
+                chunk = []
+        if chunk:
+            yield from process(chunk)
+    return stage
+
+
+def main():
+    from dataset_loader import load_table
+
+    paths = sys.argv[1:] or ['dataset_versions/v1.3/answers.csv']
+
+    print("=" * 70)
+    print("ПОИСК ПОЧТИ-ДУБЛИКАТОВ (MinHash + LSH)")
+    print("=" * 70)
+    print(f"\n🔧 Шинглы: {SHINGLE_SIZE} слова, {NUM_PERM} перестановок, {LSH_BANDS} полос, "
+          f"порог Jaccard {DEFAULT_THRESHOLD}")
+
+    texts, parts, overall, sources = [], [], [], []
+    for path in paths:
+        table = load_table(path)
+        texts.append(table['answer_text'])
+        parts.append(table['part'])
+        overall.append(np.array(['n/a' if np.isnan(b) else f'{b:.1f}' for b in table.bands[:, 0]], dtype=object))
+        sources.append(np.full(len(table), path, dtype=object))
+        print(f"   {path}: {len(table)} ответов")
+    texts = np.concatenate(texts)
+    parts, overall, sources = np.concatenate(parts), np.concatenate(overall), np.concatenate(sources)
+
+    start = time.time()
+    signatures = minhash_signatures(texts)
+    labels = lsh_clusters(signatures)
+    elapsed = time.time() - start
+    clusters = len(np.unique(labels))
+    print(f"\n📊 Всего: {len(texts)} ответов → {clusters} кластеров "
+          f"(collapse ratio {1 - clusters / max(len(texts), 1):.3f}) за {elapsed:.1f}s")
+
+    for path in paths:
+        mask = sources == path
+        print(f"\n📂 {path}")
+        print(f"   {'Part':<5} {'Band':>5} {'Ответов':>9} {'Кластеров':>10} {'Collapse':>9}")
+        report = collapse_report(labels[mask], {'part': parts[mask], 'band': overall[mask]})
+        for (part, band), row in report.items():
+            print(f"   {part:<5} {band:>5} {row['rows']:>9} {row['clusters']:>10} {row['collapse_ratio']:>9.3f}")
+
+    if len(paths) > 1:
+        # Кластеры, которые встречаются сразу в нескольких версиях
+        _, source_ids = np.unique(sources, return_inverse=True)
+        cluster_sources = np.unique(labels * len(paths) + source_ids.ravel())
+        versions_per_cluster = np.bincount(cluster_sources // len(paths))
+        print(f"\n🔗 Кластеров в нескольких версиях: {int((versions_per_cluster > 1).sum())}")
+
+    # Крупнейшие кластеры — примеры шаблонов
+    sizes = Counter(labels.tolist())
+    print(f"\n🔝 Крупнейшие кластеры:")
+    for label, size in sizes.most_common(5):
+        print(f"   {size:>5} × {str(texts[label])[:90]}...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+ONNX экспорт IELTSModel и инференс через ONNX Runtime (CPUExecutionProvider)
+
+- export_onnx: fp32 чекпоинт → models/ielts_model.onnx с динамическими осями
+  batch и sequence (входы input_ids / attention_mask, выход bands (batch, 5))
+- OnnxBandScorer: тот же интерфейс, что и BandScorer (predict_texts / score),
+  токенизация и батчи по длине общие, прямой проход — в InferenceSession
+- проверка паритета: предсказания ORT и PyTorch на dataset_versions/v1.3/test.csv
+  должны совпадать в пределах PARITY_ATOL (иначе код выхода 1)
+
+Нужны пакеты onnx и onnxruntime (pip install onnx onnxruntime).
+
+Использование:
+    python scripts/onnx_backend.py [models/ielts_model_best.pt] [models/ielts_model.onnx] [test.csv]
+    python scripts/score_answers.py dataset_versions/v1.3/test.csv scores.csv models/ielts_model.onnx
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+from score_answers import BAND_NAMES, CHECKPOINT_PATH, BandScorer, _training_config, load_grader
+from train_model import CONFIG, load_data
+
+ONNX_MODEL_PATH = 'models/ielts_model.onnx'
+ONNX_OPSET = 17
+TEST_PATH = 'dataset_versions/v1.3/test.csv'
+PARITY_REPORT_PATH = 'models/onnx_parity.json'
+PARITY_ATOL = 1e-3
+
+
+def export_onnx(checkpoint: str, output: str, model_name: str, opset: int = ONNX_OPSET) -> str:
+    """fp32 чекпоинт IELTSModel → ONNX (динамические batch / sequence)"""
+    model, quantized = load_grader(checkpoint, model_name)
+    if quantized:
+        raise ValueError(f"{checkpoint}: для ONNX нужен fp32 чекпоинт, а не int8")
+    dummy = torch.ones((2, 16), dtype=torch.long)
+    torch.onnx.export(
+        model, (dummy, torch.ones_like(dummy)), output,
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['bands'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'bands': {0: 'batch'},
+        },
+        opset_version=opset,
+        dynamo=False,
+    )
+    return output
+
+
+class OnnxBandScorer(BandScorer):
+    """BandScorer поверх ONNX Runtime (CPU)"""
+
+    def _load(self, model_path: str):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Для ONNX бэкенда нужен onnxruntime: pip install onnxruntime") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.profile['num_threads'] is not None:
+            options.intra_op_num_threads = self.profile['num_threads']
+        if self.profile['interop_threads'] is not None:
+            options.inter_op_num_threads = self.profile['interop_threads']
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.model = None
+        self.quantized = False
+        # Профиль torch (bf16 / compile) к ORT не относится
+        self.profile['bf16'] = False
+
+    def backend_name(self) -> str:
+        return 'onnxruntime'
+
+    def _forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> np.ndarray:
+        (bands,) = self.session.run(['bands'], {
+            'input_ids': input_ids.numpy().astype(np.int64),
+            'attention_mask': attention_mask.numpy().astype(np.int64),
+        })
+        return bands.astype(np.float32)
+
+
+def check_parity(torch_scorer: BandScorer, onnx_scorer: OnnxBandScorer, texts) -> dict:
+    """Сравнение сырых предсказаний и скорости двух бэкендов"""
+    report = {}
+    predictions = {}
+    for name, scorer in (('torch', torch_scorer), ('onnxruntime', onnx_scorer)):
+        scorer.predict_texts(texts[:64])  # прогрев
+        start = time.perf_counter()
+        predictions[name] = scorer.predict_texts(texts)
+        elapsed = time.perf_counter() - start
+        report[f'{name}_throughput_per_sec'] = len(texts) / elapsed if elapsed else 0.0
+
+    diff = np.abs(predictions['onnxruntime'] - predictions['torch'])
+    report['max_abs_diff'] = dict(zip(BAND_NAMES, diff.max(axis=0).tolist()))
+    report['mean_abs_diff'] = float(diff.mean())
+    report['atol'] = PARITY_ATOL
+    report['passed'] = bool(diff.max() <= PARITY_ATOL)
+    return report
+
+
+def main():
+    checkpoint = sys.argv[1] if len(sys.argv) > 1 else CHECKPOINT_PATH
+    output = sys.argv[2] if len(sys.argv) > 2 else ONNX_MODEL_PATH
+    test_path = sys.argv[3] if len(sys.argv) > 3 else TEST_PATH
+    model_name = _training_config().get('model_name', CONFIG['model_name'])
+
+    print("=" * 70)
+    print("ONNX ЭКСПОРТ И ПРОВЕРКА ПАРИТЕТА")
+    print("=" * 70)
+
+    print(f"\n🔧 {checkpoint} → {output} (opset {ONNX_OPSET}, динамические batch/sequence)")
+    export_onnx(checkpoint, output, model_name)
+    print(f"   Размер: {os.path.getsize(output) / 2 ** 20:.1f} MB")
+
+    texts, _, _ = load_data(test_path)
+    print(f"\n📂 {test_path}: {len(texts)} ответов")
+
+    torch_scorer = BandScorer(checkpoint, model_name=model_name, round_to_half=False)
+    onnx_scorer = OnnxBandScorer(output, model_name=model_name, round_to_half=False)
+    report = check_parity(torch_scorer, onnx_scorer, texts)
+    report.update({'checkpoint': checkpoint, 'onnx_model': output, 'test_path': test_path})
+
+    print(f"\n📊 ПАРИТЕТ (atol {PARITY_ATOL}):")
+    print(f"   Макс. расхождение: " + ", ".join(f"{band} {value:.2e}" for band, value in report['max_abs_diff'].items()))
+    print(f"   Среднее расхождение: {report['mean_abs_diff']:.2e}")
+    print(f"\n⏱️  PyTorch: {report['torch_throughput_per_sec']:.1f} ответов/с, "
+          f"ONNX Runtime: {report['onnxruntime_throughput_per_sec']:.1f} ответов/с")
+
+    with open(PARITY_REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Отчет сохранен в {PARITY_REPORT_PATH}")
+
+    if not report['passed']:
+        print(f"\n❌ Предсказания ONNX Runtime расходятся с PyTorch больше чем на {PARITY_ATOL}")
+        sys.exit(1)
+    print(f"\n✅ Паритет подтвержден")
+
+
+if __name__ == '__main__':
+    main()
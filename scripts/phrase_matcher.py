@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Общий движок поиска фраз (запрещенные фразы, академические маркеры, лексика)
+
+Все списки фраз компилируются один раз в одно регулярное выражение-альтернацию
+(префиксное дерево, длинные фразы первыми), поэтому ответ сканируется за один
+проход независимо от числа фраз. Семантика совпадает со старым
+`phrase.lower() in text.lower()`: поиск подстроки без учета регистра,
+перекрывающиеся вхождения и фразы-префиксы других фраз тоже находятся.
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+# Разделитель текстов при пакетном поиске (не встречается во фразах)
+BATCH_SEPARATOR = '\x01'
+
+
+def _trie_pattern(keys: Sequence[str]) -> str:
+    """
+    Альтернация фраз в виде префиксного дерева: 'he go|he does' → 'he (?:go|does)'.
+    В каждой позиции проверяется один путь по дереву, а не все фразы подряд;
+    продолжение пробуется раньше конца фразы — совпадение самое длинное
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        options = [re.escape(char) + build(child) for char, child in node.items() if char]
+        if '' in node and options:
+            options.append('')
+        if len(options) <= 1:
+            return ''.join(options)
+        return '(?:' + '|'.join(options) + ')'
+
+    return build(trie)
+
+
+class PhraseHit(NamedTuple):
+    start: int
+    end: int
+    phrase: str   # фраза в исходном написании (как в списке)
+    group: str
+
+
+class PhraseMatcher:
+    """
+    Матчер по именованным группам фраз:
+        PhraseMatcher({'part1': PART1_FORBIDDEN, 'part2': PART2_FORBIDDEN})
+    Список без имени попадает в группу 'default'.
+    """
+
+    def __init__(self, groups: Union[Dict[str, Iterable[str]], Iterable[str]]):
+        if not isinstance(groups, dict):
+            groups = {'default': groups}
+        self.groups = {name: list(phrases) for name, phrases in groups.items()}
+
+        # lower(фраза) → [(группа, фраза, порядковый номер в группе), ...]
+        self._entries: Dict[str, List[tuple]] = {}
+        for name, phrases in self.groups.items():
+            for order, phrase in enumerate(phrases):
+                self._entries.setdefault(phrase.lower(), []).append((name, phrase, order))
+
+        keys = sorted(self._entries, key=len, reverse=True)
+        # Альтернация находит в каждой позиции самую длинную фразу; остальные
+        # фразы, начинающиеся там же, обязательно ее префиксы — досчитываем их
+        self._prefixes = {key: [other for other in keys if other != key and key.startswith(other)]
+                          for key in keys}
+        self._regex = re.compile(_trie_pattern(keys)) if keys else None
+
+    def _iter_keys(self, lowered: str):
+        if self._regex is None:
+            return
+        # search() с шагом в один символ вместо finditer: находит и перекрывающиеся
+        # вхождения, а альтернация без lookahead использует быстрый поиск по префиксу
+        search = self._regex.search
+        match = search(lowered)
+        while match is not None:
+            start = match.start()
+            key = match.group()
+            match = search(lowered, start + 1)
+            yield start, key
+            for prefix in self._prefixes[key]:
+                yield start, prefix
+
+    def find_all(self, text: str, group: Optional[str] = None) -> List[PhraseHit]:
+        """Все вхождения с позициями (в порядке позиции)"""
+        hits = []
+        for start, key in self._iter_keys(text.lower()):
+            for name, phrase, _ in self._entries[key]:
+                if group is None or name == group:
+                    hits.append(PhraseHit(start, start + len(key), phrase, name))
+        return hits
+
+    def matched_by_group(self, text: str) -> Dict[str, List[str]]:
+        """Один проход по тексту → уникальные найденные фразы каждой группы
+        в порядке исходного списка (как у цикла `for phrase in PHRASES: ...`)"""
+        found = {name: {} for name in self.groups}
+        for _, key in self._iter_keys(text.lower()):
+            for name, phrase, order in self._entries[key]:
+                found[name][order] = phrase
+        return {name: [hits[o] for o in sorted(hits)] for name, hits in found.items()}
+
+    def matched(self, text: str, group: str = 'default') -> List[str]:
+        """Найденные фразы одной группы"""
+        return self.matched_by_group(text)[group]
+
+    def count(self, text: str, group: str = 'default') -> int:
+        """Число разных найденных фраз группы"""
+        return len(self.matched(text, group))
+
+    def count_many(self, texts: Sequence[str], group: str = 'default') -> np.ndarray:
+        """Пакетный count(): тексты склеиваются через BATCH_SEPARATOR и
+        сканируются одним проходом, хиты раскладываются по строкам"""
+        lowered = [text.lower() for text in texts]
+        lengths = np.fromiter(map(len, lowered), dtype=np.int64, count=len(lowered))
+        row_starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+
+        # (группа, порядковый номер) → плотный id, чтобы считать разные фразы
+        entry_ids = {}
+        key_entries = {key: [entry_ids.setdefault(order, len(entry_ids))
+                             for name, _, order in entries if name == group]
+                       for key, entries in self._entries.items()}
+
+        positions, ids = [], []
+        for start, key in self._iter_keys(BATCH_SEPARATOR.join(lowered)):
+            for entry_id in key_entries[key]:
+                positions.append(start)
+                ids.append(entry_id)
+        if not ids:
+            return np.zeros(len(lowered), dtype=np.int32)
+
+        rows = np.searchsorted(row_starts, np.asarray(positions), side='right') - 1
+        pairs = np.unique(rows * len(entry_ids) + np.asarray(ids))
+        return np.bincount(pairs // len(entry_ids), minlength=len(lowered)).astype(np.int32)
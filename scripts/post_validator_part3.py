@@ -2,10 +2,13 @@
 """
 Пост-валидатор для Part 3
 Фильтрует подозрительные ответы (слишком академические, слишком длинные, etc.)
+Повторный запуск перепроверяет только новые/измененные ответы (validation_store.py)
 """
 
 import csv
 import re
+from phrase_matcher import PhraseMatcher
+from validation_store import ValidationStore, rules_version, validate_incremental
 
 # Запрещенные академические фразы
 ACADEMIC_RED_FLAGS = [
@@ -37,14 +40,11 @@ def count_complex_sentences(text: str) -> int:
             complex_count += 1
     return complex_count
 
+ACADEMIC_MATCHER = PhraseMatcher(ACADEMIC_RED_FLAGS)
+
 def check_academic_phrases(text: str) -> list:
     """Проверяет наличие академических фраз"""
-    text_lower = text.lower()
-    found = []
-    for phrase in ACADEMIC_RED_FLAGS:
-        if phrase.lower() in text_lower:
-            found.append(phrase)
-    return found
+    return ACADEMIC_MATCHER.matched(text)
 
 def validate_answer(answer: dict) -> dict:
     """Валидирует один ответ"""
@@ -84,6 +84,11 @@ def validate_answer(answer: dict) -> dict:
         'severity': severity
     }
 
+# Поля, которые читает validate_answer, и версия правил (для validation_store)
+VALIDATED_FIELDS = ('answer_text', 'target_band_overall')
+RULE_VERSION = rules_version(validate_answer, count_words, count_complex_sentences, PhraseMatcher,
+                             ACADEMIC_RED_FLAGS)
+
 def main():
     print("=" * 70)
     print("ПОСТ-ВАЛИДАЦИЯ PART 3")
@@ -98,12 +103,12 @@ def main():
     part3 = [a for a in answers if a['part'] == '3']
     print(f"\n📊 Part 3 ответов: {len(part3)}")
     
-    # Валидируем все
+    # Валидируем (из хранилища — то, что не менялось)
     print("\n🔍 Валидация...")
-    results = []
-    for answer in part3:
-        result = validate_answer(answer)
-        results.append(result)
+    store = ValidationStore('post_validator_part3')
+    results = validate_incremental(part3, validate_answer, store, VALIDATED_FIELDS, RULE_VERSION)
+    store.save()
+    print(f"   ♻️  Инкрементально: {store.summary()}")
     
     # Статистика
     suspicious = [r for r in results if r['severity'] == 'suspicious']
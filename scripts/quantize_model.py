@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Экспорт int8-версии обученной модели для скоринга на CPU
+
+Динамическая квантизация (torch.ao.quantization.quantize_dynamic): веса всех
+nn.Linear энкодера и 5 голов хранятся в int8, активации остаются fp32.
+Чекпоинт загружается тем же BandScorer (формат определяется автоматически).
+
+Отчет на dataset_versions/v1.3/test.csv для fp32 и int8:
+- размер чекпоинта на диске
+- память: прирост RSS на загрузку BandScorer + один батч скоринга (каждый
+  вариант в отдельном процессе: память, освобожденная torch, редко
+  возвращается ОС, и второй замер иначе зависел бы от первого)
+- латентность: p50/p99 на один ответ (батч 1) и пропускная способность батчами
+- MAE по 5 бэндам относительно разметки и разница int8 − fp32
+
+Использование:
+    python scripts/quantize_model.py [models/ielts_model_best.pt] [models/ielts_model_int8.pt] [test.csv]
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from score_answers import (BAND_NAMES, CHECKPOINT_PATH, QUANTIZED_CHECKPOINT_PATH, BandScorer,
+                           _training_config, load_grader, quantize_dynamic_int8)
+from train_model import CONFIG, load_data
+
+TEST_PATH = 'dataset_versions/v1.3/test.csv'
+REPORT_PATH = 'models/quantization_report.json'
+LATENCY_SAMPLES = 200
+MEMORY_BATCH = 64
+
+
+def export_int8(checkpoint: str, output: str, model_name: str) -> str:
+    """fp32 чекпоинт → int8 state_dict"""
+    model, quantized = load_grader(checkpoint, model_name)
+    if quantized:
+        raise ValueError(f"{checkpoint} уже квантован")
+    torch.save(quantize_dynamic_int8(model).state_dict(), output)
+    return output
+
+
+def _rss_mb() -> float:
+    """Текущий RSS процесса (/proc/self/statm), без /proc — пиковый (ru_maxrss)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _memory_worker(path: str, model_name: str, texts: List[str]) -> Dict:
+    before = _rss_mb()
+    scorer = BandScorer(path, model_name=model_name, round_to_half=False)
+    loaded = _rss_mb()
+    scorer.predict_texts(texts)
+    return {'rss_load_mb': loaded - before, 'rss_mb': _rss_mb() - before}
+
+
+def measure_memory(path: str, model_name: str, texts: List[str]) -> Dict:
+    """Прирост RSS (MB) после загрузки модели и после батча texts — в отдельном процессе"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_memory_worker, path, model_name, texts).result()
+
+
+def measure(scorer: BandScorer, texts: List[str], targets: np.ndarray) -> Dict:
+    """Латентность, пропускная способность и MAE одного варианта"""
+    latencies = []
+    for text in texts[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        scorer.predict_texts([text])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    predictions = scorer.predict_texts(texts)
+    elapsed = time.perf_counter() - start
+
+    mae = np.abs(predictions - targets).mean(axis=0)
+    return {
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'throughput_per_sec': len(texts) / elapsed if elapsed else 0.0,
+        'mae': dict(zip(BAND_NAMES, mae.tolist())),
+        'predictions': predictions,
+    }
+
+
+def main():
+    checkpoint = sys.argv[1] if len(sys.argv) > 1 else CHECKPOINT_PATH
+    output = sys.argv[2] if len(sys.argv) > 2 else QUANTIZED_CHECKPOINT_PATH
+    test_path = sys.argv[3] if len(sys.argv) > 3 else TEST_PATH
+    model_name = _training_config().get('model_name', CONFIG['model_name'])
+
+    print("=" * 70)
+    print("INT8 КВАНТИЗАЦИЯ МОДЕЛИ")
+    print("=" * 70)
+
+    print(f"\n🔧 {checkpoint} → {output} (динамическая квантизация nn.Linear)")
+    export_int8(checkpoint, output, model_name)
+
+    texts, targets, _ = load_data(test_path)
+    print(f"\n📂 {test_path}: {len(texts)} ответов")
+
+    # Сырые предсказания (без округления до 0.5), чтобы разница была видна
+    report = {'test_path': test_path, 'model_name': model_name, 'variants': {}}
+    predictions = {}
+    for name, path in (('fp32', checkpoint), ('int8', output)):
+        print(f"\n⏱️  {name}...")
+        memory = measure_memory(path, model_name, texts[:MEMORY_BATCH])
+        scorer = BandScorer(path, model_name=model_name, round_to_half=False)
+        result = measure(scorer, texts, targets)
+        predictions[name] = result.pop('predictions')
+        result['checkpoint'] = path
+        result['checkpoint_size_mb'] = os.path.getsize(path) / 2 ** 20
+        result.update(memory)
+        report['variants'][name] = result
+        print(f"   Чекпоинт на диске: {result['checkpoint_size_mb']:.1f} MB")
+        print(f"   Память (RSS): загрузка +{result['rss_load_mb']:.1f} MB, "
+              f"после батча из {MEMORY_BATCH} +{result['rss_mb']:.1f} MB")
+        print(f"   Латентность (1 ответ): p50 {result['latency_ms_p50']:.1f} ms, p99 {result['latency_ms_p99']:.1f} ms")
+        print(f"   Пропускная способность: {result['throughput_per_sec']:.1f} ответов/с")
+        print(f"   MAE: " + ", ".join(f"{band} {value:.3f}" for band, value in result['mae'].items()))
+
+    fp32, int8 = report['variants']['fp32'], report['variants']['int8']
+    report['delta'] = {
+        'mae': {band: int8['mae'][band] - fp32['mae'][band] for band in BAND_NAMES},
+        'max_abs_prediction_diff': float(np.abs(predictions['int8'] - predictions['fp32']).max()),
+        'checkpoint_size_ratio': int8['checkpoint_size_mb'] / fp32['checkpoint_size_mb'],
+        'memory_ratio': int8['rss_mb'] / fp32['rss_mb'] if fp32['rss_mb'] > 0 else float('nan'),
+        'latency_p50_speedup': fp32['latency_ms_p50'] / int8['latency_ms_p50'],
+        'throughput_speedup': int8['throughput_per_sec'] / fp32['throughput_per_sec'],
+    }
+
+    delta = report['delta']
+    print(f"\n📊 INT8 vs FP32:")
+    print(f"   Чекпоинт на диске: x{delta['checkpoint_size_ratio']:.2f}, память (RSS): x{delta['memory_ratio']:.2f}")
+    print(f"   Латентность p50: ускорение x{delta['latency_p50_speedup']:.2f}, "
+          f"пропускная способность x{delta['throughput_speedup']:.2f}")
+    print(f"   ΔMAE: " + ", ".join(f"{band} {value:+.4f}" for band, value in delta['mae'].items()))
+    print(f"   Макс. расхождение предсказаний: {delta['max_abs_prediction_diff']:.4f}")
+
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Отчет сохранен в {REPORT_PATH}")
+    print(f"💾 INT8 модель: {output} (python scripts/score_answers.py <input> <output> {output})")
+
+
+if __name__ == '__main__':
+    main()
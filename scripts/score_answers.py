@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Скоринг ответов обученной моделью (models/ielts_model_best.pt)
+
+BandScorer загружает чекпоинт один раз и оценивает поток записей
+(part, question, answer_text): записи читаются чанками, токенизируются батчем,
+сортируются по длине и прогоняются микро-батчами с динамическим паддингом
+под torch.inference_mode(). Порядок выдачи совпадает с порядком входа.
+
+Если в configs/training_config_v1.3.json включено
+training.calibration.round_to_half_band, предсказания округляются до 0.5.
+
+Чекпоинт может быть fp32 (models/ielts_model_best.pt) или int8 после
+quantize_model.py (models/ielts_model_int8.pt) — формат определяется по ключам;
+.onnx — инференс через ONNX Runtime (onnx_backend.py).
+
+Профиль выполнения (execution_profile.py, по умолчанию 'default' — fp32)
+задает bf16 autocast, потоки и torch.compile.
+
+Использование:
+    python scripts/score_answers.py dataset_versions/v1.3/test.csv [scores.csv] [checkpoint.pt] [profile]
+    python scripts/score_answers.py answers.jsonl scores.jsonl
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from execution_profile import apply_threads, autocast, describe, get_profile, maybe_compile
+from length_batching import cut_batches
+from token_cache import pad_collate
+from train_model import CONFIG, IELTSModel
+
+CHECKPOINT_PATH = 'models/ielts_model_best.pt'
+QUANTIZED_CHECKPOINT_PATH = 'models/ielts_model_int8.pt'
+TRAINING_RESULTS_PATH = 'models/training_results.json'
+TRAINING_CONFIG_PATH = 'configs/training_config_v1.3.json'
+
+BAND_NAMES = ('overall', 'fc', 'lr', 'gra', 'pr')
+PREDICTION_FIELDS = [f'pred_band_{name}' for name in BAND_NAMES]
+BAND_MIN, BAND_MAX = 0.0, 9.0
+
+
+class ScoreRecord(NamedTuple):
+    part: str
+    question: str
+    answer_text: str
+
+
+def round_bands(predictions: np.ndarray) -> np.ndarray:
+    """Округление до ближайшего 0.5 (как round_to_half) в диапазоне бэндов"""
+    # + 0.0 убирает -0.0 после округления
+    return np.clip(np.round(predictions * 2) / 2, BAND_MIN, BAND_MAX) + 0.0
+
+
+def load_round_to_half(config_path: str = TRAINING_CONFIG_PATH) -> bool:
+    """training.calibration.round_to_half_band из конфига обучения"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except OSError:
+        return False
+    return bool(config.get('training', {}).get('calibration', {}).get('round_to_half_band', False))
+
+
+def _training_config(results_path: str = TRAINING_RESULTS_PATH) -> dict:
+    """CONFIG, с которым обучался чекпоинт (models/training_results.json)"""
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('config', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def as_record(record: Union[ScoreRecord, Sequence, Dict]) -> ScoreRecord:
+    """Кортеж (part, question, answer_text) или строка answers.csv/JSONL → ScoreRecord"""
+    if isinstance(record, dict):
+        question = record.get('question_text', record.get('question', ''))
+        text = record.get('answer_text') or record.get('transcript_raw') or ''
+        return ScoreRecord(str(record.get('part', '')), question or '', text)
+    part, question, answer_text = record
+    return ScoreRecord(str(part), question or '', answer_text or '')
+
+
+def is_quantized_state(state_dict: dict) -> bool:
+    """state_dict динамически квантованной модели (int8 Linear)"""
+    return any(key.endswith('_packed_params._packed_params') for key in state_dict)
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Динамическая квантизация: веса всех nn.Linear в int8, активации — fp32 (только CPU)"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_grader(checkpoint: str, model_name: str, device: str = 'cpu') -> Tuple[IELTSModel, bool]:
+    """IELTSModel из fp32 или int8 чекпоинта → (model, quantized)"""
+    state_dict = torch.load(checkpoint, map_location=device)
+    quantized = is_quantized_state(state_dict)
+    model = IELTSModel(model_name)
+    if quantized:
+        model = quantize_dynamic_int8(model.eval())
+    model.load_state_dict(state_dict)
+    return model.to(device).eval(), quantized
+
+
+class BandScorer:
+    """Загружает модель один раз; score() / predict_texts() — батчевый инференс"""
+
+    def __init__(self, checkpoint: str = CHECKPOINT_PATH, model_name: Optional[str] = None,
+                 max_length: Optional[int] = None, device: str = 'cpu', batch_size: int = 64,
+                 max_tokens: Optional[int] = None, chunk_size: int = 2048,
+                 round_to_half: Optional[bool] = None, profile='default'):
+        trained = _training_config()
+        self.model_name = model_name or trained.get('model_name', CONFIG['model_name'])
+        self.max_length = max_length or trained.get('max_length', CONFIG['max_length'])
+        self.device = device
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.chunk_size = chunk_size
+        self.round_to_half = load_round_to_half() if round_to_half is None else round_to_half
+        self.profile = get_profile(profile)
+        apply_threads(self.profile)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self._load(checkpoint)
+
+    def _load(self, checkpoint: str):
+        self.model, self.quantized = load_grader(checkpoint, self.model_name, self.device)
+        if self.quantized:
+            # int8 ядра работают в fp32-активациях: bf16 autocast не нужен
+            self.profile['bf16'] = False
+        self.model = maybe_compile(self.model, self.profile)
+
+    def predict_texts(self, texts: List[str]) -> np.ndarray:
+        """Сырые предсказания (n, 5) для списка текстов в исходном порядке"""
+        predictions = np.zeros((len(texts), len(BAND_NAMES)), dtype=np.float32)
+        if not texts:
+            return predictions
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length,
+                                 padding=False)['input_ids']
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        order = np.argsort(lengths, kind='stable')
+        pad_token_id = self.tokenizer.pad_token_id or 0
+
+        with torch.inference_mode(), autocast(self.profile, self.device):
+            for batch in cut_batches(order, lengths, self.batch_size, self.max_tokens):
+                inputs = pad_collate([{'input_ids': torch.tensor(encoded[i])} for i in batch],
+                                     pad_token_id=pad_token_id)
+                predictions[batch] = self._forward(inputs['input_ids'], inputs['attention_mask'])
+        return predictions
+
+    def backend_name(self) -> str:
+        return 'int8' if self.quantized else 'fp32'
+
+    def _forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> np.ndarray:
+        """Прямой проход по одному батчу → (batch, 5); переопределяется другими бэкендами"""
+        outputs = self.model(input_ids.to(self.device), attention_mask.to(self.device))
+        return outputs.float().cpu().numpy()
+
+    def score(self, records: Iterable) -> Iterator[tuple]:
+        """
+        Поток (record, bands): bands — массив из 5 бэндов (overall, fc, lr, gra, pr),
+        округленных до 0.5, если включено round_to_half
+        """
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                yield from self._score_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._score_chunk(chunk)
+
+    def _score_chunk(self, chunk: list) -> Iterator[tuple]:
+        predictions = self.predict_texts([as_record(r).answer_text for r in chunk])
+        if self.round_to_half:
+            predictions = round_bands(predictions)
+        for record, bands in zip(chunk, predictions):
+            yield record, bands
+
+
+def make_scorer(checkpoint: str = CHECKPOINT_PATH, **kwargs) -> BandScorer:
+    """BandScorer для чекпоинта: .onnx — ONNX Runtime (onnx_backend.py), иначе PyTorch"""
+    if checkpoint.endswith('.onnx'):
+        from onnx_backend import OnnxBandScorer
+        return OnnxBandScorer(checkpoint, **kwargs)
+    return BandScorer(checkpoint, **kwargs)
+
+
+def iter_records(filepath: str) -> Iterator[dict]:
+    """Потоковое чтение входа: .jsonl (по строке JSON) или CSV"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        if filepath.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def main():
+    input_path = sys.argv[1] if len(sys.argv) > 1 else 'dataset_versions/v1.3/test.csv'
+    stem, ext = os.path.splitext(input_path)
+    output_path = sys.argv[2] if len(sys.argv) > 2 else f'{stem}_scores{ext}'
+    checkpoint = sys.argv[3] if len(sys.argv) > 3 else CHECKPOINT_PATH
+    profile = sys.argv[4] if len(sys.argv) > 4 else 'default'
+
+    print("=" * 70)
+    print("СКОРИНГ ОТВЕТОВ")
+    print("=" * 70)
+
+    scorer = make_scorer(checkpoint, profile=profile)
+    print(f"\n🤖 Модель: {scorer.model_name} ({checkpoint}, {scorer.backend_name()}), "
+          f"max_length={scorer.max_length}")
+    print(f"   Округление до 0.5: {'да' if scorer.round_to_half else 'нет'}")
+    print(f"   Профиль выполнения: {describe(scorer.profile)}")
+
+    start = time.time()
+    count = 0
+    id_fields = ['answer_id', 'part', 'question_id']
+    with open(output_path, 'w', encoding='utf-8', newline='') as out:
+        writer = None
+        if not output_path.endswith('.jsonl'):
+            writer = csv.DictWriter(out, fieldnames=id_fields + PREDICTION_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+        for record, bands in scorer.score(iter_records(input_path)):
+            row = {name: record.get(name, '') for name in id_fields}
+            row.update(zip(PREDICTION_FIELDS, (float(b) for b in bands)))
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+
+    elapsed = time.time() - start
+    print(f"\n📊 Оценено: {count} ответов за {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} ответов/с)")
+    print(f"💾 Результаты сохранены в {output_path}")
+
+
+if __name__ == '__main__':
+    main()
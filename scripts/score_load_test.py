@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Локальный генератор нагрузки для score_server.py
+
+N параллельных keep-alive соединений шлют POST /score с ответами из датасета;
+в конце печатаются пропускная способность, p50/p99 латентности на клиенте,
+коды ответов и /metrics сервера (размеры батчей, p50/p99 на сервере).
+
+Использование:
+    python scripts/score_load_test.py [--url http://127.0.0.1:8080] [--concurrency 32]
+                                      [--requests 2000] [--data dataset_versions/v1.3/answers.csv]
+"""
+
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from typing import List, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from streaming_pipeline import iter_csv
+
+DEFAULT_OPTIONS = {
+    'url': 'http://127.0.0.1:8080',
+    'concurrency': 32,
+    'requests': 2000,
+    'data': 'dataset_versions/v1.3/answers.csv',
+}
+
+
+async def _request(reader, writer, method: str, path: str, host: str, body: bytes = b'') -> Tuple[int, bytes]:
+    head = (f'{method} {path} HTTP/1.1\r\nHost: {host}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def _client(host: str, port: int, payloads: List[bytes], counter: iter,
+                  latencies: List[float], statuses: Counter):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for index in counter:
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, 'POST', '/score', host,
+                                       payloads[index % len(payloads)])
+            statuses[status] += 1
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            elif status == 503:
+                await asyncio.sleep(0.05)
+    finally:
+        writer.close()
+
+
+async def run_load(options: dict) -> dict:
+    url = urlparse(options['url'])
+    host, port = url.hostname, url.port or 80
+
+    payloads = [json.dumps({'part': r['part'], 'question': r['question_text'],
+                            'answer_text': r['answer_text']}).encode('utf-8')
+                for r in iter_csv(options['data'])]
+    latencies, statuses = [], Counter()
+    counter = iter(range(options['requests']))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, payloads, counter, latencies, statuses)
+                           for _ in range(options['concurrency'])))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await _request(reader, writer, 'GET', '/metrics', host)
+    writer.close()
+
+    latencies = np.asarray(latencies)
+    return {
+        'elapsed_sec': elapsed,
+        'throughput_rps': statuses[200] / elapsed if elapsed else 0.0,
+        'statuses': dict(statuses),
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'server': json.loads(body),
+    }
+
+
+def main():
+    options = dict(DEFAULT_OPTIONS)
+    args = iter(sys.argv[1:])
+    for arg in args:
+        key = arg.lstrip('-')
+        if key not in options:
+            raise SystemExit(f"Неизвестная опция: {arg}")
+        options[key] = type(DEFAULT_OPTIONS[key])(next(args))
+
+    print("=" * 70)
+    print("НАГРУЗОЧНЫЙ ТЕСТ СЕРВИСА СКОРИНГА")
+    print("=" * 70)
+    print(f"\n🎯 {options['url']}: {options['requests']} запросов, {options['concurrency']} соединений")
+
+    report = asyncio.run(run_load(options))
+    server = report['server']
+
+    print(f"\n📊 КЛИЕНТ:")
+    print(f"   Время: {report['elapsed_sec']:.2f}s, {report['throughput_rps']:.1f} ответов/с")
+    print(f"   Коды: {report['statuses']}")
+    if report['p50_ms'] is not None:
+        print(f"   Латентность: p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms")
+    print(f"\n📊 СЕРВЕР:")
+    print(f"   Латентность: {server['latency_ms']}")
+    print(f"   Батчей: {server['batches']}, средний размер {server['mean_batch_size']}")
+    print(f"   Гистограмма размеров: {server['batch_size_histogram']}")
+    print(f"   Отклонено (503): {server['rejected']}")
+
+
+if __name__ == '__main__':
+    main()
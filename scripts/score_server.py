@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Локальный HTTP-сервис скоринга (asyncio, без внешних зависимостей)
+
+- модель загружается один раз (BandScorer из score_answers.py)
+- параллельные запросы склеиваются в микро-батчи: батч уходит в модель, когда
+  набралось max_batch ответов или прошло max_wait_ms с первого ответа в батче
+- backpressure: очередь ограничена max_queue ответами, при переполнении —
+  503 + Retry-After (клиент повторяет позже, сервер не копит память); запрос больше
+  max_queue ответов не поместится никогда — 413
+- метрики: p50/p99 латентности, гистограмма размеров батчей, глубина очереди
+
+Эндпоинты:
+    POST /score    {"part": "1", "question": "...", "answer_text": "..."}
+                   или {"answers": [{...}, ...]} → бэнды overall/fc/lr/gra/pr
+    GET  /metrics  JSON со статистикой
+    GET  /health
+
+Использование:
+    python scripts/score_server.py [--port 8080] [--max-batch 32] [--max-wait-ms 10] [--max-queue 1024]
+                                   [--profile cpu_bf16]
+    python scripts/score_load_test.py --url http://127.0.0.1:8080
+"""
+
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from score_answers import BAND_NAMES, CHECKPOINT_PATH, BandScorer, as_record, make_scorer, round_bands
+
+DEFAULT_OPTIONS = {
+    'host': '127.0.0.1',
+    'port': 8080,
+    'max_batch': 32,
+    'max_wait_ms': 10.0,
+    'max_queue': 1024,
+    'checkpoint': CHECKPOINT_PATH,
+    'profile': 'default',
+}
+
+MAX_BODY_BYTES = 1 << 20
+LATENCY_WINDOW = 10000
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ServerMetrics:
+    """Скользящее окно латентностей + гистограмма батчей"""
+
+    def __init__(self):
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.answers = 0
+        self.rejected = 0
+        self.errors = 0
+        self.started = time.time()
+
+    def snapshot(self, queue_depth: int) -> dict:
+        latencies = np.asarray(self.latencies_ms)
+        percentiles = {}
+        if len(latencies):
+            for name, q in (('p50', 50), ('p90', 90), ('p99', 99)):
+                percentiles[name] = round(float(np.percentile(latencies, q)), 3)
+            percentiles['max'] = round(float(latencies.max()), 3)
+        batches = sum(self.batch_sizes.values())
+        return {
+            'uptime_sec': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'answers': self.answers,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'queue_depth': queue_depth,
+            'latency_ms': percentiles,
+            'batches': batches,
+            'mean_batch_size': round(self.answers / batches, 2) if batches else 0.0,
+            'batch_size_histogram': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
+
+
+class CoalescingScorer:
+    """Очередь ответов → микро-батчи → модель в отдельном потоке"""
+
+    def __init__(self, scorer: BandScorer, max_batch: int, max_wait_ms: float, max_queue: int,
+                 metrics: ServerMetrics):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.metrics = metrics
+        # Один поток: torch сам распараллеливает батч, а event loop не блокируется
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def try_submit(self, texts: List[str]) -> Optional[List[asyncio.Future]]:
+        """Ставит ответы в очередь; None, если места нет (backpressure)"""
+        if self.queue.maxsize - self.queue.qsize() < len(texts):
+            return None
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.queue.put_nowait((text, future))
+            futures.append(future)
+        return futures
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Все, что уже лежит в очереди, забираем без ожидания
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def _predict(self, texts: List[str]) -> np.ndarray:
+        predictions = self.scorer.predict_texts(texts)
+        return round_bands(predictions) if self.scorer.round_to_half else predictions
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            self.metrics.batch_sizes[len(batch)] += 1
+            try:
+                predictions = await loop.run_in_executor(self.executor, self._predict, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), bands in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(bands)
+
+
+def _answer_text(item) -> str:
+    """Текст ответа из элемента запроса: dict или список [part, question, answer_text]
+    из строк; answer_text — непустая строка, иначе ValueError (→ 400)"""
+    if isinstance(item, (list, tuple)):
+        if len(item) != 3 or not all(isinstance(value, str) for value in item):
+            raise ValueError('list answers must be [part, question, answer_text] strings')
+    elif not isinstance(item, dict):
+        raise ValueError(f'answer must be an object, got {type(item).__name__}')
+    text = as_record(item).answer_text
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError('answer_text must be a non-empty string')
+    return text
+
+
+def _bands_json(bands) -> dict:
+    return {name: float(value) for name, value in zip(BAND_NAMES, bands)}
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """Минимальный разбор HTTP/1.1: (method, path, headers, body) или None при EOF"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ValueError('bad request line')
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        raise OverflowError(length)
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict,
+                    keep_alive: bool, extra_headers: Optional[dict] = None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = {
+        'Content-Type': 'application/json; charset=utf-8',
+        'Content-Length': str(len(body)),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }
+    headers.update(extra_headers or {})
+    head = f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\n'
+    head += ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+    writer.write(head.encode('latin-1') + body)
+
+
+class ScoreServer:
+    def __init__(self, coalescer: CoalescingScorer, metrics: ServerMetrics):
+        self.coalescer = coalescer
+        self.metrics = metrics
+
+    async def _score(self, body: bytes) -> Tuple[int, dict, Optional[dict]]:
+        try:
+            payload = json.loads(body or b'{}')
+            batch_request = isinstance(payload, dict) and 'answers' in payload
+            items = payload['answers'] if batch_request else [payload]
+            if not isinstance(items, list):
+                raise ValueError('"answers" must be a list')
+            texts = [_answer_text(item) for item in items]
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return 400, {'error': f'invalid payload: {e}'}, None
+        if not texts:
+            return 400, {'error': 'no answers'}, None
+        if len(texts) > self.coalescer.queue.maxsize:
+            # Не влезет никогда: 503 + Retry-After заставил бы клиента повторять вечно
+            return 413, {'error': f'too many answers: {len(texts)} > max_queue '
+                                  f'{self.coalescer.queue.maxsize}, split the request'}, None
+
+        futures = self.coalescer.try_submit(texts)
+        if futures is None:
+            self.metrics.rejected += 1
+            return 503, {'error': 'overloaded'}, {'Retry-After': '1'}
+        try:
+            results = [_bands_json(bands) for bands in await asyncio.gather(*futures)]
+        except Exception as e:
+            self.metrics.errors += 1
+            return 500, {'error': f'scoring failed: {type(e).__name__}: {e}'}, None
+        self.metrics.answers += len(results)
+        return 200, ({'results': results} if batch_request else results[0]), None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except OverflowError:
+                    _write_response(writer, 413, {'error': 'body too large'}, False)
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    _write_response(writer, 400, {'error': 'malformed request'}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                start = time.perf_counter()
+
+                extra = None
+                if path == '/score':
+                    if method != 'POST':
+                        status, payload = 405, {'error': 'use POST'}
+                    else:
+                        status, payload, extra = await self._score(body)
+                        self.metrics.requests += 1
+                        if status == 200:
+                            self.metrics.latencies_ms.append((time.perf_counter() - start) * 1000)
+                elif path == '/metrics':
+                    status, payload = 200, self.metrics.snapshot(self.coalescer.queue.qsize())
+                elif path == '/health':
+                    status, payload = 200, {'status': 'ok'}
+                else:
+                    status, payload = 404, {'error': 'not found'}
+
+                _write_response(writer, status, payload, keep_alive, extra)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+def parse_options(argv: List[str]) -> dict:
+    """--port 8080 --max-batch 32 ... → словарь опций (по умолчанию DEFAULT_OPTIONS)"""
+    options = dict(DEFAULT_OPTIONS)
+    args = iter(argv)
+    for arg in args:
+        key = arg.lstrip('-').replace('-', '_')
+        if key not in options:
+            raise SystemExit(f"Неизвестная опция: {arg}")
+        value = next(args)
+        default = DEFAULT_OPTIONS[key]
+        options[key] = type(default)(value) if not isinstance(default, str) else value
+    return options
+
+
+async def serve(options: dict):
+    metrics = ServerMetrics()
+    scorer = make_scorer(options['checkpoint'], profile=options['profile'])
+    coalescer = CoalescingScorer(scorer, options['max_batch'], options['max_wait_ms'],
+                                 options['max_queue'], metrics)
+    server = ScoreServer(coalescer, metrics)
+    batcher = asyncio.create_task(coalescer.run())
+
+    http = await asyncio.start_server(server.handle, options['host'], options['port'])
+    print(f"\n🚀 Сервер: http://{options['host']}:{options['port']} "
+          f"(max_batch={options['max_batch']}, max_wait_ms={options['max_wait_ms']}, "
+          f"max_queue={options['max_queue']})")
+    try:
+        async with http:
+            await http.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+def main():
+    options = parse_options(sys.argv[1:])
+
+    print("=" * 70)
+    print("СЕРВИС СКОРИНГА")
+    print("=" * 70)
+
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        print("\n✅ Сервер остановлен")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Потоковый конвейер сборки датасета с ограниченной памятью
+
+generate → error_injection → asr_noise → validate → write
+
+Генераторы Part 1/2/3 (improved_generation_v2, generate_part3_expansion_v2) уже
+вызывают inject_errors_by_subscores сами, поэтому для generated_source ошибки
+внедрены на стадии generate и error_injection_stage в main не подключается:
+повторный проход удвоил бы ошибки и рассогласовал текст с бэндами. Стадия
+нужна для источников с чистыми текстами.
+
+Каждая стадия — генератор над итератором записей (dict со строковыми полями,
+как у csv.DictReader), поэтому в памяти одновременно находится не больше
+буфера писателя и нескольких шардов генерации. DatasetWriter пишет answers.csv
+и бинарный кэш (dataset_cache) инкрементально, батчами.
+
+Использование:
+    python scripts/streaming_pipeline.py dataset_versions/v1.4_stream [dataset_versions/v1.3]
+    python scripts/streaming_pipeline.py --check [dataset_versions/v1.3]   # ASR-стадия не зависит от батчей
+"""
+
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from asr_noise_injection import inject_asr_noise_batch
+from dataset_cache import StreamingCacheWriter, cache_dir_for
+from error_injection import inject_errors_by_subscores, record_rng, record_uniforms
+from generation_engine import DEFAULT_SHARD_SIZE, generate_parallel
+from improve_generation import determine_quality_flag
+from validate_and_filter import validate_part1, validate_part2, validate_part3
+
+Record = Dict[str, str]
+Stage = Callable[[Iterable[Record]], Iterator[Record]]
+
+ANSWER_FIELDNAMES = ['answer_id', 'session_id', 'user_id', 'part', 'question_id', 'question_text',
+                     'answer_text', 'duration_sec', 'target_band_overall', 'target_band_fc',
+                     'target_band_lr', 'target_band_gra', 'target_band_pr', 'transcript_raw',
+                     'source_type', 'quality_flag']
+
+VALIDATORS = {'1': validate_part1, '2': validate_part2, '3': validate_part3}
+
+
+class IdAllocator:
+    """Последовательные answer_id без чтения всего answers.csv"""
+
+    def __init__(self, start: int, width: int = 3):
+        self.next_id = start
+        self.width = width
+
+    def __call__(self) -> str:
+        answer_id = f'ans_{self.next_id:0{self.width}d}'
+        self.next_id += 1
+        return answer_id
+
+
+def iter_csv(filepath: str) -> Iterator[Record]:
+    """Потоковое чтение CSV (строка за строкой)"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def chain(records: Iterable[Record], *stages: Stage) -> Iterator[Record]:
+    """Склеивает стадии: chain(src, a, b) == b(a(src))"""
+    for stage in stages:
+        records = stage(records)
+    return iter(records)
+
+
+def generated_source(targets: Dict[str, int], seed: int, session_ids: List[str], user_ids: List[str],
+                     next_id: IdAllocator, source_type: str, workers: Optional[int] = None,
+                     shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[Record]:
+    """Источник: параллельная генерация (generation_engine) → записи answers.csv"""
+    for g in generate_parallel(targets, seed, session_ids, user_ids, workers, shard_size):
+        yield {
+            'answer_id': next_id(),
+            'session_id': g.session_id,
+            'user_id': g.user_id,
+            'part': g.part,
+            'question_id': g.question_id,
+            'question_text': g.question_text,
+            'answer_text': g.answer_text,
+            'duration_sec': str(g.duration),
+            'target_band_overall': str(g.overall),
+            'target_band_fc': str(g.fc),
+            'target_band_lr': str(g.lr),
+            'target_band_gra': str(g.gra),
+            'target_band_pr': str(g.pr),
+            'transcript_raw': g.answer_text,
+            'source_type': source_type,
+            'quality_flag': determine_quality_flag(g.overall),
+        }
+
+
+def error_injection_stage(seed: int, select: Callable[[Record], bool] = lambda r: True) -> Stage:
+    """Стадия: ошибки по субскорам (для записей, где select(record) истинно).
+    Только для источников без ошибок — не для generated_source.
+    Случайность — record_rng(seed, answer_id): не зависит от порядка записей"""
+    def stage(records):
+        for record in records:
+            if select(record):
+                text = inject_errors_by_subscores(
+                    record['answer_text'], float(record['target_band_fc']),
+                    float(record['target_band_lr']), float(record['target_band_gra']),
+                    float(record['target_band_pr']), record_rng(seed, record['answer_id'], 'errors'))
+                record = dict(record, answer_text=text, transcript_raw=text)
+            yield record
+    return stage
+
+
+def iter_batches(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    """Поток записей → списки по size записей"""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def augmented_id(answer_id: str) -> str:
+    """answer_id зашумленной копии выводится из исходного, а не из общего
+    IdAllocator: иначе id следующих записей источника зависели бы от батчей"""
+    return f'{answer_id}_asr'
+
+
+def asr_noise_stage(fraction: float, seed: int, batch_size: int = 1000) -> Stage:
+    """Стадия: с вероятностью fraction добавляет зашумленную копию ответа
+    (как asr_noise_injection.main, но без выборки из всего файла).
+    Записи идут батчами через inject_asr_noise_batch; выбор, шум и id копии
+    зависят только от (seed, answer_id) исходной записи"""
+    def stage(records):
+        for batch in iter_batches(records, batch_size):
+            ids = [record['answer_id'] for record in batch]
+            selected = record_uniforms(seed, ids, 'asr_select', 1)[:, 0] < fraction
+            chosen = [record for record, is_selected in zip(batch, selected) if is_selected]
+            noisy_texts = iter(inject_asr_noise_batch(
+                [record['answer_text'] for record in chosen],
+                [float(record['target_band_overall']) for record in chosen],
+                [record['answer_id'] for record in chosen], seed))
+            for record, is_selected in zip(batch, selected):
+                yield record
+                if not is_selected:
+                    continue
+                overall = float(record['target_band_overall'])
+                noisy_text = next(noisy_texts)
+                noisy = dict(record, answer_id=augmented_id(record['answer_id']), answer_text=noisy_text,
+                             transcript_raw=noisy_text, source_type='synthetic_augmented')
+                if overall <= 6.0:
+                    noisy['target_band_fc'] = str(max(3.0, float(record['target_band_fc']) - 0.5))
+                    noisy['target_band_pr'] = str(max(3.0, float(record['target_band_pr']) - 0.5))
+                yield noisy
+    return stage
+
+
+def validate_stage(stats: Counter, drop: bool = False) -> Stage:
+    """Стадия: validate_part1/2/3; считает действия в stats, при drop=True
+    пропускает только action == 'keep'"""
+    def stage(records):
+        for record in records:
+            validator = VALIDATORS.get(record.get('part', ''))
+            action = validator(record)['action'] if validator else 'keep'
+            stats[action] += 1
+            if drop and action != 'keep':
+                continue
+            yield record
+    return stage
+
+
+def tap_stage(callback: Callable[[Record], None]) -> Stage:
+    """Стадия-наблюдатель (инкрементальная статистика и т.п.)"""
+    def stage(records):
+        for record in records:
+            callback(record)
+            yield record
+    return stage
+
+
+class DatasetWriter:
+    """
+    Инкрементальный писатель answers.csv + бинарного кэша.
+    Держит в памяти не больше buffer_size строк.
+    """
+
+    def __init__(self, filepath: str, fieldnames: List[str] = ANSWER_FIELDNAMES,
+                 buffer_size: int = 1000, write_cache: bool = True):
+        self.filepath = filepath
+        self.fieldnames = fieldnames
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.count = 0
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        self.file = open(filepath, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction='ignore')
+        self.writer.writeheader()
+        self.cache = StreamingCacheWriter(cache_dir_for(filepath), fieldnames) if write_cache else None
+
+    def write(self, record: Record):
+        self.buffer.append({k: (record.get(k) or '') for k in self.fieldnames})
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.writer.writerows(self.buffer)
+        if self.cache is not None:
+            self.cache.write_rows(self.buffer)
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        if self.cache is not None:
+            self.cache.close(self.filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            if self.cache is not None:
+                self.cache.abort()
+
+
+def run_pipeline(records: Iterable[Record], writer: DatasetWriter) -> int:
+    """Прогоняет поток записей в writer, возвращает число записанных строк"""
+    with writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+
+def check_asr_batching(records: List[Record], seed: int, fraction: float = 0.3) -> bool:
+    """ASR-стадия с batch_size=1 и 1000 должна давать одинаковый поток"""
+    outputs = [list(asr_noise_stage(fraction, seed, batch_size)(records)) for batch_size in (1, 1000)]
+    return outputs[0] == outputs[1]
+
+
+def main():
+    check = '--check' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--check']
+
+    print("=" * 70)
+    print("ПОТОКОВАЯ СБОРКА ДАТАСЕТА")
+    print("=" * 70)
+
+    with open('configs/config_v1.1_generation.json', 'r') as f:
+        config = json.load(f)
+
+    if check:
+        base_file = os.path.join(args[0] if args else 'dataset_versions/v1.3', 'answers.csv')
+        records = list(islice(iter_csv(base_file), 3000))
+        ok = check_asr_batching(records, config['random_seed'])
+        print(f"\n{'✅' if ok else '❌'} ASR-стадия на {len(records)} ответах ({base_file}): "
+              f"batch_size=1 и 1000 {'совпадают' if ok else 'дают разный результат'}")
+        sys.exit(0 if ok else 1)
+
+    output_dir = args[0] if args else 'dataset_versions/v1.4_stream'
+    base_dir = args[1] if len(args) > 1 else 'dataset_versions/v1.3'
+
+    session_ids = [s['session_id'] for s in iter_csv(os.path.join(base_dir, 'sessions.csv'))]
+    user_ids = [u['user_id'] for u in iter_csv(os.path.join(base_dir, 'users.csv'))]
+    print(f"\n📂 База: {base_dir} ({len(user_ids)} пользователей, {len(session_ids)} сессий)")
+
+    parallel = config.get('parallel', {})
+    next_id = IdAllocator(1)
+    validation_stats = Counter()
+    part_counts = Counter()
+
+    records = chain(
+        generated_source(config['targets'], config['random_seed'], session_ids, user_ids, next_id,
+                         'synthetic_stream', parallel.get('workers'),
+                         parallel.get('shard_size', DEFAULT_SHARD_SIZE)),
+        asr_noise_stage(0.3, config['random_seed']),
+        validate_stage(validation_stats, drop=True),
+        tap_stage(lambda r: part_counts.update((r['part'],))),
+    )
+
+    output_file = os.path.join(output_dir, 'answers.csv')
+    written = run_pipeline(records, DatasetWriter(output_file))
+
+    print(f"\n📊 Валидация: keep={validation_stats['keep']}, "
+          f"regenerate={validation_stats['regenerate']}, delete={validation_stats['delete']}")
+    for part in sorted(part_counts):
+        print(f"   Part {part}: {part_counts[part]}")
+    print(f"\n💾 Записано {written} ответов в {output_file} (+ бинарный кэш)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Общий векторный экстрактор hand-crafted признаков текста
+
+Один вызов на всю колонку текстов → плотная матрица float32 (n, len(FEATURE_NAMES)):
+- num_words, filler_ratio, connector_ratio, repetition_ratio, punctuation_ratio,
+  ellipsis_ratio, grammar_errors — признаки baseline (baseline_model.py)
+- complex_structures, advanced_vocab, errors — признаки consistency
+  (check_band_consistency.py, fix_inconsistent_answers.py)
+
+Тексты склеиваются по чанкам и токенизируются один раз (str.split по склейке);
+каждый токен получает id через словарь, а проверки лексиконов (filler / connector)
+выполняются один раз на уникальный токен и дальше берутся из таблицы по id.
+Регулярки complex / error проходят склейку целиком, по одному проходу на правило.
+Семантика совпадает со старыми построчными функциями, включая поиск
+filler/connector как подстроки слова ('um' in 'summer').
+"""
+
+import re
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from phrase_matcher import BATCH_SEPARATOR, PhraseMatcher
+from validation_store import rules_version
+
+FEATURE_NAMES = ('num_words', 'filler_ratio', 'connector_ratio', 'repetition_ratio',
+                 'punctuation_ratio', 'ellipsis_ratio', 'grammar_errors',
+                 'complex_structures', 'advanced_vocab', 'errors')
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+FILLERS = ['um', 'uh', 'er', 'erm', 'like', 'you know', 'well', 'actually', 'I mean']
+CONNECTORS = ['however', 'on the other hand', 'in addition', 'moreover', 'furthermore',
+              'although', 'despite', 'nevertheless', 'also', 'besides']
+
+ADVANCED_VOCAB = [
+    'significant', 'considerable', 'substantial', 'profound', 'fundamental',
+    'comprehensive', 'sophisticated', 'nuanced', 'intricate', 'complex',
+    'appreciate', 'value', 'acknowledge', 'recognize', 'perceive',
+    'challenge', 'opportunity', 'perspective', 'approach', 'strategy'
+]
+ADVANCED_VOCAB_MATCHER = PhraseMatcher(ADVANCED_VOCAB)
+
+
+def _words(*words: str) -> str:
+    """\\b(w1|w2|...) в виде, где шаблон начинается с литерала (быстрый поиск
+    по префиксу): граница слова проверяется lookbehind после совпадения"""
+    return '(?:' + '|'.join(f'{w}(?<!\\w{w})' for w in words) + ')'
+
+# Регулярки для текста в нижнем регистре. Хвост [^SEP]* дочитывает текст
+# до разделителя: не больше одного совпадения на строку
+_ROW_TAIL = '[^' + BATCH_SEPARATOR + ']*'
+COMPLEX_PATTERNS = [re.compile(p + _ROW_TAIL) for p in (
+    _words('who', 'which', 'that', 'where', 'when') + r'\s+\w+',
+    _words('had') + r'\s+\w+ed\b',
+    _words('if', 'unless', 'provided') + r'\s+',
+    _words('however', 'moreover', 'furthermore', 'nevertheless', 'consequently') + r'\b',
+)]
+ERROR_PATTERNS = [re.compile(p + _ROW_TAIL) for p in (
+    _words('he', 'she', 'it', 'they') + r'\s+(go|do|make|have|be)\b',
+    '(?:' + _words('yesterday') + '|' + _words('last') + r'\s+week)\s+\w+\s+(is|are|am)\b',
+)]
+# Грубые грамматические маркеры baseline: "I like X" в конце текста, "he go"
+GRAMMAR_PATTERNS = [
+    re.compile(r'\bi like \w+(?=\n?(?:' + BATCH_SEPARATOR + r'|$))'),
+    re.compile(_words('he', 'she', 'it') + r' (go|do|make|take)\b' + _ROW_TAIL),
+]
+PUNCTUATION = ('.', ',', '!', '?')
+
+
+def _row_starts(texts: List[str]) -> np.ndarray:
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    return np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+
+
+def _rows_with_match(pattern: re.Pattern, blob: str, row_starts: np.ndarray) -> np.ndarray:
+    positions = np.fromiter((m.start() for m in pattern.finditer(blob)), dtype=np.int64)
+    return np.searchsorted(row_starts, positions, side='right') - 1
+
+
+def _lexicon_flags(vocabulary: Dict[str, int], lexicon: Sequence[str]) -> np.ndarray:
+    """Для каждого уникального токена: содержит ли он слово лексикона (как подстроку)"""
+    flags = np.zeros(len(vocabulary), dtype=np.float64)
+    for token, token_id in vocabulary.items():
+        flags[token_id] = any(entry in token for entry in lexicon)
+    return flags
+
+
+def _token_features(lowered: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Одна токенизация склейки → счетчики по строкам: слова, filler, connector,
+    уникальные слова, повторы соседних слов (длиннее 3 символов)
+    """
+    n = len(lowered)
+    split = f' {BATCH_SEPARATOR} '.join(lowered).split()
+    vocabulary = {BATCH_SEPARATOR: 0}
+    ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in split),
+                      dtype=np.int64, count=len(split))
+    is_separator = ids == 0
+    boundaries = np.flatnonzero(is_separator)
+    rows = np.cumsum(is_separator)
+    words = ~is_separator
+    word_rows = rows[words]
+    word_ids = ids[words]
+
+    counts = {'num_words': np.bincount(word_rows, minlength=n)}
+    for name, lexicon in (('fillers', FILLERS), ('connectors', CONNECTORS)):
+        counts[name] = np.bincount(word_rows, weights=_lexicon_flags(vocabulary, lexicon)[word_ids], minlength=n)
+
+    # Уникальные слова строки: уникальные пары (строка, id)
+    pairs = np.unique(word_rows * len(vocabulary) + word_ids)
+    counts['unique_words'] = np.bincount(pairs // len(vocabulary), minlength=n)
+
+    # words[i] == words[i+1] and len(words[i]) > 3 (граница строки — отдельный токен)
+    lengths = np.zeros(len(vocabulary), dtype=np.int64)
+    for token, token_id in vocabulary.items():
+        lengths[token_id] = len(token)
+    repeats = np.flatnonzero((ids[1:] == ids[:-1]) & (lengths[ids[:-1]] > 3))
+    counts['repeats'] = np.bincount(np.searchsorted(boundaries, repeats, side='right'), minlength=n)
+    return counts
+
+
+def _ratio(counts: np.ndarray, num_words: np.ndarray) -> np.ndarray:
+    return np.divide(counts, num_words, out=np.zeros(len(num_words)), where=num_words > 0)
+
+
+def extract_text_features(texts: Sequence[str], chunk_size: int = 50000) -> np.ndarray:
+    """Признаки FEATURE_NAMES для всей колонки текстов: матрица (n, 10) float32"""
+    features = np.zeros((len(texts), len(FEATURE_NAMES)), dtype=np.float32)
+    for offset in range(0, len(texts), chunk_size):
+        raw = [t or '' for t in texts[offset:offset + chunk_size]]
+        lowered = [t.lower() for t in raw]
+        out = features[offset:offset + len(lowered)]
+        blob = BATCH_SEPARATOR.join(lowered)
+        starts = _row_starts(lowered)
+        counts = _token_features(lowered)
+        num_words = counts['num_words']
+
+        punctuation = np.fromiter((sum(t.count(p) for p in PUNCTUATION) for t in raw),
+                                  dtype=np.float64, count=len(raw))
+        ellipsis = np.fromiter((t.count('...') for t in raw), dtype=np.float64, count=len(raw))
+        out[:, FEATURE_INDEX['num_words']] = num_words
+        out[:, FEATURE_INDEX['filler_ratio']] = _ratio(counts['fillers'], num_words)
+        out[:, FEATURE_INDEX['connector_ratio']] = _ratio(counts['connectors'], num_words)
+        out[:, FEATURE_INDEX['repetition_ratio']] = np.where(
+            num_words > 0, 1 - _ratio(counts['unique_words'], num_words), 0)
+        out[:, FEATURE_INDEX['punctuation_ratio']] = _ratio(punctuation, num_words)
+        out[:, FEATURE_INDEX['ellipsis_ratio']] = _ratio(ellipsis, num_words)
+
+        for column, patterns in (('grammar_errors', GRAMMAR_PATTERNS), ('complex_structures', COMPLEX_PATTERNS),
+                                 ('errors', ERROR_PATTERNS)):
+            for pattern in patterns:
+                # +1 за правило, сколько бы совпадений ни было в строке
+                out[np.unique(_rows_with_match(pattern, blob, starts)), FEATURE_INDEX[column]] += 1
+        out[:, FEATURE_INDEX['advanced_vocab']] = ADVANCED_VOCAB_MATCHER.count_many(lowered)
+        out[:, FEATURE_INDEX['errors']] += counts['repeats']
+    return features
+
+
+def feature_columns(features: np.ndarray, names: Sequence[str]) -> np.ndarray:
+    """Подматрица признаков по именам"""
+    return features[:, [FEATURE_INDEX[name] for name in names]]
+
+
+def text_features(text: str) -> Dict[str, float]:
+    """Признаки одного текста как dict (для построчного кода)"""
+    return dict(zip(FEATURE_NAMES, extract_text_features([text])[0].tolist()))
+
+
+# Версия извлечения признаков (для кэшей validation_store / baseline_engine)
+FEATURES_VERSION = rules_version(extract_text_features, _token_features, _lexicon_flags, _rows_with_match,
+                                 _row_starts, PhraseMatcher, *COMPLEX_PATTERNS, *ERROR_PATTERNS,
+                                 *GRAMMAR_PATTERNS, FILLERS, CONNECTORS, ADVANCED_VOCAB, PUNCTUATION)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Кэш токенизированных входов энкодера
+
+Каждый сплит токенизируется один раз (fast tokenizer, батчами, без паддинга) и
+сохраняется как memory-mapped массивы:
+- input_ids.bin — все токены подряд (int32)
+- offsets.npy   — границы последовательностей (int64, n + 1)
+
+Ключ кэша: имя токенизатора + max_length + sha256 текстов сплита, поэтому
+повторные запуски и эпохи 2..N не токенизируют ничего. Dataset отдает
+срезы mmap-массива через torch.from_numpy без копирования, паддинг делает
+collate-функция (pad_collate).
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+TOKEN_CACHE_DIR = 'models/.token_cache'
+TOKEN_CACHE_FORMAT = 1
+TOKENIZE_BATCH_SIZE = 1000
+
+
+def texts_sha256(texts: Iterable[str]) -> str:
+    """sha256 набора текстов (порядок важен)"""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(str(text).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def cache_key(tokenizer_name: str, max_length: int, dataset_hash: str) -> str:
+    """Имя каталога кэша: <tokenizer>-L<max_length>-<hash>"""
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', tokenizer_name.strip('/'))
+    return f'{safe_name}-L{max_length}-{dataset_hash[:16]}'
+
+
+class TokenizedTexts:
+    """Последовательности токенов переменной длины поверх плоского mmap-массива"""
+
+    def __init__(self, input_ids: np.ndarray, offsets: np.ndarray, pad_token_id: int = 0):
+        self.input_ids = input_ids
+        self.offsets = offsets
+        self.pad_token_id = pad_token_id
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.input_ids[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+
+def _tokenize_to_dir(texts: Sequence[str], tokenizer, max_length: int, directory: str,
+                     batch_size: int) -> int:
+    """Токенизирует батчами, дописывая токены в input_ids.bin"""
+    offsets = [0]
+    with open(os.path.join(directory, 'input_ids.bin'), 'wb') as f:
+        for start in range(0, len(texts), batch_size):
+            batch = [str(t) for t in texts[start:start + batch_size]]
+            encoded = tokenizer(batch, truncation=True, max_length=max_length,
+                                padding=False)['input_ids']
+            lengths = [len(ids) for ids in encoded]
+            flat = np.fromiter((i for ids in encoded for i in ids), dtype=np.int32,
+                               count=sum(lengths))
+            f.write(flat.tobytes())
+            offsets.extend(offsets[-1] + np.cumsum(lengths, dtype=np.int64))
+    np.save(os.path.join(directory, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+    return int(offsets[-1])
+
+
+def _open(directory: str, meta: dict) -> TokenizedTexts:
+    offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r')
+    if meta['tokens']:
+        # mode='c' (copy-on-write): массив writable для torch.from_numpy, файл не меняется
+        input_ids = np.memmap(os.path.join(directory, 'input_ids.bin'), dtype=np.int32,
+                              mode='c', shape=(meta['tokens'],))
+    else:
+        input_ids = np.empty(0, dtype=np.int32)
+    return TokenizedTexts(input_ids, offsets, meta['pad_token_id'])
+
+
+def pretokenize(texts: Sequence[str], tokenizer, tokenizer_name: str, max_length: int,
+                cache_dir: str = TOKEN_CACHE_DIR, batch_size: int = TOKENIZE_BATCH_SIZE) -> TokenizedTexts:
+    """Токенизирует тексты (или открывает готовый кэш)"""
+    dataset_hash = texts_sha256(texts)
+    directory = os.path.join(cache_dir, cache_key(tokenizer_name, max_length, dataset_hash))
+
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') == TOKEN_CACHE_FORMAT and meta.get('rows') == len(texts):
+            return _open(directory, meta)
+    except (OSError, ValueError):
+        pass
+
+    tmp_dir = f'{directory}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    tokens = _tokenize_to_dir(texts, tokenizer, max_length, tmp_dir, batch_size)
+    meta = {
+        'format': TOKEN_CACHE_FORMAT,
+        'tokenizer': tokenizer_name,
+        'max_length': max_length,
+        'dataset_sha256': dataset_hash,
+        'rows': len(texts),
+        'tokens': tokens,
+        'pad_token_id': tokenizer.pad_token_id or 0,
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return _open(directory, meta)
+
+
+def pad_collate(batch: List[dict], pad_token_id: int = 0, pad_to: Optional[int] = None) -> dict:
+    """
+    Склеивает элементы IELTSDataset в батч: input_ids дополняются pad_token_id
+    до pad_to (или до самой длинной последовательности батча), attention_mask
+    строится по длинам. targets (если есть) складываются в тензор.
+    """
+    lengths = [len(item['input_ids']) for item in batch]
+    width = pad_to or max(lengths)
+    input_ids = torch.full((len(batch), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+    for row, (item, length) in enumerate(zip(batch, lengths)):
+        input_ids[row, :length] = item['input_ids']
+        attention_mask[row, :length] = 1
+    collated = {'input_ids': input_ids, 'attention_mask': attention_mask}
+    if 'targets' in batch[0]:
+        collated['targets'] = torch.stack([item['targets'] for item in batch])
+    return collated
@@ -8,10 +8,11 @@
 - Train/Val split по user_id
 """
 
-import csv
 import json
+import time
 import numpy as np
 from collections import defaultdict
+from functools import partial
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from scipy.stats import spearmanr
@@ -20,6 +21,11 @@ import torch.nn as nn
 from torch.utils.data import Dataset, DataLoader
 from transformers import AutoTokenizer, AutoModel
 from tqdm import tqdm
+from dataset_loader import load_table
+from length_batching import LengthBucketBatchSampler
+from token_cache import TOKEN_CACHE_DIR, TokenizedTexts, pad_collate, pretokenize
+from embedding_store import EmbeddingStore, embed_texts
+from execution_profile import apply_threads, autocast, describe, get_profile, loader_kwargs, maybe_compile
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -28,39 +34,44 @@ CONFIG = {
     'model_name': 'distilbert-base-uncased',  # Легче и быстрее чем BERT
     'max_length': 256,
     'batch_size': 16,
+    'max_tokens': None,         # бюджет токенов на батч вместо batch_size (например, 4096)
+    'dynamic_padding': True,    # паддинг до самой длинной последовательности батча
     'learning_rate': 2e-5,
     'epochs': 5,
     'device': 'cuda' if torch.cuda.is_available() else 'cpu',
-    'random_seed': 42
+    'random_seed': 42,
+    'token_cache_dir': TOKEN_CACHE_DIR,
+    # Быстрый режим: энкодер заморожен, пулинг считается один раз (embedding_store),
+    # обучаются только головы ('linear' — 5 голов IELTSModel, 'mlp' — маленький MLP)
+    'frozen_encoder': False,
+    'frozen_head': 'linear',
+    'frozen_epochs': 100,
+    'frozen_batch_size': 64,
+    'frozen_learning_rate': 1e-3,
+    # Профиль выполнения (execution_profile.py): 'default' — fp32 как есть,
+    # 'cpu_bf16' / 'cpu_fast' — bf16 autocast, потоки, torch.compile, воркеры DataLoader
+    'execution_profile': 'default'
 }
 
+# Быстрый режим пишет в свои файлы и не затирает дообученный чекпоинт
+# (models/ielts_model_best.pt) и его результаты, которые читает score_answers.py
+FROZEN_CHECKPOINTS = {'linear': 'models/ielts_frozen_linear.pt', 'mlp': 'models/ielts_frozen_mlp_head.pt'}
+FROZEN_RESULTS_PATH = 'models/training_results_frozen.json'
+
 class IELTSDataset(Dataset):
-    """Dataset для IELTS ответов"""
-    def __init__(self, texts, targets, tokenizer, max_length=256):
-        self.texts = texts
-        self.targets = targets
-        self.tokenizer = tokenizer
-        self.max_length = max_length
+    """Dataset для IELTS ответов (поверх заранее токенизированных текстов)"""
+    def __init__(self, encodings: TokenizedTexts, targets):
+        self.encodings = encodings
+        self.targets = torch.as_tensor(np.asarray(targets), dtype=torch.float32)
     
     def __len__(self):
-        return len(self.texts)
+        return len(self.encodings)
     
     def __getitem__(self, idx):
-        text = str(self.texts[idx])
-        target = self.targets[idx]
-        
-        encoding = self.tokenizer(
-            text,
-            truncation=True,
-            padding='max_length',
-            max_length=self.max_length,
-            return_tensors='pt'
-        )
-        
+        # Срез mmap-массива без копирования; паддинг — в pad_collate
         return {
-            'input_ids': encoding['input_ids'].flatten(),
-            'attention_mask': encoding['attention_mask'].flatten(),
-            'targets': torch.FloatTensor(target)
+            'input_ids': torch.from_numpy(self.encodings[idx]),
+            'targets': self.targets[idx]
         }
 
 class IELTSModel(nn.Module):
@@ -77,9 +88,16 @@ class IELTSModel(nn.Module):
         self.fc_gra = nn.Linear(self.encoder.config.hidden_size, 1)
         self.fc_pr = nn.Linear(self.encoder.config.hidden_size, 1)
     
-    def forward(self, input_ids, attention_mask):
+    def pool(self, input_ids, attention_mask):
+        """Пулинг энкодера: pooler_output, а у моделей без pooler (DistilBERT) — [CLS]"""
         outputs = self.encoder(input_ids=input_ids, attention_mask=attention_mask)
-        pooled_output = outputs.pooler_output
+        pooled_output = getattr(outputs, 'pooler_output', None)
+        if pooled_output is None:
+            pooled_output = outputs.last_hidden_state[:, 0]
+        return pooled_output
+    
+    def heads(self, pooled_output):
+        """5 голов поверх пулинга (dropout активен только в train())"""
         pooled_output = self.dropout(pooled_output)
         
         overall = self.fc_overall(pooled_output)
@@ -89,38 +107,29 @@ class IELTSModel(nn.Module):
         pr = self.fc_pr(pooled_output)
         
         return torch.cat([overall, fc, lr, gra, pr], dim=1)
+    
+    def forward(self, input_ids, attention_mask):
+        return self.heads(self.pool(input_ids, attention_mask))
 
 def load_data(filepath):
     """Загружает данные из CSV"""
-    texts = []
-    targets = []
-    user_ids = []
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                text = row.get('answer_text', '') or row.get('transcript_raw', '')
-                if not text or len(text) < 5:
-                    continue
-                
-                overall = float(row['target_band_overall'])
-                fc = float(row['target_band_fc'])
-                lr = float(row['target_band_lr'])
-                gra = float(row['target_band_gra'])
-                pr = float(row['target_band_pr'])
-                
-                # Фильтруем некорректные значения
-                if not (3.0 <= overall <= 9.0):
-                    continue
-                
-                texts.append(text)
-                targets.append([overall, fc, lr, gra, pr])
-                user_ids.append(row.get('user_id', ''))
-            except:
-                continue
-    
-    return texts, np.array(targets), user_ids
+    table = load_table(filepath)
+    
+    def column(name):
+        # Нет колонки в CSV — пустые строки (как row.get(name, '') раньше)
+        return table[name] if name in table else np.full(len(table), '', dtype=object)
+    
+    texts = column('answer_text')
+    if 'transcript_raw' in table:
+        texts = np.where(texts != '', texts, table['transcript_raw'])
+    text_ok = np.fromiter((len(t) >= 5 for t in texts), dtype=bool, count=len(texts))
+    
+    bands = table.bands
+    overall = bands[:, 0]
+    # Фильтруем некорректные значения
+    keep = text_ok & table.valid_bands_mask() & (overall >= 3.0) & (overall <= 9.0)
+    
+    return list(texts[keep]), bands[keep], list(column('user_id')[keep])
 
 def split_by_user(texts, targets, user_ids, test_size=0.2):
     """Разделяет данные по user_id"""
@@ -142,7 +151,25 @@ def split_by_user(texts, targets, user_ids, test_size=0.2):
     return (np.array(texts)[train_indices], targets[train_indices],
             np.array(texts)[val_indices], targets[val_indices])
 
-def train_epoch(model, dataloader, optimizer, criterion, device):
+def make_loader(dataset: IELTSDataset, shuffle: bool, profile=None):
+    """DataLoader по CONFIG: батчи по длине + динамический паддинг
+    (или фиксированные батчи с паддингом до max_length)"""
+    pad_token_id = dataset.encodings.pad_token_id
+    extra = loader_kwargs(profile, CONFIG['device'])
+    if not CONFIG['dynamic_padding']:
+        collate = partial(pad_collate, pad_token_id=pad_token_id, pad_to=CONFIG['max_length'])
+        return DataLoader(dataset, batch_size=CONFIG['batch_size'], shuffle=shuffle, collate_fn=collate,
+                          **extra), None
+    
+    # При заданном max_tokens размер батча определяется бюджетом, а не batch_size
+    batch_size = None if CONFIG['max_tokens'] else CONFIG['batch_size']
+    sampler = LengthBucketBatchSampler(dataset.encodings.lengths, batch_size=batch_size,
+                                       max_tokens=CONFIG['max_tokens'], shuffle=shuffle,
+                                       seed=CONFIG['random_seed'])
+    collate = partial(pad_collate, pad_token_id=pad_token_id)
+    return DataLoader(dataset, batch_sampler=sampler, collate_fn=collate, **extra), sampler
+
+def train_epoch(model, dataloader, optimizer, criterion, device, profile=None):
     """Одна эпоха обучения"""
     model.train()
     total_loss = 0
@@ -153,8 +180,9 @@ def train_epoch(model, dataloader, optimizer, criterion, device):
         targets = batch['targets'].to(device)
         
         optimizer.zero_grad()
-        outputs = model(input_ids, attention_mask)
-        loss = criterion(outputs, targets)
+        with autocast(profile, device):
+            outputs = model(input_ids, attention_mask)
+        loss = criterion(outputs.float(), targets)
         loss.backward()
         optimizer.step()
         
@@ -162,7 +190,7 @@ def train_epoch(model, dataloader, optimizer, criterion, device):
     
     return total_loss / len(dataloader)
 
-def evaluate(model, dataloader, criterion, device):
+def evaluate(model, dataloader, criterion, device, profile=None):
     """Оценка модели"""
     model.eval()
     total_loss = 0
@@ -175,7 +203,9 @@ def evaluate(model, dataloader, criterion, device):
             attention_mask = batch['attention_mask'].to(device)
             targets = batch['targets'].to(device)
             
-            outputs = model(input_ids, attention_mask)
+            with autocast(profile, device):
+                outputs = model(input_ids, attention_mask)
+            outputs = outputs.float()
             loss = criterion(outputs, targets)
             
             total_loss += loss.item()
@@ -185,7 +215,12 @@ def evaluate(model, dataloader, criterion, device):
     all_preds = np.vstack(all_preds)
     all_targets = np.vstack(all_targets)
     
-    # Метрики
+    metrics = compute_metrics(all_targets, all_preds)
+    metrics['loss'] = total_loss / len(dataloader)
+    return metrics
+
+def compute_metrics(all_targets, all_preds):
+    """MAE / RMSE / Spearman по 5 бэндам"""
     mae = mean_absolute_error(all_targets, all_preds, multioutput='raw_values')
     mse = mean_squared_error(all_targets, all_preds, multioutput='raw_values')
     rmse = np.sqrt(mse)
@@ -197,22 +232,178 @@ def evaluate(model, dataloader, criterion, device):
         correlations.append(corr if not np.isnan(corr) else 0.0)
     
     return {
-        'loss': total_loss / len(dataloader),
         'mae': mae,
         'rmse': rmse,
         'correlations': correlations
     }
 
+def print_val_metrics(val_metrics):
+    print(f"   Val MAE:")
+    print(f"      Overall: {val_metrics['mae'][0]:.3f}")
+    print(f"      FC: {val_metrics['mae'][1]:.3f}")
+    print(f"      LR: {val_metrics['mae'][2]:.3f}")
+    print(f"      GRA: {val_metrics['mae'][3]:.3f}")
+    print(f"      PR: {val_metrics['mae'][4]:.3f}")
+    print(f"   Val Correlations:")
+    print(f"      Overall: {val_metrics['correlations'][0]:.3f}")
+    print(f"      FC: {val_metrics['correlations'][1]:.3f}")
+    print(f"      LR: {val_metrics['correlations'][2]:.3f}")
+    print(f"      GRA: {val_metrics['correlations'][3]:.3f}")
+    print(f"      PR: {val_metrics['correlations'][4]:.3f}")
+
+# ----------------------------------------------------------------------
+# Режим с замороженным энкодером
+# ----------------------------------------------------------------------
+
+class FrozenMLPHead(nn.Module):
+    """Маленький MLP поверх пулинга вместо 5 линейных голов"""
+    def __init__(self, hidden_size, mlp_size=256, num_outputs=5):
+        super(FrozenMLPHead, self).__init__()
+        self.net = nn.Sequential(
+            nn.Dropout(0.3),
+            nn.Linear(hidden_size, mlp_size),
+            nn.ReLU(),
+            nn.Dropout(0.1),
+            nn.Linear(mlp_size, num_outputs)
+        )
+    
+    def forward(self, pooled_output):
+        return self.net(pooled_output)
+
+def evaluate_features(head, features, targets, criterion, batch_size):
+    """Как evaluate, но по готовым признакам (те же метрики); head — в режиме eval"""
+    total_loss = 0
+    all_preds = []
+    batches = 0
+    with torch.inference_mode():
+        for start in range(0, len(features), batch_size):
+            outputs = head(features[start:start + batch_size])
+            total_loss += criterion(outputs, targets[start:start + batch_size]).item()
+            all_preds.append(outputs.cpu().numpy())
+            batches += 1
+    
+    metrics = compute_metrics(targets.cpu().numpy(), np.vstack(all_preds))
+    metrics['loss'] = total_loss / batches
+    return metrics
+
+def train_frozen(model, tokenizer, train_texts, train_targets, val_texts, val_targets):
+    """Энкодер считается один раз (с кэшем), обучаются только головы"""
+    device = CONFIG['device']
+    torch.manual_seed(CONFIG['random_seed'])
+    
+    print(f"\n🧊 Замороженный энкодер: эмбеддинги (кэш: embedding_store)...")
+    start = time.time()
+    store = EmbeddingStore.open(CONFIG['model_name'], CONFIG['max_length'])
+    train_features = torch.from_numpy(embed_texts(list(train_texts), store, model, tokenizer, device=device)).to(device)
+    val_features = torch.from_numpy(embed_texts(list(val_texts), store, model, tokenizer, device=device)).to(device)
+    encode_time = time.time() - start
+    print(f"   Эмбеддинги: {tuple(train_features.shape)} train, {tuple(val_features.shape)} val за {encode_time:.1f}s")
+    
+    train_targets = torch.as_tensor(np.asarray(train_targets), dtype=torch.float32, device=device)
+    val_targets = torch.as_tensor(np.asarray(val_targets), dtype=torch.float32, device=device)
+    
+    if CONFIG['frozen_head'] == 'mlp':
+        head_module = FrozenMLPHead(train_features.shape[1]).to(device)
+        head = head_module
+    else:
+        # 5 голов IELTSModel; сохраняется вся модель, чтобы чекпоинт подходил для score_answers.py
+        for param in model.encoder.parameters():
+            param.requires_grad = False
+        head_module = model
+        head = model.heads
+    params = [p for p in head_module.parameters() if p.requires_grad]
+    optimizer = torch.optim.AdamW(params, lr=CONFIG['frozen_learning_rate'])
+    criterion = nn.MSELoss()
+    batch_size = CONFIG['frozen_batch_size']
+    
+    print(f"\n🚀 Обучение голов ({CONFIG['frozen_head']}, {CONFIG['frozen_epochs']} эпох)...")
+    start = time.time()
+    best_val_loss = float('inf')
+    best_state = None
+    history = {'train_loss': [], 'val_loss': [], 'val_mae': []}
+    for epoch in range(CONFIG['frozen_epochs']):
+        head_module.train()
+        order = torch.randperm(len(train_features), device=device)
+        total_loss = 0
+        batches = 0
+        for start_index in range(0, len(order), batch_size):
+            batch = order[start_index:start_index + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(head(train_features[batch]), train_targets[batch])
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+            batches += 1
+        
+        head_module.eval()
+        val_metrics = evaluate_features(head, val_features, val_targets, criterion, batch_size)
+        history['train_loss'].append(total_loss / batches)
+        history['val_loss'].append(val_metrics['loss'])
+        history['val_mae'].append(val_metrics['mae'].tolist())
+        if val_metrics['loss'] < best_val_loss:
+            best_val_loss = val_metrics['loss']
+            best_state = {k: v.detach().clone() for k, v in head_module.state_dict().items()}
+        if (epoch + 1) % 10 == 0 or epoch == 0:
+            print(f"   Epoch {epoch + 1}: train {total_loss / batches:.4f}, val {val_metrics['loss']:.4f}, "
+                  f"MAE overall {val_metrics['mae'][0]:.3f}")
+    train_time = time.time() - start
+    
+    if best_state is not None:
+        head_module.load_state_dict(best_state)
+    else:
+        # val loss ни разу не был конечным — остаются веса последней эпохи
+        print("   ⚠️  Val loss не был конечным ни в одной эпохе: сохраняются веса последней эпохи")
+    head_module.eval()
+    final_metrics = evaluate_features(head, val_features, val_targets, criterion, batch_size)
+    
+    print(f"\n" + "=" * 70)
+    print("ФИНАЛЬНЫЕ РЕЗУЛЬТАТЫ (замороженный энкодер)")
+    print("=" * 70)
+    print(f"\n📊 Лучшая модель на Validation (loss: {best_val_loss:.4f}):")
+    print_val_metrics(final_metrics)
+    print(f"\n⏱️  Эмбеддинги: {encode_time:.1f}s, обучение голов: {train_time:.1f}s")
+    
+    # 'linear' — полноценный чекпоинт IELTSModel (подходит для score_answers.py как checkpoint)
+    checkpoint = FROZEN_CHECKPOINTS.get(CONFIG['frozen_head'], FROZEN_CHECKPOINTS['linear'])
+    torch.save(head_module.state_dict(), checkpoint)
+    
+    results = {
+        'config': CONFIG,
+        'mode': 'frozen_encoder',
+        'timing_sec': {'embeddings': encode_time, 'heads': train_time},
+        'final_metrics': {
+            'mae': final_metrics['mae'].tolist(),
+            'correlations': final_metrics['correlations'],
+            'rmse': final_metrics['rmse'].tolist()
+        },
+        'history': history
+    }
+    with open(FROZEN_RESULTS_PATH, 'w') as f:
+        json.dump(results, f, indent=2)
+    
+    print(f"\n💾 Модель сохранена в {checkpoint}")
+    print(f"💾 Результаты сохранены в {FROZEN_RESULTS_PATH}")
+    print(f"\n✅ Обучение завершено!")
+
 def main():
     print("=" * 70)
     print("ОБУЧЕНИЕ IELTS SPEAKING МОДЕЛИ")
     print("=" * 70)
     
+    # Потоки задаются до первой работы torch
+    profile = get_profile(CONFIG['execution_profile'])
+    apply_threads(profile)
+    
     print(f"\n🔧 Конфигурация:")
     print(f"   Модель: {CONFIG['model_name']}")
     print(f"   Устройство: {CONFIG['device']}")
-    print(f"   Batch size: {CONFIG['batch_size']}")
+    print(f"   Batch size: {CONFIG['batch_size']}" +
+          (f" (бюджет {CONFIG['max_tokens']} токенов)" if CONFIG['max_tokens'] else ""))
+    print(f"   Динамический паддинг: {'да' if CONFIG['dynamic_padding'] else 'нет'}")
     print(f"   Epochs: {CONFIG['epochs']}")
+    print(f"   Профиль выполнения: {describe(profile)}")
+    if CONFIG['frozen_encoder']:
+        print(f"   Режим: замороженный энкодер, головы '{CONFIG['frozen_head']}' ({CONFIG['frozen_epochs']} эпох)")
     
     # Загрузка данных
     print(f"\n📂 Загрузка данных из dataset_versions/v1.1/answers.csv...")
@@ -230,12 +421,29 @@ def main():
     tokenizer = AutoTokenizer.from_pretrained(CONFIG['model_name'])
     model = IELTSModel(CONFIG['model_name']).to(CONFIG['device'])
     
+    if CONFIG['frozen_encoder']:
+        train_frozen(model, tokenizer, train_texts, train_targets, val_texts, val_targets)
+        return
+    
+    # Токенизация (один раз на сплит, дальше — из кэша)
+    print(f"\n🔤 Токенизация (кэш: {CONFIG['token_cache_dir']})...")
+    train_encodings = pretokenize(train_texts, tokenizer, CONFIG['model_name'], CONFIG['max_length'],
+                                  CONFIG['token_cache_dir'])
+    val_encodings = pretokenize(val_texts, tokenizer, CONFIG['model_name'], CONFIG['max_length'],
+                                CONFIG['token_cache_dir'])
+    print(f"   Train: {int(train_encodings.lengths.sum())} токенов, Val: {int(val_encodings.lengths.sum())} токенов")
+    
     # Datasets и DataLoaders
-    train_dataset = IELTSDataset(train_texts, train_targets, tokenizer, CONFIG['max_length'])
-    val_dataset = IELTSDataset(val_texts, val_targets, tokenizer, CONFIG['max_length'])
+    train_dataset = IELTSDataset(train_encodings, train_targets)
+    val_dataset = IELTSDataset(val_encodings, val_targets)
+    train_loader, train_sampler = make_loader(train_dataset, shuffle=True, profile=profile)
+    val_loader, _ = make_loader(val_dataset, shuffle=False, profile=profile)
+    if train_sampler is not None:
+        fixed_tokens = len(train_dataset) * CONFIG['max_length']
+        print(f"   Токенов за эпоху (train): {train_sampler.padded_tokens()} "
+              f"вместо {fixed_tokens} при паддинге до max_length")
     
-    train_loader = DataLoader(train_dataset, batch_size=CONFIG['batch_size'], shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=CONFIG['batch_size'], shuffle=False)
+    model = maybe_compile(model, profile)
     
     # Оптимизатор и loss
     optimizer = torch.optim.AdamW(model.parameters(), lr=CONFIG['learning_rate'])
@@ -250,28 +458,19 @@ def main():
         print(f"\n📊 Epoch {epoch + 1}/{CONFIG['epochs']}")
         
         # Train
-        train_loss = train_epoch(model, train_loader, optimizer, criterion, CONFIG['device'])
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        train_loss = train_epoch(model, train_loader, optimizer, criterion, CONFIG['device'], profile)
         history['train_loss'].append(train_loss)
         
         # Val
-        val_metrics = evaluate(model, val_loader, criterion, CONFIG['device'])
+        val_metrics = evaluate(model, val_loader, criterion, CONFIG['device'], profile)
         history['val_loss'].append(val_metrics['loss'])
-        history['val_mae'].append(val_metrics['mae'])
+        history['val_mae'].append(val_metrics['mae'].tolist())
         
         print(f"\n   Train Loss: {train_loss:.4f}")
         print(f"   Val Loss: {val_metrics['loss']:.4f}")
-        print(f"   Val MAE:")
-        print(f"      Overall: {val_metrics['mae'][0]:.3f}")
-        print(f"      FC: {val_metrics['mae'][1]:.3f}")
-        print(f"      LR: {val_metrics['mae'][2]:.3f}")
-        print(f"      GRA: {val_metrics['mae'][3]:.3f}")
-        print(f"      PR: {val_metrics['mae'][4]:.3f}")
-        print(f"   Val Correlations:")
-        print(f"      Overall: {val_metrics['correlations'][0]:.3f}")
-        print(f"      FC: {val_metrics['correlations'][1]:.3f}")
-        print(f"      LR: {val_metrics['correlations'][2]:.3f}")
-        print(f"      GRA: {val_metrics['correlations'][3]:.3f}")
-        print(f"      PR: {val_metrics['correlations'][4]:.3f}")
+        print_val_metrics(val_metrics)
         
         # Сохраняем лучшую модель
         if val_metrics['loss'] < best_val_loss:
@@ -285,7 +484,7 @@ def main():
     print("=" * 70)
     
     model.load_state_dict(torch.load('models/ielts_model_best.pt'))
-    final_metrics = evaluate(model, val_loader, criterion, CONFIG['device'])
+    final_metrics = evaluate(model, val_loader, criterion, CONFIG['device'], profile)
     
     print(f"\n📊 Лучшая модель на Validation:")
     print(f"   MAE Overall: {final_metrics['mae'][0]:.3f}")
@@ -2,11 +2,17 @@
 """
 Валидация и фильтрация ответов для v1.3
 Проверяет Part 1, 2, 3 на проблемы и помечает для регенерации/удаления
+
+Повторный запуск инкрементальный (validation_store.py): перепроверяются только
+новые/измененные ответы и части, чьи правила изменились.
 """
 
 import csv
 import re
 from collections import defaultdict
+from dataset_loader import load_table
+from phrase_matcher import PhraseMatcher
+from validation_store import ValidationStore, rules_version, validate_incremental
 
 # Запрещенные фразы для Part 1
 PART1_FORBIDDEN = [
@@ -35,6 +41,20 @@ PART3_FORBIDDEN = [
     "incorporating diverse stakeholders",
 ]
 
+# Шаблонная ошибка Part 2 ("time when you")
+PART2_TEMPLATE_ERRORS = [
+    "time when you",
+    "describe time",
+]
+
+# Все списки компилируются один раз: один проход по тексту на ответ
+PHRASE_MATCHER = PhraseMatcher({
+    'part1': PART1_FORBIDDEN,
+    'part2': PART2_FORBIDDEN,
+    'part2_template': PART2_TEMPLATE_ERRORS,
+    'part3': PART3_FORBIDDEN,
+})
+
 def count_words(text: str) -> int:
     return len(text.split())
 
@@ -87,10 +107,9 @@ def validate_part1(answer: dict) -> dict:
     
     # Проверка запрещенных фраз
     text_lower = text.lower()
-    for phrase in PART1_FORBIDDEN:
-        if phrase.lower() in text_lower:
-            issues.append(f"Forbidden phrase: {phrase}")
-            action = 'regenerate'
+    for phrase in PHRASE_MATCHER.matched(text, 'part1'):
+        issues.append(f"Forbidden phrase: {phrase}")
+        action = 'regenerate'
     
     # Проверка релевантности
     if not check_question_relevance(text, question):
@@ -144,14 +163,13 @@ def validate_part2(answer: dict) -> dict:
         action = 'regenerate'
     
     # Проверка запрещенных фраз
-    text_lower = text.lower()
-    for phrase in PART2_FORBIDDEN:
-        if phrase.lower() in text_lower:
-            issues.append(f"Forbidden phrase: {phrase}")
-            action = 'regenerate'
+    found = PHRASE_MATCHER.matched_by_group(text)
+    for phrase in found['part2']:
+        issues.append(f"Forbidden phrase: {phrase}")
+        action = 'regenerate'
     
     # Проверка на "time when you" ошибку
-    if "time when you" in text_lower or "describe time" in text_lower:
+    if found['part2_template']:
         issues.append("Template error: 'time when you'")
         action = 'regenerate'
     
@@ -195,11 +213,9 @@ def validate_part3(answer: dict) -> dict:
         action = 'regenerate'
     
     # Проверка запрещенных фраз
-    text_lower = text.lower()
-    for phrase in PART3_FORBIDDEN:
-        if phrase.lower() in text_lower:
-            issues.append(f"Forbidden phrase: {phrase}")
-            action = 'regenerate'
+    for phrase in PHRASE_MATCHER.matched(text, 'part3'):
+        issues.append(f"Forbidden phrase: {phrase}")
+        action = 'regenerate'
     
     # Проверка сложных предложений
     sentences = re.split(r'[.!?]+', text)
@@ -216,6 +232,23 @@ def validate_part3(answer: dict) -> dict:
         'action': action
     }
 
+VALIDATORS = {'1': validate_part1, '2': validate_part2, '3': validate_part3}
+
+# Поля, которые читают валидаторы (ключ содержимого в validation_store)
+VALIDATED_FIELDS = ('part', 'answer_text', 'question_text', 'target_band_overall')
+
+# Версия правил по частям: правка Part 3 не перепроверяет Part 1/2
+_COMMON_RULES = (count_words, PhraseMatcher)
+PART_RULE_VERSIONS = {
+    '1': rules_version(*_COMMON_RULES, validate_part1, check_question_relevance, PART1_FORBIDDEN),
+    '2': rules_version(*_COMMON_RULES, validate_part2, PART2_FORBIDDEN, PART2_TEMPLATE_ERRORS),
+    '3': rules_version(*_COMMON_RULES, validate_part3, PART3_FORBIDDEN),
+}
+
+def validate_answer(answer: dict) -> dict:
+    """validate_part1/2/3 по части ответа"""
+    return VALIDATORS[answer.get('part', '')](answer)
+
 def main():
     print("=" * 70)
     print("ВАЛИДАЦИЯ И ФИЛЬТРАЦИЯ ДЛЯ V1.3")
@@ -223,25 +256,17 @@ def main():
     
     filepath = 'dataset_versions/v1.2/answers.csv'
     
-    with open(filepath, 'r', encoding='utf-8') as f:
-        answers = list(csv.DictReader(f))
+    answers = load_table(filepath).rows()
     
     print(f"\n📂 Загружено: {len(answers)} ответов")
     
-    # Валидируем все
-    results = []
-    for answer in answers:
-        part = answer.get('part', '')
-        if part == '1':
-            result = validate_part1(answer)
-        elif part == '2':
-            result = validate_part2(answer)
-        elif part == '3':
-            result = validate_part3(answer)
-        else:
-            continue
-        
-        results.append(result)
+    # Валидируем (из хранилища — то, что не менялось)
+    store = ValidationStore('validate_and_filter')
+    results = validate_incremental(answers, validate_answer, store, VALIDATED_FIELDS,
+                                   lambda answer: PART_RULE_VERSIONS.get(answer.get('part', '')))
+    results = [r for r in results if r is not None]
+    store.save()
+    print(f"   ♻️  Инкрементально: {store.summary()}")
     
     # Статистика
     actions = defaultdict(int)
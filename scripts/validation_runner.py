@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Единый параллельный прогон всех валидаторов по версии датасета
+
+Один проход по answers.csv вместо отдельных скриптов: ответы режутся на чанки,
+чанки раздаются пулу процессов, в каждом чанке работают все валидаторы:
+- filter:      validate_part1/2/3 (validate_and_filter.py)
+- consistency: check_consistency_batch (check_band_consistency.py, пакетно по чанку)
+- part3:       post_validator_part3.validate_answer (только Part 3)
+- honesty:     check_semantic_honesty (verify_semantic_honesty.py)
+
+Результаты склеиваются в порядке чанков в один колоночный отчет
+(docs/validation_report_<версия>.csv, строка на ответ, колонки по валидаторам)
++ счетчики срабатываний по правилам (docs/validation_report_<версия>_rules.json).
+Время каждого валидатора замеряется в воркерах: при хорошей балансировке
+wall-clock ≈ суммарное CPU / число процессов. Пул поднимается, только если
+на каждый процесс приходится хотя бы MIN_CHUNKS_PER_WORKER чанков: на v1.3
+(5 чанков) 4 процесса были медленнее одного (0.98s против 0.76s).
+
+Использование:
+    python scripts/validation_runner.py [dataset_versions/v1.3] [--workers N] [--chunk-size 1000]
+"""
+
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from check_band_consistency import FEATURE_COLUMNS, check_consistency_batch, extract_consistency_features
+from dataset_loader import load_table
+from post_validator_part3 import validate_answer as validate_part3_post
+from validate_and_filter import VALIDATORS
+from verify_semantic_honesty import check_semantic_honesty
+
+DEFAULT_CHUNK_SIZE = 1000
+MIN_CHUNKS_PER_WORKER = 4
+VALIDATOR_NAMES = ('filter', 'consistency', 'part3', 'honesty')
+
+REPORT_FIELDS = (['answer_id', 'part', 'overall', 'filter_action', 'filter_issues',
+                  'consistency_action', 'consistency_issues'] + list(FEATURE_COLUMNS) +
+                 ['part3_severity', 'part3_issues', 'honesty_issues'])
+
+# "Too short (12 words)" / "Forbidden phrase: x" → имя правила без деталей
+_RULE_DETAILS = re.compile(r'\s*\(.*?\)|:.*$')
+
+
+def rule_name(validator: str, issue: str) -> str:
+    return f'{validator}: {_RULE_DETAILS.sub("", issue).strip()}'
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def validate_chunk(records: List[dict]) -> Tuple[Dict[str, list], Counter, Dict[str, float]]:
+    """
+    Все валидаторы на одном чанке → (колонки отчета, счетчики правил,
+    секунды CPU по валидаторам)
+    """
+    n = len(records)
+    columns = {field: [''] * n for field in REPORT_FIELDS}
+    rules = Counter()
+    timings = {}
+
+    for i, record in enumerate(records):
+        columns['answer_id'][i] = record.get('answer_id', '')
+        columns['part'][i] = record.get('part', '')
+        columns['overall'][i] = record.get('target_band_overall', '')
+
+    start = time.process_time()
+    for i, record in enumerate(records):
+        validator = VALIDATORS.get(record.get('part', ''))
+        if validator is None:
+            continue
+        result = validator(record)
+        columns['filter_action'][i] = result['action']
+        columns['filter_issues'][i] = '; '.join(result['issues'])
+        rules.update(rule_name('filter', issue) for issue in result['issues'])
+    timings['filter'] = time.process_time() - start
+
+    start = time.process_time()
+    overall = np.array([_float(r.get('target_band_overall')) for r in records])
+    features = extract_consistency_features([r.get('answer_text', '') or '' for r in records])
+    actions, issues = check_consistency_batch(overall, features)
+    for column, values in zip(FEATURE_COLUMNS, features.T.tolist()):
+        columns[column] = values
+    columns['consistency_action'] = actions.tolist()
+    columns['consistency_issues'] = ['; '.join(row) for row in issues]
+    for row in issues:
+        rules.update(rule_name('consistency', issue) for issue in row)
+    timings['consistency'] = time.process_time() - start
+
+    start = time.process_time()
+    for i, record in enumerate(records):
+        if record.get('part') != '3':
+            continue
+        result = validate_part3_post(record)
+        columns['part3_severity'][i] = result['severity']
+        columns['part3_issues'][i] = '; '.join(result['issues'])
+        rules.update(rule_name('part3', issue) for issue in result['issues'])
+    timings['part3'] = time.process_time() - start
+
+    start = time.process_time()
+    for i, record in enumerate(records):
+        bands = [_float(record.get(f'target_band_{name}')) for name in ('overall', 'fc', 'lr', 'gra')]
+        if any(np.isnan(bands)):
+            continue
+        result = check_semantic_honesty(record.get('answer_text', '') or '', *bands)
+        columns['honesty_issues'][i] = '; '.join(result['issues'])
+        rules.update(rule_name('honesty', issue) for issue in result['issues'])
+    timings['honesty'] = time.process_time() - start
+
+    return columns, rules, timings
+
+
+def pool_workers(n_rows: int, workers: int, chunk_size: int) -> int:
+    """Сколько процессов окупает запуск пула (1 — без пула)"""
+    n_chunks = -(-n_rows // chunk_size)
+    return max(1, min(workers, n_chunks // MIN_CHUNKS_PER_WORKER))
+
+
+def iter_chunks(rows: list, chunk_size: int) -> Iterator[List[dict]]:
+    """Чанки ответов в виде обычных dict (пересылаются в воркеры)"""
+    for start in range(0, len(rows), chunk_size):
+        yield [dict(row) for row in rows[start:start + chunk_size]]
+
+
+def run_validation(rows: list, workers: Optional[int] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[Dict[str, list], Counter, Dict[str, float]]]:
+    """
+    Результаты чанков в исходном порядке. В полете не больше 2 * workers
+    чанков; workers=1 — без пула, в текущем процессе.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_chunks(rows, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield validate_chunk(chunk)
+        return
+
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(validate_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def parse_options(argv: List[str]) -> Tuple[str, Optional[int], int]:
+    version_dir = 'dataset_versions/v1.3'
+    workers = None
+    chunk_size = DEFAULT_CHUNK_SIZE
+    args = iter(argv)
+    for arg in args:
+        if arg == '--workers':
+            workers = int(next(args))
+        elif arg == '--chunk-size':
+            chunk_size = int(next(args))
+        else:
+            version_dir = arg
+    return version_dir, workers, chunk_size
+
+
+def main():
+    version_dir, workers, chunk_size = parse_options(sys.argv[1:])
+    version = os.path.basename(os.path.normpath(version_dir))
+    filepath = os.path.join(version_dir, 'answers.csv')
+
+    print("=" * 70)
+    print("ЕДИНЫЙ ПРОГОН ВАЛИДАТОРОВ")
+    print("=" * 70)
+
+    start = time.time()
+    rows = load_table(filepath).rows()
+    requested = workers or os.cpu_count() or 1
+    workers = pool_workers(len(rows), requested, chunk_size)
+    print(f"\n📂 {filepath}: {workers} процессов, чанки по {chunk_size}"
+          + (f" (запрошено {requested}: мало чанков для пула)" if workers < requested else ""))
+
+    report_file = f'docs/validation_report_{version}.csv'
+    rules_file = f'docs/validation_report_{version}_rules.json'
+    rules = Counter()
+    timings = Counter()
+    actions = {name: Counter() for name in ('filter_action', 'consistency_action', 'part3_severity')}
+    total = 0
+
+    with open(report_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_FIELDS)
+        for columns, chunk_rules, chunk_timings in run_validation(rows, workers, chunk_size):
+            writer.writerows(zip(*(columns[field] for field in REPORT_FIELDS)))
+            rules.update(chunk_rules)
+            timings.update(chunk_timings)
+            for name, counter in actions.items():
+                counter.update(v for v in columns[name] if v)
+            total += len(columns['answer_id'])
+    elapsed = time.time() - start
+
+    print(f"\n📊 ИТОГИ ({total} ответов):")
+    print(f"   filter:      {dict(actions['filter_action'])}")
+    print(f"   consistency: {dict(actions['consistency_action'])}")
+    print(f"   part3:       {dict(actions['part3_severity'])}")
+
+    print(f"\n📋 СРАБАТЫВАНИЯ ПРАВИЛ:")
+    for rule, count in rules.most_common():
+        print(f"   {count:>6}  {rule}")
+
+    cpu_total = sum(timings.values())
+    print(f"\n⏱️  Время:")
+    for name in VALIDATOR_NAMES:
+        print(f"   {name:<12} {timings[name]:.2f}s CPU")
+    print(f"   Всего CPU: {cpu_total:.2f}s, wall-clock: {elapsed:.2f}s "
+          f"(CPU / процессы: {cpu_total / workers:.2f}s)")
+
+    with open(rules_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'dataset': filepath,
+            'rows': total,
+            'actions': {name: dict(counter) for name, counter in actions.items()},
+            'rules': dict(rules.most_common()),
+            'cpu_seconds': dict(timings),
+            'wall_clock_seconds': elapsed,
+            'workers': workers,
+        }, f, indent=2, ensure_ascii=False)
+
+    print(f"\n💾 Отчет сохранен в {report_file}")
+    print(f"💾 Счетчики правил сохранены в {rules_file}")
+
+
+if __name__ == '__main__':
+    main()
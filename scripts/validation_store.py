@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Хранилище результатов валидации для инкрементальных перезапусков
+
+Результат проверки ответа хранится по ключу
+(answer_id, хэш содержимого проверяемых полей, версия набора правил).
+При повторном запуске валидатора перепроверяются только:
+- новые answer_id
+- ответы, у которых изменился текст / вопрос / бэнды (другой content hash)
+- ответы, чьи правила изменились (другая версия правил)
+
+Версия правил считается автоматически: sha256 исходников функций-валидаторов
+и значений списков фраз (rules_version), поэтому правка правила инвалидирует
+только строки, которые этим правилом проверяются (например, только Part 3).
+
+Файлы: docs/.validation_store/<валидатор>.csv (удалить — полная перепроверка).
+"""
+
+import csv
+import hashlib
+import inspect
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+VALIDATION_STORE_DIR = 'docs/.validation_store'
+STORE_FIELDS = ['answer_id', 'content_hash', 'rule_version', 'result']
+
+
+def rules_version(*parts) -> str:
+    """Версия набора правил: исходники функций + значения констант"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if inspect.isfunction(part) or inspect.isclass(part):
+            source = inspect.getsource(part)
+        elif isinstance(part, re.Pattern):
+            source = part.pattern
+        else:
+            source = repr(part)
+        digest.update(source.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def content_hash(record, fields: Sequence[str]) -> str:
+    """sha256 полей записи, которые читает валидатор"""
+    payload = '\x1f'.join(str(record.get(field, '') or '') for field in fields)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class ValidationStore:
+    """(answer_id, content_hash) → (rule_version, результат в JSON)"""
+
+    def __init__(self, name: str, directory: str = VALIDATION_STORE_DIR):
+        self.path = os.path.join(directory, f'{name}.csv')
+        # Ключ включает хэш содержимого: повторяющиеся answer_id с разным текстом не вытесняют друг друга
+        self.entries: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                self.entries[(row['answer_id'], row['content_hash'])] = (row['rule_version'], row['result'])
+
+    def get(self, answer_id: str, content_key: str, rule_version: str) -> Optional[Any]:
+        """Сохраненный результат, если ни содержимое, ни правила не менялись"""
+        key = (answer_id, content_key)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != rule_version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(entry[1])
+
+    def put(self, answer_id: str, content_key: str, rule_version: str, result: Any):
+        key = (answer_id, content_key)
+        self.seen.add(key)
+        self.entries[key] = (rule_version, json.dumps(result, ensure_ascii=False))
+
+    def save(self, prune: bool = True):
+        """Атомарная запись; prune — выбросить строки, не встретившиеся в этом запуске"""
+        if prune:
+            self.entries = {k: v for k, v in self.entries.items() if k in self.seen}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(STORE_FIELDS)
+            for (answer_id, content_key), (rule_version, result) in self.entries.items():
+                writer.writerow([answer_id, content_key, rule_version, result])
+        os.replace(tmp_path, self.path)
+
+    def summary(self) -> str:
+        return f"из кэша {self.hits}, перепроверено {self.misses}"
+
+
+def validate_incremental(records: Sequence, validate: Callable[[Any], Any], store: ValidationStore,
+                         fields: Sequence[str],
+                         version: Union[str, Callable[[Any], Optional[str]]]) -> List[Any]:
+    """
+    Результаты validate(record) для всех записей в исходном порядке:
+    из хранилища, если ключ совпал, иначе — новая проверка (и запись в хранилище).
+    version — версия правил или функция record → версия (None — запись не проверяется).
+    """
+    results = []
+    for record in records:
+        rule_version = version(record) if callable(version) else version
+        if rule_version is None:
+            results.append(None)
+            continue
+        answer_id = record.get('answer_id', '')
+        key = content_hash(record, fields)
+        result = store.get(answer_id, key, rule_version)
+        if result is None:
+            result = validate(record)
+            store.put(answer_id, key, rule_version, result)
+        results.append(result)
+    return results
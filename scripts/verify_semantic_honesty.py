@@ -10,6 +10,37 @@
 
 from improved_generation_v2 import generate_part1_answer_v2, generate_part2_answer_v2
 
+GRAMMAR_MARKERS = ("he go", "i am agree", "i like book")
+SIMPLE_WORDS = ("good", "nice")
+DISFLUENCY_MARKERS = ("...", "um")
+
+def check_semantic_honesty(answer_text: str, overall: float, fc: float, lr: float, gra: float) -> dict:
+    """
+    Маркеры, ожидаемые при низких субскорах: found — найденные,
+    issues — ожидались, но не найдены (текст "честнее", чем его бэнды)
+    """
+    text = answer_text.lower()
+    found = []
+    issues = []
+    if gra <= 4.5:
+        if any(marker in text for marker in GRAMMAR_MARKERS):
+            found.append("Grammar error detected")
+        else:
+            issues.append("Low GRA but no grammar errors")
+    if lr <= 4.5:
+        if any(text.count(word) > 1 for word in SIMPLE_WORDS):
+            found.append("Simple vocabulary repetition")
+        else:
+            issues.append("Low LR but no vocabulary repetition")
+    if fc <= 4.5:
+        if any(marker in text for marker in DISFLUENCY_MARKERS):
+            found.append("Disfluency markers found")
+        else:
+            issues.append("Low FC but no disfluency markers")
+    if overall >= 7.0 and len(answer_text.split()) <= 30:
+        issues.append("High band but short answer")
+    return {'found': found, 'issues': issues}
+
 def check_honesty():
     print("=" * 70)
     print("ПРОВЕРКА СЕМАНТИЧЕСКОЙ ЧЕСТНОСТИ (SEMANTIC HONESTY CHECK)")
@@ -61,17 +92,8 @@ def check_honesty():
         print(f"   Ответ: {answer}")
         
         # Простой анализ
-        errors_found = []
-        if case['gra'] <= 4.5:
-            if "he go" in answer.lower() or "i am agree" in answer.lower() or "i like book" in answer.lower():
-                 errors_found.append("Grammar error detected")
-        if case['lr'] <= 4.5:
-            if answer.lower().count("good") > 1 or answer.lower().count("nice") > 1:
-                errors_found.append("Simple vocabulary repetition")
-        if case['fc'] <= 4.5:
-            if "..." in answer or "um" in answer.lower():
-                errors_found.append("Disfluency markers found")
-                
+        errors_found = check_semantic_honesty(answer, case['overall'], case['fc'], case['lr'], case['gra'])['found']
+        
         if errors_found:
             print(f"   ✅ Обнаружено: {', '.join(errors_found)}")
         elif case['overall'] >= 7.0:
@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+Контентно-адресуемое хранилище версий датасета
+
+Вместо полной копии каждого CSV в dataset_versions/v1.x/ версия хранится как манифест:
+- записи CSV (исходный текст записи вместе с переводом строки — файлы версий
+  собраны вручную, с разными переводами строк и кавычками) лежат в чанках
+  objects/<sha256>.jsonl.gz; одинаковые записи разных версий и файлов хранятся один раз.
+  index.tsv (хэш записи → чанк) отвечает, есть ли запись в хранилище, без чтения
+  чанков; тексты записей читаются только из нужных чанков при материализации
+- таблица версии = дельта от той же таблицы родителя (удаленные / измененные позиции
+  + добавленные строки) или, если дельта не выражает порядок, полный список хэшей строк
+- train/val/test — списки индексов строк в таблице версии (без копии строк)
+- прочие файлы (README.md, CHANGELOG.md, *.json, splits/*.npy) — blob-объекты
+
+Любая версия материализуется по требованию (байт-в-байт как исходные файлы),
+а новая версия из правок родителя (derive) пишет только измененные строки.
+
+Файлы: dataset_versions/.store/{objects,versions}/, dataset_versions/.store/index.tsv
+
+Использование:
+    python scripts/version_store.py import dataset_versions/v1.0 [dataset_versions/v1.1 ...]
+    python scripts/version_store.py materialize v1.3 /tmp/v1.3
+    python scripts/version_store.py log
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+VERSION_STORE_DIR = 'dataset_versions/.store'
+INDEX_FILE = 'index.tsv'
+CHUNK_ROWS = 1000
+SPLIT_FILES = ('train.csv', 'val.csv', 'test.csv')
+
+
+def version_key(version: str) -> list:
+    """Натуральный порядок версий: v1.2 < v1.10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', version)]
+
+
+def row_hash(record: str) -> str:
+    """sha256 исходного текста записи CSV"""
+    return hashlib.sha256(record.encode('utf-8')).hexdigest()[:32]
+
+
+def parse_record(record: str) -> List[str]:
+    return next(csv.reader(io.StringIO(record, newline='')), [])
+
+
+def read_csv_records(filepath: str) -> Tuple[str, List[str]]:
+    """(заголовок, записи) — исходный текст каждой записи, включая кавычки и перевод строки"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        lines = f.readlines()
+    reader = csv.reader(lines)
+    records = []
+    consumed = 0
+    for _ in reader:
+        records.append(''.join(lines[consumed:reader.line_num]))
+        consumed = reader.line_num
+    return (records[0] if records else ''), records[1:]
+
+
+def format_record(values: Sequence[str], lineterminator: str = '\r\n') -> str:
+    """Новая запись CSV (для derive)"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator=lineterminator).writerow(values)
+    return buffer.getvalue()
+
+
+def _record_keys(records: Iterable[str]) -> List[Tuple[str, int]]:
+    """Ключ записи для дельты: первая колонка (answer_id / session_id / ...) + номер повтора"""
+    seen = defaultdict(int)
+    keys = []
+    for record in records:
+        values = parse_record(record)
+        key = values[0] if values else ''
+        keys.append((key, seen[key]))
+        seen[key] += 1
+    return keys
+
+
+def compute_delta(parent_records: List[str], parent_hashes: List[str],
+                  records: List[str], hashes: List[str]) -> Optional[dict]:
+    """
+    Дельта родитель → новая таблица: removed (позиции родителя), changed
+    (позиция родителя → хэш), added (хэши в конец). None — если порядок записей
+    новой таблицы так не выражается.
+    """
+    new_by_key = dict(zip(_record_keys(records), hashes))
+    removed = []
+    changed = {}
+    for index, (key, old_hash) in enumerate(zip(_record_keys(parent_records), parent_hashes)):
+        new_hash = new_by_key.pop(key, None)
+        if new_hash is None:
+            removed.append(index)
+        elif new_hash != old_hash:
+            changed[str(index)] = new_hash
+    delta = {'removed': removed, 'changed': changed, 'added': list(new_by_key.values())}
+    if apply_delta(parent_hashes, delta) != hashes:
+        return None
+    return delta
+
+
+def apply_delta(parent_hashes: List[str], delta: dict) -> List[str]:
+    removed = set(delta['removed'])
+    changed = {int(index): value for index, value in delta['changed'].items()}
+    hashes = [changed.get(index, value) for index, value in enumerate(parent_hashes) if index not in removed]
+    return hashes + list(delta['added'])
+
+
+def delta_size(delta: dict) -> int:
+    return len(delta['removed']) + len(delta['changed']) + len(delta['added'])
+
+
+class VersionStore:
+    """Манифесты версий + контентно-адресуемые чанки записей"""
+
+    def __init__(self, directory: str = VERSION_STORE_DIR):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, 'objects')
+        self.versions_dir = os.path.join(directory, 'versions')
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._index: Optional[Dict[str, str]] = None
+        self._chunk_records: Dict[str, Dict[str, str]] = {}
+        self._hashes: Dict[Tuple[str, str], List[str]] = {}
+
+    # --- объекты ---
+
+    def _write_object(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.objects_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(self.objects_dir, exist_ok=True)
+            tmp_path = f'{path}.tmp{os.getpid()}'
+            with open(tmp_path, 'wb') as f:
+                # mtime=0 — одинаковое содержимое дает одинаковые байты
+                f.write(gzip.compress(data, mtime=0))
+            os.replace(tmp_path, path)
+        return name
+
+    def _read_object(self, name: str) -> bytes:
+        with open(os.path.join(self.objects_dir, name), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def put_blob(self, data: bytes) -> str:
+        return self._write_object(_blob_name(data), data)
+
+    def put_records(self, records: Sequence[str], hashes: Sequence[str]) -> List[str]:
+        """Пишет в чанки только записи, которых еще нет в хранилище → id новых чанков.
+        Проверка — по индексу, без чтения чанков: стоимость O(len(records))"""
+        known = self.index()
+        new = {}
+        for record, value in zip(records, hashes):
+            if value not in known and value not in new:
+                new[value] = record
+        chunks = []
+        items = list(new.items())
+        for start in range(0, len(items), CHUNK_ROWS):
+            chunk_items = dict(items[start:start + CHUNK_ROWS])
+            lines = [json.dumps(item, ensure_ascii=False) for item in chunk_items.items()]
+            data = ('\n'.join(lines) + '\n').encode('utf-8')
+            chunk = self._write_object(hashlib.sha256(data).hexdigest()[:32] + '.jsonl.gz', data)
+            self._chunk_records[chunk] = chunk_items
+            self._add_to_index(chunk, chunk_items)
+            chunks.append(chunk)
+        return chunks
+
+    def _read_chunk(self, chunk: str) -> Dict[str, str]:
+        if chunk not in self._chunk_records:
+            self._chunk_records[chunk] = dict(json.loads(line) for line in
+                                              self._read_object(chunk).decode('utf-8').splitlines())
+        return self._chunk_records[chunk]
+
+    def _add_to_index(self, chunk: str, hashes: Iterable[str]):
+        """Дописывает строку чанка в index.tsv: "<чанк>\t<хэш> <хэш> ..."
+        (одна строка на чанк: оборванная сбоем строка просто не читается,
+        и index() доиндексирует чанк заново)"""
+        hashes = list(hashes)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(f"{chunk}\t{' '.join(hashes)}\n")
+        self.index().update((value, chunk) for value in hashes)
+
+    def index(self) -> Dict[str, str]:
+        """Хэш записи → чанк. Читается из index.tsv; чанки objects/, которых нет
+        в индексе (старое хранилище, прерванная запись), индексируются один раз"""
+        if self._index is None:
+            self._index = {}
+            indexed = set()
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                complete, _, partial = text.rpartition('\n')
+                if partial:
+                    # Оборванная последняя строка — отрезаем, чтобы дописывать с новой строки
+                    with open(self.index_path, 'r+', encoding='utf-8') as f:
+                        f.truncate(len((complete + '\n').encode('utf-8')) if complete else 0)
+                for line in complete.splitlines():
+                    chunk, _, values = line.partition('\t')
+                    indexed.add(chunk)
+                    self._index.update((value, chunk) for value in values.split())
+            names = os.listdir(self.objects_dir) if os.path.isdir(self.objects_dir) else []
+            for chunk in sorted(name for name in names if name.endswith('.jsonl.gz')):
+                if chunk not in indexed:
+                    self._add_to_index(chunk, self._read_chunk(chunk))
+        return self._index
+
+    def load_records(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Тексты записей по хэшам: читаются только чанки, где эти записи лежат"""
+        index = self.index()
+        by_chunk = defaultdict(list)
+        for value in hashes:
+            if value not in index:
+                raise KeyError(f"Записи {value} нет в хранилище ({self.objects_dir})")
+            by_chunk[index[value]].append(value)
+        records = {}
+        for chunk, values in by_chunk.items():
+            chunk_records = self._read_chunk(chunk)
+            records.update((value, chunk_records[value]) for value in values)
+        return records
+
+    # --- манифесты ---
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted((name[:-len('.json')] for name in os.listdir(self.versions_dir) if name.endswith('.json')),
+                      key=version_key)
+
+    def manifest(self, version: str) -> dict:
+        with open(os.path.join(self.versions_dir, f'{version}.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def ancestors(self, version: str) -> List[str]:
+        """Цепочка родителей версии (ближайший первым); ValueError при цикле"""
+        chain = []
+        parent = self.manifest(version)['parent']
+        while parent is not None:
+            if parent == version or parent in chain:
+                raise ValueError(f"Цикл в цепочке родителей версии {version}: {' → '.join(chain + [parent])}")
+            chain.append(parent)
+            parent = self.manifest(parent)['parent']
+        return chain
+
+    def _check_parent(self, version: str, parent: Optional[str]):
+        """Версия не может быть своим предком"""
+        if parent is not None and (parent == version or version in self.ancestors(parent)):
+            raise ValueError(f"{parent} не может быть родителем {version}: версия стала бы своим предком")
+
+    def _same_content(self, version: str, tables: Dict[str, Tuple[str, List[str]]],
+                      splits: Dict[str, dict], files: Dict[str, str]) -> bool:
+        """Совпадает ли сохраненная версия с новым содержимым (таблицы — (заголовок, хэши))"""
+        manifest = self.manifest(version)
+        if set(manifest['tables']) != set(tables) or manifest['splits'] != splits or manifest['files'] != files:
+            return False
+        return all(manifest['tables'][table]['header'] == header and self.table_hashes(version, table) == hashes
+                   for table, (header, hashes) in tables.items())
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.versions_dir, exist_ok=True)
+        path = os.path.join(self.versions_dir, f"{manifest['version']}.json")
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def table_hashes(self, version: str, table: str) -> List[str]:
+        """Хэши записей таблицы версии (дельты разворачиваются по цепочке родителей)"""
+        key = (version, table)
+        if key not in self._hashes:
+            manifest = self.manifest(version)
+            entry = manifest['tables'][table]
+            if 'delta' in entry:
+                self._hashes[key] = apply_delta(self.table_hashes(manifest['parent'], table), entry['delta'])
+            else:
+                self._hashes[key] = entry['hashes']
+        return self._hashes[key]
+
+    def table_records(self, version: str, table: str) -> Tuple[str, List[str]]:
+        """(заголовок, записи) таблицы версии"""
+        header = self.manifest(version)['tables'][table]['header']
+        hashes = self.table_hashes(version, table)
+        records = self.load_records(set(hashes))
+        return header, [records[value] for value in hashes]
+
+    def split_indices(self, version: str) -> Dict[str, Tuple[str, List[int]]]:
+        """Сплиты версии: имя файла → (таблица, индексы записей)"""
+        splits = self.manifest(version).get('splits', {})
+        return {name: (split['table'], split['indices']) for name, split in splits.items()}
+
+    # --- запись версий ---
+
+    def _table_entry(self, parent: Optional[str], table: str, header: str,
+                     records: List[str], hashes: List[str]) -> dict:
+        entry = {'header': header, 'rows': len(records)}
+        if parent is not None and table in self.manifest(parent)['tables']:
+            parent_header, parent_records = self.table_records(parent, table)
+            if parent_header == header:
+                delta = compute_delta(parent_records, self.table_hashes(parent, table), records, hashes)
+                # Дельта больше половины таблицы — дешевле хранить список хэшей
+                if delta is not None and delta_size(delta) <= len(records) // 2:
+                    entry['delta'] = delta
+                    return entry
+        entry['hashes'] = hashes
+        return entry
+
+    def commit(self, version: str, parent: Optional[str], tables: Dict[str, Tuple[str, List[str]]],
+               splits: Optional[Dict[str, Tuple[str, List[int]]]] = None,
+               files: Optional[Dict[str, bytes]] = None) -> dict:
+        """
+        Записывает версию: tables — имя → (заголовок, записи),
+        splits — имя файла → (таблица, индексы), files — прочие файлы
+        """
+        table_hashes = {table: (header, [row_hash(record) for record in records])
+                        for table, (header, records) in tables.items()}
+        split_entries = {name: {'table': table, 'indices': list(indices)}
+                         for name, (table, indices) in (splits or {}).items()}
+        file_blobs = {name: _blob_name(data) for name, data in (files or {}).items()}
+        if version in self.versions():
+            # Повторный импорт той же версии — ничего не меняем
+            if self._same_content(version, table_hashes, split_entries, file_blobs):
+                return self.manifest(version)
+            raise ValueError(f"Версия {version} уже есть в хранилище с другим содержимым")
+        self._check_parent(version, parent)
+
+        manifest = {'version': version, 'parent': parent, 'tables': {}, 'splits': split_entries,
+                    'files': {}, 'chunks': []}
+        for table, (header, records) in tables.items():
+            hashes = table_hashes[table][1]
+            manifest['chunks'] += self.put_records(records, hashes)
+            manifest['tables'][table] = self._table_entry(parent, table, header, records, hashes)
+            self._hashes[(version, table)] = hashes
+        for name, data in (files or {}).items():
+            manifest['files'][name] = self.put_blob(data)
+        self._write_manifest(manifest)
+        return manifest
+
+    def derive(self, version: str, parent: str, table: str = 'answers.csv',
+               changed: Optional[Dict[int, Sequence[str]]] = None, removed: Iterable[int] = (),
+               added: Sequence[Sequence[str]] = ()) -> dict:
+        """
+        Новая версия из правок родителя за O(измененных строк): changed — позиция
+        в таблице родителя → новые значения строки, removed — позиции родителя,
+        added — строки в конец. Остальные таблицы, файлы и сплиты по другим
+        таблицам наследуются; сплиты по измененной таблице нужно пересоздать.
+        Позиция вне таблицы родителя или одновременно в changed и removed → IndexError.
+        """
+        if version in self.versions():
+            raise ValueError(f"Версия {version} уже есть в хранилище")
+        self._check_parent(version, parent)
+        parent_manifest = self.manifest(parent)
+        header = parent_manifest['tables'][table]['header']
+        parent_rows = parent_manifest['tables'][table]['rows']
+        changed = changed or {}
+        removed = set(removed)
+        for index in list(changed) + list(removed):
+            if not 0 <= index < parent_rows:
+                raise IndexError(f"Позиция {index} вне таблицы {table} версии {parent} ({parent_rows} строк)")
+        both = sorted(removed & set(changed))
+        if both:
+            raise IndexError(f"Позиции {both} одновременно в changed и removed")
+        lineterminator = '\r\n' if header.endswith('\r\n') else '\n'
+        changed_records = {index: format_record(values, lineterminator) for index, values in changed.items()}
+        added_records = [format_record(values, lineterminator) for values in added]
+        changed_hashes = {str(index): row_hash(record) for index, record in changed_records.items()}
+        added_hashes = [row_hash(record) for record in added_records]
+
+        tables = {}
+        for name, entry in parent_manifest['tables'].items():
+            tables[name] = {'header': entry['header'], 'rows': entry['rows'],
+                            'delta': {'removed': [], 'changed': {}, 'added': []}}
+        delta = {'removed': sorted(removed), 'changed': changed_hashes, 'added': added_hashes}
+        tables[table]['delta'] = delta
+        tables[table]['rows'] = parent_rows - len(removed) + len(added_hashes)
+
+        manifest = {
+            'version': version, 'parent': parent, 'tables': tables,
+            'splits': {name: split for name, split in parent_manifest['splits'].items() if split['table'] != table},
+            'files': dict(parent_manifest['files']),
+            'chunks': self.put_records(list(changed_records.values()) + added_records,
+                                       list(changed_hashes.values()) + added_hashes),
+        }
+        self._write_manifest(manifest)
+        return manifest
+
+    # --- материализация ---
+
+    def materialize(self, version: str, output_dir: str):
+        """Восстанавливает файлы версии в output_dir"""
+        self.ancestors(version)
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = self.manifest(version)
+        for table in manifest['tables']:
+            header, records = self.table_records(version, table)
+            _write_records(os.path.join(output_dir, table), header, records)
+        for name, (table, indices) in self.split_indices(version).items():
+            header, records = self.table_records(version, table)
+            _write_records(os.path.join(output_dir, name), header, [records[i] for i in indices])
+        for name, blob in manifest['files'].items():
+            path = os.path.join(output_dir, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self._read_object(blob))
+
+
+def _write_records(filepath: str, header: str, records: List[str]):
+    with open(filepath, 'w', encoding='utf-8', newline='') as f:
+        f.write(header)
+        f.write(''.join(records))
+
+
+def locate_split(table_records: List[str], split_records: List[str]) -> Optional[List[int]]:
+    """Индексы записей сплита в таблице (повторы разбираются по порядку); None — не все найдены"""
+    positions = defaultdict(list)
+    for index in range(len(table_records) - 1, -1, -1):
+        positions[row_hash(table_records[index])].append(index)
+    indices = []
+    for record in split_records:
+        candidates = positions.get(row_hash(record))
+        if not candidates:
+            return None
+        indices.append(candidates.pop())
+    return indices
+
+
+def _blob_name(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:32] + '.gz'
+
+
+def import_version(store: VersionStore, version_dir: str, parent: Optional[str]) -> dict:
+    """Импорт папки dataset_versions/v1.x: CSV → таблицы, train/val/test → индексы"""
+    version = os.path.basename(os.path.normpath(version_dir))
+    tables = {}
+    split_files = {}
+    files = {}
+    for name in sorted(os.listdir(version_dir)):
+        path = os.path.join(version_dir, name)
+        if os.path.isdir(path) and not name.startswith('.'):
+            # splits/*.npy и т.п. — blob-объекты с относительным путем (.cache — производный, пропускаем)
+            for root, dirs, filenames in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for filename in sorted(filenames):
+                    with open(os.path.join(root, filename), 'rb') as f:
+                        files[os.path.relpath(os.path.join(root, filename), version_dir).replace(os.sep, '/')] = f.read()
+            continue
+        if not os.path.isfile(path):
+            continue
+        if name.endswith('.csv'):
+            (split_files if name in SPLIT_FILES else tables)[name] = read_csv_records(path)
+        else:
+            with open(path, 'rb') as f:
+                files[name] = f.read()
+
+    splits = {}
+    for name, (header, records) in split_files.items():
+        for table, (table_header, table_records) in tables.items():
+            indices = locate_split(table_records, records) if table_header == header else None
+            if indices is not None:
+                splits[name] = (table, indices)
+                break
+        else:
+            # Записи сплита не нашлись ни в одной таблице — храним как таблицу
+            tables[name] = (header, records)
+    return store.commit(version, parent, tables, splits, files)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in filenames)
+    return total
+
+
+def describe_version(manifest: dict) -> str:
+    parts = []
+    for table, entry in manifest['tables'].items():
+        if 'delta' in entry:
+            delta = entry['delta']
+            parts.append(f"{table}: {entry['rows']} строк (Δ -{len(delta['removed'])} "
+                         f"~{len(delta['changed'])} +{len(delta['added'])})")
+        else:
+            parts.append(f"{table}: {entry['rows']} строк (снимок)")
+    for name, split in manifest['splits'].items():
+        parts.append(f"{name}: {len(split['indices'])} индексов → {split['table']}")
+    return '\n      '.join(parts)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'materialize', 'log'):
+        print(__doc__)
+        sys.exit(1)
+    command = sys.argv[1]
+    store = VersionStore()
+
+    print("=" * 70)
+    print("ХРАНИЛИЩЕ ВЕРСИЙ ДАТАСЕТА")
+    print("=" * 70)
+
+    if command == 'import':
+        source_size = 0
+        for version_dir in sys.argv[2:]:
+            version = os.path.basename(os.path.normpath(version_dir))
+            # Родитель — последняя сохраненная версия, предшествующая импортируемой
+            earlier = [v for v in store.versions() if version_key(v) < version_key(version)]
+            existed = version in store.versions()
+            manifest = import_version(store, version_dir, earlier[-1] if earlier else None)
+            source_size += directory_size(version_dir) - directory_size(os.path.join(version_dir, '.cache'))
+            if existed:
+                print(f"\n📦 {version}: уже в хранилище, содержимое не изменилось")
+                continue
+            print(f"\n📦 {version} (родитель: {manifest['parent'] or '—'}), новых чанков: {len(manifest['chunks'])}")
+            print(f"      {describe_version(manifest)}")
+        print(f"\n💾 Исходные папки: {source_size / 1e6:.1f} MB, "
+              f"хранилище целиком: {directory_size(store.directory) / 1e6:.1f} MB ({store.directory})")
+    elif command == 'materialize':
+        version, output_dir = sys.argv[2], sys.argv[3]
+        store.materialize(version, output_dir)
+        print(f"\n✅ {version} материализована в {output_dir}")
+    else:
+        for version in store.versions():
+            manifest = store.manifest(version)
+            print(f"\n📦 {version} (родитель: {manifest['parent'] or '—'})")
+            print(f"      {describe_version(manifest)}")
+
+
+if __name__ == '__main__':
+    main()